@@ -19,154 +19,227 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+# Usage from Blender:
+#   blender --background --python load_ies.py -- profile.ies [more.ies ...]
+# A single profile becomes the iestexture image, several are packed into iesatlas
+
 import re
-import os
 import math
-import bpy
-import random
+import struct
+import zlib
+import numpy as np
+
+KEYWORD_REGEX = re.compile(r"\[([A-Za-z0-9_-]+)\](.*)")
+
+PROFILES = [
+    "IESNA:LM-63-1986",
+    "IESNA:LM-63-1991",
+    "IESNA91",
+    "IESNA:LM-63-1995",
+    "IESNA:LM-63-2002",
+    "ERCO Leuchten GmbH  BY: ERCO/LUM650/8701",
+    "ERCO Leuchten GmbH"
+]
+
+class IESProfile:
+
+    def __init__(self):
+        self.keywords = {}
+        self.lumen_per_lamp = 0.0
+        self.vertical_angles = None
+        self.horizontal_angles = None
+        # (horizontal, vertical) candela normalized by the maximum
+        self.candela = None
 
 def load(filepath):
-    global _vertical_angles
-    global _horizontal_angles
-    global _candela_values
-    KEYWORD_REGEX = re.compile(r"\[([A-Za-z0-8_-]+)\](.*)")
-
-    PROFILES = [
-        "IESNA:LM-63-1986",
-        "IESNA:LM-63-1991",
-        "IESNA91",
-        "IESNA:LM-63-1995",
-        "IESNA:LM-63-2002",
-        "ERCO Leuchten GmbH  BY: ERCO/LUM650/8701",
-        "ERCO Leuchten GmbH"
-    ]
-
     with open(filepath, "r") as handle:
-        lines = handle.readlines()
-
-    lines = [i.strip() for i in lines]
+        lines = [i.strip() for i in handle.readlines()]
 
     # Parse version header
-    first_line = lines.pop(0)
-    if first_line not in PROFILES:
-        raise "Unsupported Profile: " + first_line
-
-    # Extracts the keywords
-    keywords = {}
-    while lines:
-        line = lines.pop(0)
+    if len(lines) == 0 or lines[0] not in PROFILES:
+        raise Exception("Unsupported Profile: " + (lines[0] if len(lines) > 0 else filepath))
+
+    # Extracts the keywords up to the tilt line
+    profile = IESProfile()
+    line_index = 1
+    while line_index < len(lines) and not lines[line_index].startswith("TILT="):
+        line = lines[line_index]
+        line_index += 1
         if not line.startswith("["):
-            if line != "TILT=NONE":
-                continue
-            lines.insert(0, line)
-            break
+            continue
+        match = KEYWORD_REGEX.match(line)
+        if match:
+            key, val = match.group(1, 2)
+            profile.keywords[key.strip()] = val.strip()
         else:
-            match = KEYWORD_REGEX.match(line)
-            if match:
-                key, val = match.group(1, 2)
-                keywords[key.strip()] = val.strip()
-            else:
-                raise "Invalid keyword line: " + line
+            raise Exception("Invalid keyword line: " + line)
 
-    # Next line should be TILT=NONE according to the spec
-    if lines.pop(0) != "TILT=NONE":
-        raise "Expected TILT=NONE line, but none found!"
+    if line_index == len(lines):
+        raise Exception("Expected TILT line, but none found!")
+    tilt = lines[line_index]
 
     # From now on, lines do not matter anymore, instead everything is space seperated
-    new_parts = (' '.join(lines)).replace(",", " ").split()
+    tokens = iter(" ".join(lines[line_index + 1:]).replace(",", " ").split())
 
     def read_int():
-        return int(new_parts.pop(0))
+        return int(float(next(tokens)))
 
     def read_float():
-        return float(new_parts.pop(0))
+        return float(next(tokens))
+
+    def read_floats(n):
+        return np.array([read_float() for i in range(n)])
 
-    # Amount of Lamps
-    if read_int() != 1:
-        raise "Only 1 Lamp supported!"
+    # Tilt data is not used, skip it
+    if tilt == "TILT=INCLUDE":
+        read_int() # Lamp to luminaire geometry
+        num_tilt_angles = read_int()
+        read_floats(num_tilt_angles * 2)
+    elif tilt != "TILT=NONE":
+        raise Exception("Unsupported tilt: " + tilt)
+
+    # Lamps only scale the output, which is normalized
+    read_int()
 
     # Extract various properties
-    lumen_per_lamp = read_float()
+    profile.lumen_per_lamp = read_float()
     candela_multiplier = read_float()
     num_vertical_angles = read_int()
     num_horizontal_angles = read_int()
 
     if num_vertical_angles < 1 or num_horizontal_angles < 1:
-        raise "Invalid of vertical/horizontal angles!"
+        raise Exception("Invalid of vertical/horizontal angles!")
 
     photometric_type = read_int()
     unit_type = read_int()
 
     # Check for a correct unit type, should be 1 for meters and 2 for feet
     if unit_type not in [1, 2]:
-        raise "Invalid unit type"
-
-    width = read_float()
-    length = read_float()
-    height = read_float()
-    ballast_factor = read_float()
-    future_use = read_float()
-    input_watts = read_float()
-
-    _vertical_angles = [read_float() for i in range(num_vertical_angles)]
-    _horizontal_angles = [read_float() for i in range(num_horizontal_angles)]
+        raise Exception("Invalid unit type")
 
-    _candela_values = []
-    candela_scale = 0.0
+    # Width, length, height, ballast factor, future use and input watts
+    read_floats(6)
 
-    for i in range(num_horizontal_angles):
-        vertical_data = [read_float() for i in range(num_vertical_angles)]
-        candela_scale = max(candela_scale, max(vertical_data))
-        _candela_values += vertical_data
+    profile.vertical_angles = read_floats(num_vertical_angles)
+    profile.horizontal_angles = read_floats(num_horizontal_angles)
+    candela = read_floats(num_vertical_angles * num_horizontal_angles).reshape(num_horizontal_angles, num_vertical_angles)
 
     # Rescale values, divide by maximum
-    _candela_values = [i / candela_scale for i in _candela_values]
-    generate_texture()
-
-def generate_texture():
-    tex = bpy.data.images.new("iestexture", width=128, height=128, float_buffer=True) # R16
-    resolution_vertical = 128
-    resolution_horizontal = 128
-
-    for vert in range(resolution_vertical):
-        for horiz in range(resolution_horizontal):
-            vert_angle = vert / (resolution_vertical - 1.0)
-            vert_angle = math.cos(vert_angle * math.pi) * 90.0 + 90.0
-            horiz_angle = horiz / (resolution_horizontal - 1.0) * 360.0
-            candela = get_candela_value(vert_angle, horiz_angle)
-            x = vert
-            y = horiz
-            i = x + y * resolution_horizontal
-            tex.pixels[i * 4] = candela
-            tex.pixels[i * 4 + 1] = candela
-            tex.pixels[i * 4 + 2] = candela
-            tex.pixels[i * 4 + 3] = 1.0
-
-def get_candela_value(vertical_angle, horizontal_angle):
-    # Assume a dataset without horizontal angles
-    return get_vertical_candela_value(0, vertical_angle)
-
-def get_vertical_candela_value(horizontal_angle_idx, vertical_angle):
-    if vertical_angle < 0.0:
-        return 0.0
-
-    if vertical_angle > _vertical_angles[len(_vertical_angles) - 1]:
-        return 0.0
-
-    for vertical_index in range(1, len(_vertical_angles)):
-        curr_angle = _vertical_angles[vertical_index]
-        if curr_angle > vertical_angle:
-            prev_angle = _vertical_angles[vertical_index - 1]
-            prev_value = get_candela_value_from_index(vertical_index - 1, horizontal_angle_idx)
-            curr_value = get_candela_value_from_index(vertical_index, horizontal_angle_idx)
-            lerp = (vertical_angle - prev_angle) / (curr_angle - prev_angle)
-            assert lerp >= 0.0 and lerp <= 1.0
-            return curr_value * lerp + prev_value * (1.0 - lerp)
-    return 0.0
-
-def get_candela_value_from_index(vertical_angle_idx, horizontal_angle_idx):
-    index = vertical_angle_idx + horizontal_angle_idx * len(_vertical_angles)
-    return _candela_values[index]
-
-filepath = "/Users/lubos/Desktop/ies/JellyFish.ies"
-load(filepath)
+    candela_scale = candela.max()
+    profile.candela = candela / candela_scale if candela_scale > 0.0 else candela
+    return profile
+
+def fold_horizontal_angles(profile, horizontal_angles):
+    # Map angles in [0, 360] onto the range covered by the profile using its symmetry
+    first = profile.horizontal_angles[0]
+    last = profile.horizontal_angles[-1]
+    angles = np.mod(horizontal_angles, 360.0)
+    if len(profile.horizontal_angles) == 1:
+        # Rotationally symmetric
+        return np.zeros_like(angles)
+    if first == 0.0 and last == 90.0:
+        # Quadrant symmetric
+        angles = np.mod(angles, 180.0)
+        return np.where(angles > 90.0, 180.0 - angles, angles)
+    if first == 0.0 and last == 180.0:
+        # Bilateral symmetric about the 0-180 plane
+        return np.where(angles > 180.0, 360.0 - angles, angles)
+    if first == 90.0 and last == 270.0:
+        # Bilateral symmetric about the 90-270 plane
+        return np.where((angles < 90.0) | (angles > 270.0), np.mod(180.0 - angles, 360.0), angles)
+    return angles
+
+def get_candela_values(profile, vertical_angles, horizontal_angles):
+    # Bilinearly interpolated candela at the given angles, 0 outside the vertical range
+    vertical_angles = np.asarray(vertical_angles, dtype=np.float64)
+    horizontal_angles = fold_horizontal_angles(profile, np.asarray(horizontal_angles, dtype=np.float64))
+    vertical = profile.vertical_angles
+    horizontal = profile.horizontal_angles
+    c = profile.candela
+
+    # Full circle without the closing 360 column wraps around to the first one
+    if horizontal[0] == 0.0 and horizontal[-1] > 180.0 and horizontal[-1] < 360.0:
+        horizontal = np.append(horizontal, horizontal[0] + 360.0)
+        c = np.vstack([c, c[:1]])
+
+    # Fractional indices into the angle tables
+    v = np.interp(vertical_angles, vertical, np.arange(len(vertical)))
+    v0 = np.floor(v).astype(np.int64)
+    v1 = np.minimum(v0 + 1, len(vertical) - 1)
+    vt = v - v0
+    h = np.interp(horizontal_angles, horizontal, np.arange(len(horizontal)))
+    h0 = np.floor(h).astype(np.int64)
+    h1 = np.minimum(h0 + 1, len(horizontal) - 1)
+    ht = h - h0
+
+    values = (c[h0, v0] * (1.0 - vt) + c[h0, v1] * vt) * (1.0 - ht) + (c[h1, v0] * (1.0 - vt) + c[h1, v1] * vt) * ht
+    outside = (vertical_angles < vertical[0]) | (vertical_angles > vertical[-1])
+    return np.where(outside, 0.0, values)
+
+def generate_texture(profile, resolution=128):
+    # (resolution, resolution) candela, columns go from 180 to 0 vertical degrees
+    # and rows over the full horizontal circle
+    vert = np.arange(resolution) / (resolution - 1.0)
+    vert_angle = np.cos(vert * math.pi) * 90.0 + 90.0
+    horiz_angle = np.arange(resolution) / (resolution - 1.0) * 360.0
+    return get_candela_values(profile, vert_angle[None, :], horiz_angle[:, None])
+
+def generate_atlas(profiles, resolution=128):
+    # Profiles packed row by row into a square grid of tiles, None gives an unshaped tile
+    # Returns the atlas and the (x, y, width, height) uv rect of each profile
+    columns = max(1, int(math.ceil(math.sqrt(len(profiles)))))
+    atlas = np.zeros((columns * resolution, columns * resolution))
+    rects = []
+    for i, profile in enumerate(profiles):
+        x = (i % columns) * resolution
+        y = (i // columns) * resolution
+        atlas[y:y + resolution, x:x + resolution] = generate_texture(profile, resolution) if profile != None else 1.0
+        rects.append((x / atlas.shape[1], y / atlas.shape[0], resolution / atlas.shape[1], resolution / atlas.shape[0]))
+    return atlas, rects
+
+def write_png(filepath, data):
+    # Values in [0, 1] as an 8-bit rgb png, rows are stored bottom-up like Blender images
+    height, width = data.shape
+    pixels = (np.clip(data[::-1], 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    rows = np.zeros((height, 1 + width * 3), dtype=np.uint8) # Filter type 0
+    rows[:, 1:] = np.repeat(pixels, 3, axis=1)
+    def chunk(tag, payload):
+        return struct.pack('>I', len(payload)) + tag + payload + struct.pack('>I', zlib.crc32(tag + payload) & 0xffffffff)
+    with open(filepath, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)))
+        f.write(chunk(b'IEND', b''))
+
+def write_texture(filepath, profiles, resolution=128):
+    # The iestexture png the runtime samples, several profiles are packed into an atlas
+    # Returns the (x, y, size) texture space rect of each profile
+    if len(profiles) == 1:
+        write_png(filepath, generate_texture(profiles[0], resolution))
+        return [(0.0, 0.0, 1.0)]
+    atlas, rects = generate_atlas(profiles, resolution)
+    write_png(filepath, atlas)
+    # Flip rows to match the stored image
+    return [(x, 1.0 - y - h, w) for x, y, w, h in rects]
+
+def make_image(name, data):
+    # Float image with the values in rgb, written in one go
+    import bpy
+    height, width = data.shape
+    tex = bpy.data.images.new(name, width=width, height=height, float_buffer=True) # R16
+    pixels = np.ones((height, width, 4), dtype=np.float32)
+    pixels[:, :, :3] = data[:, :, None]
+    tex.pixels[:] = pixels.ravel().tolist()
+    return tex
+
+if __name__ == "__main__":
+    import sys
+    paths = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    profiles = [load(p) for p in paths]
+    if len(profiles) == 1:
+        make_image("iestexture", generate_texture(profiles[0]))
+    elif len(profiles) > 1:
+        atlas, rects = generate_atlas(profiles)
+        make_image("iesatlas", atlas)
+        for p, rect in zip(paths, rects):
+            print(p, rect)
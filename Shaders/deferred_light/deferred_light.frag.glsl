@@ -54,6 +54,9 @@ uniform sampler2D gbuffer2;
 #endif
 #ifdef _LampIES
 	//!uniform sampler2D texIES;
+	#ifdef _LampIESAtlas
+	//!uniform vec3 iesRect;
+	#endif
 #endif
 
 #ifdef _SSS
@@ -1,5 +1,8 @@
 
 uniform sampler2D texIES;
+#ifdef _LampIESAtlas
+uniform vec3 iesRect;
+#endif
 
 float iesAttenuation(vec3 l) {
 
@@ -28,5 +31,9 @@ float iesAttenuation(vec3 l) {
 	// Based on https://github.com/tobspr/RenderPipeline
 	float hor = acos(l.z) / PI;
 	float vert = atan(l.x, l.y) * (1.0 / (PI * 2.0)) + 0.5;
+	#ifdef _LampIESAtlas
+	return texture(texIES, iesRect.xy + vec2(hor, vert) * iesRect.z).r;
+	#else
 	return texture(texIES, vec2(hor, vert)).r;
+	#endif
 }
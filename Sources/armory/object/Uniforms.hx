@@ -170,6 +170,18 @@ class Uniforms {
 			#end
 		}
 		#end
+		#if arm_ies_atlas
+		if (link == "_iesRect") {
+			// Tile of the current lamp profile in the ies atlas
+			var path = iron.RenderPath.active;
+			var lamp = path.getLamp(path.currentLampIndex);
+			var rect:Array<Float> = lamp != null ? Reflect.field(lamp.data.raw, "ies_rect") : null;
+			if (rect != null) {
+				v = iron.object.Uniforms.helpVec;
+				v.set(rect[0], rect[1], rect[2]);
+			}
+		}
+		#end
 		return v;
 	}
 
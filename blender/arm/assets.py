@@ -4,15 +4,41 @@ import stat
 import bpy
 import arm.utils
 
-assets = []
+class Registry(list):
+    # Files in insertion order, with hashed lookups by full path and by basename
+    # Add through add() to keep the indexes in sync
+    def __init__(self, files=()):
+        list.__init__(self)
+        self.paths = set()
+        self.basenames = {}
+        for f in files:
+            self.add(f)
+
+    def __contains__(self, file):
+        return file in self.paths
+
+    def add(self, file):
+        if file in self.paths:
+            return False
+        self.paths.add(file)
+        base = os.path.basename(file)
+        if base not in self.basenames:
+            self.basenames[base] = file
+        self.append(file)
+        return True
+
+    def by_basename(self, base):
+        return self.basenames.get(base)
+
+assets = Registry()
 reserved_names = ['return.']
 khafile_defs = []
 khafile_defs_last = []
-embedded_data = []
-shaders = []
+embedded_data = Registry()
+shaders = Registry()
 shaders_last = []
 shaders_external = []
-shader_datas = []
+shader_datas = Registry()
 shader_passes = []
 shader_passes_assets = {}
 shader_cons = {}
@@ -28,14 +54,14 @@ def reset():
     global shader_datas
     global shader_passes
     global shader_cons
-    assets = []
+    assets = Registry()
     khafile_defs_last = khafile_defs
     khafile_defs = []
-    embedded_data = []
+    embedded_data = Registry()
     shaders_last = shaders
-    shaders = []
+    shaders = Registry()
     shaders_external = []
-    shader_datas = []
+    shader_datas = Registry()
     shader_passes = []
     shader_cons = {}
     shader_cons['mesh_vert'] = []
@@ -50,11 +76,10 @@ def add(file):
     if file in assets:
         return
     base = os.path.basename(file)
-    for f in assets:
-        if f.endswith(base):
-            print('Armory Warning: Asset name "{0}" already exists, skipping'.format(base))
-            return
-    assets.append(file)
+    if assets.by_basename(base) != None:
+        print('Armory Warning: Asset name "{0}" already exists, skipping'.format(base))
+        return
+    assets.add(file)
     # Reserved file name
     for f in reserved_names:
         if f in file:
@@ -67,19 +92,16 @@ def add_khafile_def(d):
 
 def add_embedded_data(file):
     global embedded_data
-    if file not in embedded_data:
-        embedded_data.append(file)
+    embedded_data.add(file)
 
 def add_shader(file):
     global shaders
     global shaders_last
-    if file not in shaders:
-        shaders.append(file)
+    shaders.add(file)
 
 def add_shader_data(file):
     global shader_datas
-    if file not in shader_datas:
-        shader_datas.append(file)
+    shader_datas.add(file)
 
 def add_shader_pass(data_name):
     global shader_passes
@@ -94,6 +116,30 @@ def add_shader_external(file):
     name = file.split('/')[-1].split('\\')[-1]
     add_shader(arm.utils.build_dir() + '/compiled/Shaders/' + name)
 
+def get_summary():
+    # File count and bytes per extension of everything registered for this build
+    summary = {}
+    minimize = bpy.data.worlds['Arm'].arm_minimize
+    for files in [assets, shaders, shader_datas]:
+        for file in files:
+            # Scene data is written as json when not minimized
+            if not minimize and file.endswith('.arm'):
+                file = file[:-4] + '.json'
+            ext = os.path.splitext(file)[1][1:].lower()
+            if ext not in summary:
+                summary[ext] = [0, 0]
+            summary[ext][0] += 1
+            if os.path.isfile(file):
+                summary[ext][1] += os.path.getsize(file)
+    return summary
+
+def print_summary():
+    summary = get_summary()
+    count = sum(v[0] for v in summary.values())
+    size = sum(v[1] for v in summary.values())
+    types = ', '.join('{0}: {1} / {2:.2f} MB'.format(k, v[0], v[1] / 1048576) for k, v in sorted(summary.items(), key=lambda x: -x[1][1]))
+    print('Assets: {0} files, {1:.2f} MB ({2})'.format(count, size / 1048576, types))
+
 invalidate_enabled = True # Disable invalidating during build process
 
 def remove_readonly(func, path, excinfo):
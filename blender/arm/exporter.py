@@ -17,12 +17,19 @@ from mathutils import *
 import time
 import subprocess
 import shutil
+import concurrent.futures
+import numpy as np
 import arm.utils
+import arm.lib.mesh_ops as mesh_ops
+import arm.lib.anim_ops as anim_ops
+import arm.lib.armpack as armpack
+import arm.lib.build_cache as build_cache
 import arm.write_probes as write_probes
 import arm.assets as assets
 import arm.log as log
 import arm.material.make as make_material
 import arm.material.mat_batch as mat_batch
+import arm.material.mat_utils as mat_utils
 import arm.make_renderpath as make_renderpath
 import arm.material.cycles as cycles
 
@@ -48,52 +55,14 @@ deltaSubrotationName = ["dxrot", "dyrot", "dzrot"]
 deltaSubscaleName = ["dxscl", "dyscl", "dzscl"]
 axisName = ["x", "y", "z"]
 
-class Vertex:
-    # Based on https://github.com/Kupoman/blendergltf/blob/master/blendergltf.py
-    __slots__ = ("co", "normal", "uvs", "col", "loop_indices", "index", "bone_weights", "bone_indices", "bone_count", "vertex_index")
-    def __init__(self, mesh, loop):
-        self.vertex_index = loop.vertex_index
-        loop_idx = loop.index
-        self.co = mesh.vertices[self.vertex_index].co[:]
-        self.normal = loop.normal[:]
-        self.uvs = tuple(layer.data[loop_idx].uv[:] for layer in mesh.uv_layers)
-        self.col = [0.0, 0.0, 0.0]
-        if len(mesh.vertex_colors) > 0:
-            self.col = mesh.vertex_colors[0].data[loop_idx].color[:]
-        # self.colors = tuple(layer.data[loop_idx].color[:] for layer in mesh.vertex_colors)
-        self.loop_indices = [loop_idx]
-
-        # Take the four most influential groups
-        # groups = sorted(mesh.vertices[self.vertex_index].groups, key=lambda group: group.weight, reverse=True)
-        # if len(groups) > 4:
-            # groups = groups[:4]
-
-        # self.bone_weights = [group.weight for group in groups]
-        # self.bone_indices = [group.group for group in groups]
-        # self.bone_count = len(self.bone_weights)
-
-        self.index = 0
-
-    def __hash__(self):
-        return hash((self.co, self.normal, self.uvs))
-
-    def __eq__(self, other):
-        eq = (
-            (self.co == other.co) and
-            (self.normal == other.normal) and
-            (self.uvs == other.uvs) and
-            (self.col == other.col)
-            )
-
-        if eq:
-            indices = self.loop_indices + other.loop_indices
-            self.loop_indices = indices
-            other.loop_indices = indices
-        return eq
-
 class ArmoryExporter:
     '''Export to Armory format'''
 
+    # Bump when the same input produces different mesh data, invalidates cached meshes
+    mesh_cache_version = 3
+    # Same for baked actions
+    action_cache_version = 2
+
     def write_matrix(self, matrix):
         return [matrix[0][0], matrix[0][1], matrix[0][2], matrix[0][3],
                 matrix[1][0], matrix[1][1], matrix[1][2], matrix[1][3],
@@ -111,6 +80,10 @@ class ArmoryExporter:
         ext = '.zip' if compressed else '.arm'
         return mesh_fp + object_id + ext
 
+    def get_mesh_cache_path(self):
+        index = self.filepath.rfind('/')
+        return self.filepath[:(index + 1)] + 'meshes/cache'
+
     @staticmethod
     def get_bobject_type(bobject):
         if bobject.type == "MESH":
@@ -218,22 +191,6 @@ class ArmoryExporter:
             # return ArmoryExporter.animation_keys_different(fcurve)
         # return ((ArmoryExporter.animation_keys_different(fcurve)) or (ArmoryExporter.animation_tangents_nonzero(fcurve)))
 
-    @staticmethod
-    def calc_tangent(v0, v1, v2, uv0, uv1, uv2):
-        deltaPos1 = v1 - v0
-        deltaPos2 = v2 - v0
-        deltaUV1 = uv1 - uv0
-        deltaUV2 = uv2 - uv0
-
-        d = (deltaUV1.x * deltaUV2.y - deltaUV1.y * deltaUV2.x)
-        if d != 0:
-            r = 1.0 / d
-        else:
-            r = 1.0
-        tangent = (deltaPos1 * deltaUV2.y - deltaPos2 * deltaUV1.y) * r
-        # bitangent = (deltaPos2 * deltaUV1.x - deltaPos1 * deltaUV2.x) * r
-        return tangent
-
     def export_bone(self, armature, bone, scene, o, action):
         bobjectRef = self.bobjectBoneArray.get(bone)
 
@@ -305,14 +262,24 @@ class ArmoryExporter:
 
             tracko['values'] = []
 
-            for i in range(begin_frame, end_frame):
-                scene.frame_set(i)
-                tracko['values'] += self.write_matrix(bobject.matrix_local) # Continuos array of matrix transforms
+            key = self.get_action_key(action, [aname, self.is_compress(bobject.data), 'sampled', self.get_object_action_inputs(bobject)])
+            # Sampled bakes depend on the whole scene and are never reused
+            if not self.can_evaluate_object(bobject, action) or not self.is_action_cached(fp, key):
+                profile_time = time.time()
+                evaluated = self.evaluate_object_matrices(bobject, action, range(begin_frame, end_frame))
+                if evaluated is not None:
+                    tracko['values'] = evaluated.reshape(-1).tolist()
+                else:
+                    for i in range(begin_frame, end_frame):
+                        scene.frame_set(i)
+                        tracko['values'] += self.write_matrix(bobject.matrix_local) # Continuos array of matrix transforms
+                self.print_bake_time('object', aname, profile_time, evaluated is not None)
+                if bpy.data.worlds['Arm'].arm_anim_reduce:
+                    self.reduce_sampled_track(tracko, bpy.data.worlds['Arm'].arm_anim_tolerance)
 
-            oanim['tracks'] = [tracko]
-            self.export_pose_markers(oanim, action)
+                oanim['tracks'] = [tracko]
+                self.export_pose_markers(oanim, action)
 
-            if True: #action.arm_cached == False or not os.path.exists(fp):
                 print('Exporting object action ' + aname)
                 actionf = {}
                 actionf['objects'] = []
@@ -321,7 +288,135 @@ class ArmoryExporter:
                 oaction['name'] = aname
                 oaction['data_ref'] = ''
                 oaction['transform'] = []
-                arm.utils.write_arm(fp, actionf)
+                arm.utils.write_arm(fp, actionf, release=True)
+                self.set_action_cached(fp, key, evaluated is not None)
+
+    def can_evaluate_object(self, bobject, action):
+        # Whether matrix_local follows from the action curves alone
+        if bobject.rotation_mode == 'AXIS_ANGLE' or bobject.rigid_body != None:
+            return False
+        for con in bobject.constraints:
+            if not con.mute:
+                return False
+        if bobject.parent != None and bobject.parent_type != 'OBJECT':
+            return False
+        return self.can_evaluate_action(bobject, self.get_action_curves(action), '')
+
+    def evaluate_object_matrices(self, bobject, action, frames):
+        # matrix_local straight from fcurves, None when the scene has to be sampled
+        if not self.can_evaluate_object(bobject, action):
+            return None
+        curves = self.get_action_curves(action)
+        basis = self.evaluate_basis(curves, '', bobject, frames, delta=True)
+        if bobject.parent != None:
+            basis = np.matmul(np.array(bobject.matrix_parent_inverse), basis)
+        return basis
+
+    def get_rna_values(self, struct):
+        # Plain property values of struct, pointers, collections and ui state are skipped
+        values = [struct.bl_rna.identifier]
+        for prop in struct.bl_rna.properties:
+            if prop.identifier in ('rna_type', 'select', 'active', 'show_expanded') or prop.type == 'POINTER' or prop.type == 'COLLECTION':
+                continue
+            v = getattr(struct, prop.identifier)
+            if isinstance(v, set):
+                v = sorted(v)
+            elif not isinstance(v, (bool, int, float, str)):
+                # Arrays, vectors and matrices
+                v = np.array(v).tolist()
+            values.append((prop.identifier, v))
+        return values
+
+    def get_fcurve_data(self, fcurve):
+        keys = fcurve.keyframe_points
+        data = [fcurve.data_path, fcurve.array_index, fcurve.mute, fcurve.group != None and fcurve.group.mute, fcurve.extrapolation]
+        for attr in ['co', 'handle_left', 'handle_right']:
+            values = np.empty(len(keys) * 2, dtype='<f4')
+            keys.foreach_get(attr, values)
+            data.append(values)
+        data.append([(k.interpolation, k.easing) for k in keys])
+        data.append([self.get_rna_values(mod) for mod in fcurve.modifiers])
+        return data
+
+    def get_action_key(self, action, inputs):
+        # Hash of the action curves and everything else its baked tracks depend on
+        wrd = bpy.data.worlds['Arm']
+        h = build_cache.new_hash()
+        build_cache.update_hash(h, ArmoryExporter.action_cache_version)
+        build_cache.update_hash(h, [ArmoryExporter.sample_animation_flag, wrd.arm_minimize, wrd.arm_anim_reduce, wrd.arm_anim_tolerance])
+        for fcurve in action.fcurves:
+            build_cache.update_hash(h, self.get_fcurve_data(fcurve))
+        build_cache.update_hash(h, [(m.frame, m.name) for m in action.pose_markers])
+        build_cache.update_hash(h, list(action.frame_range))
+        build_cache.update_hash(h, inputs)
+        return h.hexdigest()
+
+    def get_constraint_inputs(self, constraints):
+        inputs = []
+        for con in constraints:
+            target = getattr(con, 'target', None)
+            inputs.append([self.get_rna_values(con), target.name if target != None else None])
+        return inputs
+
+    def get_animation_inputs(self, bobject):
+        # Animation data evaluated together with the action, drivers and NLA tracks
+        adata = bobject.animation_data
+        if adata == None:
+            return None
+        inputs = [adata.action_blend_type, adata.action_influence, adata.action_extrapolation, adata.use_nla, adata.use_tweak_mode]
+        for fcurve in adata.drivers:
+            driver = fcurve.driver
+            variables = []
+            for var in driver.variables:
+                targets = [[self.get_rna_values(t), t.id.name if t.id != None else None] for t in var.targets]
+                variables.append([var.name, var.type, targets])
+            inputs.append([self.get_fcurve_data(fcurve), driver.type, driver.expression, driver.use_self, variables])
+        for track in adata.nla_tracks:
+            strips = [[self.get_rna_values(strip), strip.action.name if strip.action != None else None] for strip in track.strips]
+            inputs.append([track.name, track.mute, track.is_solo, strips])
+        return inputs
+
+    def get_armature_action_inputs(self, bobject):
+        # Rest pose and unkeyed pose values used when baking bone actions
+        inputs = [self.get_constraint_inputs(bobject.constraints)]
+        for bone in bobject.data.bones:
+            inherit_scale = bone.inherit_scale if hasattr(bone, 'inherit_scale') else bone.use_inherit_scale
+            flags = [bone.use_connect, bone.use_inherit_rotation, bone.use_local_location, inherit_scale]
+            inputs.append([bone.name, bone.parent.name if bone.parent else None, self.write_matrix(bone.matrix_local), flags])
+            pose_bone = bobject.pose.bones.get(bone.name)
+            if pose_bone:
+                inputs.append([pose_bone.rotation_mode, list(pose_bone.location), list(pose_bone.rotation_quaternion), list(pose_bone.rotation_euler), list(pose_bone.scale)])
+                inputs.append(self.get_constraint_inputs(pose_bone.constraints))
+        return inputs
+
+    def get_object_action_inputs(self, bobject):
+        # Unkeyed transform values used when baking object actions
+        inputs = [bobject.rotation_mode, bobject.parent != None, bobject.parent_type, self.write_matrix(bobject.matrix_parent_inverse)]
+        for attr in ['location', 'rotation_quaternion', 'rotation_euler', 'scale', 'delta_location', 'delta_rotation_quaternion', 'delta_rotation_euler', 'delta_scale']:
+            inputs.append(list(getattr(bobject, attr)))
+        inputs.append(self.get_constraint_inputs(bobject.constraints))
+        inputs.append(self.get_animation_inputs(bobject))
+        return inputs
+
+    def is_action_cached(self, fp, key):
+        # Only actions evaluated from their curves are reused, sampled ones depend on the whole scene
+        record = self.action_manifest.get(os.path.basename(fp))
+        if record == None or record['key'] != key or not record['evaluated']:
+            return False
+        return os.path.exists(self.get_output_path(fp))
+
+    def set_action_cached(self, fp, key, evaluated):
+        self.action_manifest.set(os.path.basename(fp), {'key': key, 'evaluated': evaluated})
+
+    def get_output_path(self, fp):
+        # File actually written by arm.utils.write_arm
+        if not bpy.data.worlds['Arm'].arm_minimize and fp.endswith('.arm'):
+            return fp.split('.arm')[0] + '.json'
+        return fp
+
+    def print_bake_time(self, kind, aname, profile_time, evaluated):
+        how = 'evaluated' if evaluated else 'sampled'
+        print('Baked ' + kind + ' action ' + aname + ' (' + how + ') in ' + '{:.3f}'.format(time.time() - profile_time) + 's')
 
     def export_key_frames(self, fcurve):
         keyo = []
@@ -558,7 +653,8 @@ class ArmoryExporter:
                         oanim['has_delta'] = True
                         structFlag = True
 
-            if True: #action.arm_cached == False or not os.path.exists(fp):
+            key = self.get_action_key(action, [aname, self.is_compress(bobject.data), 'keyframed', self.beginFrame])
+            if not self.is_action_cached(fp, key):
                 print('Exporting object action ' + aname)
                 actionf = {}
                 actionf['objects'] = []
@@ -567,7 +663,8 @@ class ArmoryExporter:
                 oaction['name'] = aname
                 oaction['data_ref'] = ''
                 oaction['transform'] = []
-                arm.utils.write_arm(fp, actionf)
+                arm.utils.write_arm(fp, actionf, release=True)
+                self.set_action_cached(fp, key, True)
 
     def process_bone(self, bone):
         if ArmoryExporter.export_all_flag or bone.select:
@@ -648,7 +745,7 @@ class ArmoryExporter:
                 tracko['frames'].append(i - begin_frame)
 
             tracko['values'] = []
-            self.bone_tracks.append((tracko['values'], pose_bone))
+            self.bone_tracks.append((tracko['values'], pose_bone, o['anim']))
 
     def use_default_material(self, bobject, o):
         if arm.utils.export_bone_data(bobject):
@@ -726,9 +823,133 @@ class ArmoryExporter:
                         return region.width
         return 0
 
+    def get_action_curves(self, action):
+        # Evaluated fcurves by (data_path, array_index)
+        curves = {}
+        for fcurve in action.fcurves:
+            if fcurve.mute or (fcurve.group != None and fcurve.group.mute):
+                continue
+            curves[(fcurve.data_path, fcurve.array_index)] = fcurve
+        return curves
+
+    def sample_channels(self, curves, data_path, defaults, frames):
+        # (frames, channels) values of data_path, channels without fcurve keep their default
+        values = np.empty((len(frames), len(defaults)))
+        for i in range(len(defaults)):
+            fcurve = curves.get((data_path, i))
+            if fcurve == None:
+                values[:, i] = defaults[i]
+            else:
+                values[:, i] = [fcurve.evaluate(f) for f in frames]
+        return values
+
+    def can_evaluate_action(self, bobject, curves, prefix):
+        # Action alone determines the animated channels under prefix, nothing else is evaluated
+        adata = bobject.animation_data
+        if adata == None:
+            return False
+        if adata.action_blend_type != 'REPLACE' or adata.action_influence != 1.0:
+            return False
+        for driver in adata.drivers:
+            if driver.data_path.startswith(prefix):
+                return False
+        # Channels not keyed in the action could be animated by the NLA
+        if adata.use_nla:
+            for track in adata.nla_tracks:
+                if track.mute or track.strips == None:
+                    continue
+                for strip in track.strips:
+                    if strip.mute or strip.action == None:
+                        continue
+                    for fcurve in strip.action.fcurves:
+                        if fcurve.data_path.startswith(prefix) and (fcurve.data_path, fcurve.array_index) not in curves:
+                            return False
+        return True
+
+    def evaluate_basis(self, curves, path, owner, frames, delta=False):
+        # Local loc/rot/scale matrices of owner at frames
+        mode = owner.rotation_mode
+        loc = self.sample_channels(curves, path + 'location', owner.location, frames)
+        scale = self.sample_channels(curves, path + 'scale', owner.scale, frames)
+        if mode == 'QUATERNION':
+            quat = anim_ops.quat_normalize(self.sample_channels(curves, path + 'rotation_quaternion', owner.rotation_quaternion, frames))
+        else:
+            rot = anim_ops.euler_to_matrix(self.sample_channels(curves, path + 'rotation_euler', owner.rotation_euler, frames), mode)
+        if delta:
+            loc += self.sample_channels(curves, path + 'delta_location', owner.delta_location, frames)
+            scale *= self.sample_channels(curves, path + 'delta_scale', owner.delta_scale, frames)
+            if mode == 'QUATERNION':
+                dquat = anim_ops.quat_normalize(self.sample_channels(curves, path + 'delta_rotation_quaternion', owner.delta_rotation_quaternion, frames))
+                quat = anim_ops.quat_multiply(dquat, quat)
+            else:
+                drot = anim_ops.euler_to_matrix(self.sample_channels(curves, path + 'delta_rotation_euler', owner.delta_rotation_euler, frames), mode)
+                rot = np.matmul(drot, rot)
+        if mode == 'QUATERNION':
+            rot = anim_ops.quat_to_matrix(quat)
+        return anim_ops.compose(loc, rot, scale)
+
+    def can_evaluate_bones(self, armature, pose_bones, action):
+        # Whether poses of pose_bones follow from the action curves alone,
+        # true while bones use default inheritance and have no constraints
+        curves = self.get_action_curves(action)
+        if not self.can_evaluate_action(armature, curves, 'pose.bones'):
+            return False
+        for pose_bone in pose_bones:
+            bone = pose_bone.bone
+            if pose_bone.rotation_mode == 'AXIS_ANGLE':
+                return False
+            for con in pose_bone.constraints:
+                if not con.mute:
+                    return False
+            if not bone.use_inherit_rotation or not bone.use_local_location:
+                return False
+            if (hasattr(bone, 'inherit_scale') and bone.inherit_scale != 'FULL') or (hasattr(bone, 'use_inherit_scale') and not bone.use_inherit_scale):
+                return False
+            if bone.use_connect:
+                path = 'pose.bones["' + bone.name + '"].location'
+                if (path, 0) in curves or (path, 1) in curves or (path, 2) in curves:
+                    return False
+        return True
+
+    def evaluate_bone_matrices(self, action, frames):
+        # Pose matrices relative to parent pose bones straight from fcurves
+        armature = self.bone_tracks[0][1].id_data
+        if not self.can_evaluate_bones(armature, [track[1] for track in self.bone_tracks], action):
+            return False
+        curves = self.get_action_curves(action)
+
+        tracks = []
+        for values, pose_bone, oanim in self.bone_tracks:
+            bone = pose_bone.bone
+            rest = bone.matrix_local
+            if bone.parent:
+                rest = bone.parent.matrix_local.inverted_safe() * rest
+            basis = self.evaluate_basis(curves, 'pose.bones["' + bone.name + '"].', pose_bone, frames)
+            tracks.append(np.matmul(np.array(rest), basis))
+        for i in range(len(frames)):
+            for track, (values, pose_bone, oanim) in zip(tracks, self.bone_tracks):
+                values += track[i].ravel().tolist()
+        return True
+
+    def reduce_sampled_track(self, tracko, tolerance):
+        # Drop sampled transforms that the runtime reproduces within tolerance when blending
+        # the neighbouring keys, frames past the sampled values are kept as they are
+        values = np.array(tracko['values']).reshape(-1, 4, 4)
+        frames = tracko['frames']
+        keys = anim_ops.reduce_transform_keys(frames[:len(values)], values, tolerance)
+        tracko['frames'] = [frames[i] for i in keys.tolist()] + frames[len(values):]
+        tracko['values'] = values[keys].ravel().tolist()
+
+    def reduce_bone_tracks(self, tolerance):
+        for values, pose_bone, oanim in self.bone_tracks:
+            self.reduce_sampled_track(oanim['tracks'][0], tolerance)
+
     def write_bone_matrices(self, scene, action):
+        # Returns whether pose matrices were evaluated without sampling the scene
         begin_frame, end_frame = int(action.frame_range[0]), int(action.frame_range[1])
         if len(self.bone_tracks) > 0:
+            if self.evaluate_bone_matrices(action, range(begin_frame, end_frame + 1)):
+                return True
             for i in range(begin_frame, end_frame + 1):
                 scene.frame_set(i)
                 for track in self.bone_tracks:
@@ -738,6 +959,8 @@ class ArmoryExporter:
                         values += self.write_matrix(parent.matrix.inverted_safe() * pose_bone.matrix)
                     else:
                         values += self.write_matrix(pose_bone.matrix)
+            return False
+        return True
 
     def has_baked_material(self, bobject, materials):
         for mat in materials:
@@ -986,6 +1209,7 @@ class ArmoryExporter:
                             export_actions.append(strip.action)
 
                 armatureid = arm.utils.safestr(arm.utils.asset_name(bdata))
+                armature_inputs = self.get_armature_action_inputs(bobject)
                 ext = '.zip' if self.is_compress(bdata) else ''
                 if ext == '' and not bpy.data.worlds['Arm'].arm_minimize:
                     ext = '.json'
@@ -1000,7 +1224,9 @@ class ArmoryExporter:
                     bobject.animation_data.action = action
                     fp = self.get_meshes_file_path('action_' + armatureid + '_' + aname, compressed=self.is_compress(bdata))
                     assets.add(fp)
-                    if bdata.arm_cached == False or not os.path.exists(fp):
+                    key = self.get_action_key(action, [aname, self.is_compress(bdata), armature_inputs, self.get_animation_inputs(bobject)])
+                    # Checked on every bone, sampled bakes are never reused
+                    if not self.can_evaluate_bones(bobject, bobject.pose.bones, action) or not self.is_action_cached(fp, key):
                         print('Exporting armature action ' + aname)
                         bones = []
                         self.bone_tracks = []
@@ -1009,17 +1235,20 @@ class ArmoryExporter:
                                 boneo = {}
                                 self.export_bone(bobject, bone, scene, boneo, action)
                                 bones.append(boneo)
-                        self.write_bone_matrices(scene, action)
+                        profile_time = time.time()
+                        evaluated = self.write_bone_matrices(scene, action)
+                        if bpy.data.worlds['Arm'].arm_anim_reduce:
+                            self.reduce_bone_tracks(bpy.data.worlds['Arm'].arm_anim_tolerance)
+                        self.print_bake_time('armature', aname, profile_time, evaluated)
                         if len(bones) > 0 and 'anim' in bones[0]:
                             self.export_pose_markers(bones[0]['anim'], action)
                         # Save action separately
                         action_obj = {}
                         action_obj['name'] = aname
                         action_obj['objects'] = bones
-                        arm.utils.write_arm(fp, action_obj)
+                        arm.utils.write_arm(fp, action_obj, release=True)
+                        self.set_action_cached(fp, key, evaluated)
                 bobject.animation_data.action = orig_action
-                # TODO: cache per action
-                bdata.arm_cached = True
 
             if parento == None:
                 self.output['objects'].append(o)
@@ -1035,9 +1264,10 @@ class ArmoryExporter:
             for subbobject in bobject.children:
                 self.export_object(subbobject, scene, o)
 
-    def export_skin(self, bobject, armature, vert_list, o):
+    def export_skin(self, bobject, armature, job, o):
         # This function exports all skinning data, which includes the skeleton
         # and per-vertex bone influence data
+        # Runs on the main thread, vertex weights are gathered into job
         oskin = {}
         o['skin'] = oskin
 
@@ -1079,64 +1309,24 @@ class ArmoryExporter:
                 oskin['transformsI'].append(self.write_matrix(skeletonI))
 
         # Export the per-vertex bone influence data
-        group_remap = []
-        for group in bobject.vertex_groups:
-            group_name = group.name
-            for i in range(bone_count):
-                if bone_array[i].name == group_name:
-                    group_remap.append(i)
-                    break
-            else:
-                group_remap.append(-1)
-
-        bone_count_array = []
-        bone_index_array = []
-        bone_weight_array = []
-
-        warn_bones = False
-        vertices = bobject.data.vertices
-        for v in vert_list:
-            bone_count = 0
-            total_weight = 0.0
-            bone_values = []
-            for g in vertices[v.vertex_index].groups:
-                bone_index = group_remap[g.group]
-                bone_weight = g.weight
-                if bone_index >= 0 and bone_weight != 0.0:
-                    bone_values.append((bone_weight, bone_index))
-                    total_weight += bone_weight
-                    bone_count += 1
-
-            # Take highest weights
-            bone_values.sort()
-            bone_values.reverse();
-
-            if bone_count > 4: # Four bones max
-                bone_count = 4
-                bone_values = bone_values[:4]
-                warn_bones = True
-            bone_count_array.append(bone_count)
-
-            for bv in bone_values:
-                bone_weight_array.append(bv[0])
-                bone_index_array.append(bv[1])
-
-            if total_weight != 0.0:
-                normalizer = 1.0 / total_weight
-                for i in range(-bone_count, 0):
-                    bone_weight_array[i] *= normalizer
-
-        if warn_bones:
-            log.warn(bobject.name + ' - more than 4 bones influence single vertex - taking highest weights')
-
-        # Write the bone count array. There is one entry per vertex.
-        oskin['bone_count_array'] = bone_count_array
-
-        # Write the bone index array. The number of entries is the sum of the bone counts for all vertices.
-        oskin['bone_index_array'] = bone_index_array
-
-        # Write the bone weight array. The number of entries is the sum of the bone counts for all vertices.
-        oskin['bone_weight_array'] = bone_weight_array
+        bone_map = {}
+        for i in range(bone_count):
+            bone_map[bone_array[i].name] = i
+        group_remap = [bone_map.get(group.name, -1) for group in bobject.vertex_groups]
+
+        # Flatten vertex group entries, influences are picked by export_skin_weights
+        counts, groups, weights = self.get_vertex_groups(bobject.data)
+        job['skin'] = {}
+        job['skin']['name'] = bobject.name
+        job['skin']['group_remap'] = np.array(group_remap, dtype='<i4')
+        job['skin']['counts'] = counts
+        job['skin']['groups'] = groups
+        job['skin']['weights'] = weights
+
+        # Filled in by export_skin_weights
+        oskin['bone_count_array'] = None
+        oskin['bone_index_array'] = None
+        oskin['bone_weight_array'] = None
 
         # Bone constraints
         for bone in armature.pose.bones:
@@ -1145,6 +1335,37 @@ class ArmoryExporter:
                     oskin['constraints'] = []
                 self.add_constraints(bone, oskin, bone=True)
 
+    def get_vertex_groups(self, mesh):
+        # Vertex group entries of all vertices, flattened into per vertex counts, group indices and weights
+        # Blender has no flat access to deform weights, each vertex is copied with
+        # foreach_get straight into its slice of the output buffers
+        vertices = mesh.vertices
+        counts = np.fromiter((len(v.groups) for v in vertices), dtype='<i4', count=len(vertices))
+        ends = np.cumsum(counts).tolist()
+        groups = np.empty(ends[-1] if len(ends) > 0 else 0, dtype='<i4')
+        weights = np.empty(len(groups), dtype='<f4')
+        start = 0
+        for v, end in zip(vertices, ends):
+            if end > start:
+                v.groups.foreach_get('group', groups[start:end])
+                v.groups.foreach_get('weight', weights[start:end])
+            start = end
+        return counts, groups, weights.astype(np.float64)
+
+    def export_skin_weights(self, skin, vert_list, oskin):
+        # Pick the four strongest influences of each exported vertex, runs on export workers
+        bone_count, bone_index, bone_weight, clamped = mesh_ops.skin_influences(skin['counts'], skin['groups'], skin['weights'], skin['group_remap'], vert_list)
+        if clamped:
+            log.warn(skin['name'] + ' - more than 4 bones influence single vertex - taking highest weights')
+
+        used = np.arange(4) < bone_count[:, None]
+        # Write the bone count array. There is one entry per vertex.
+        oskin['bone_count_array'] = bone_count
+        # Write the bone index array. The number of entries is the sum of the bone counts for all vertices.
+        oskin['bone_index_array'] = bone_index[used]
+        # Write the bone weight array. The number of entries is the sum of the bone counts for all vertices.
+        oskin['bone_weight_array'] = bone_weight[used]
+
     # def export_skin_fast(self, bobject, armature, vert_list, o):
     #     oskin = {}
     #     o['skin'] = oskin
@@ -1180,74 +1401,19 @@ class ArmoryExporter:
     #     oskin['bone_weight_array'] = bone_weight_array
 
     def calc_tangents(self, posa, nora, uva, ias):
-        vertex_count = int(len(posa) / 3)
-        tangents = [0] * vertex_count * 3
-        # bitangents = [0] * vertex_count * 3
-        for ar in ias:
-            ia = ar['values']
-            triangle_count = int(len(ia) / 3)
-            for i in range(0, triangle_count):
-                i0 = ia[i * 3 + 0]
-                i1 = ia[i * 3 + 1]
-                i2 = ia[i * 3 + 2]
-                # TODO: Slow
-                v0 = Vector((posa[i0 * 3 + 0], posa[i0 * 3 + 1], posa[i0 * 3 + 2]))
-                v1 = Vector((posa[i1 * 3 + 0], posa[i1 * 3 + 1], posa[i1 * 3 + 2]))
-                v2 = Vector((posa[i2 * 3 + 0], posa[i2 * 3 + 1], posa[i2 * 3 + 2]))
-                uv0 = Vector((uva[i0 * 2 + 0], uva[i0 * 2 + 1]))
-                uv1 = Vector((uva[i1 * 2 + 0], uva[i1 * 2 + 1]))
-                uv2 = Vector((uva[i2 * 2 + 0], uva[i2 * 2 + 1]))
-
-                tangent = ArmoryExporter.calc_tangent(v0, v1, v2, uv0, uv1, uv2)
-
-                tangents[i0 * 3 + 0] += tangent.x
-                tangents[i0 * 3 + 1] += tangent.y
-                tangents[i0 * 3 + 2] += tangent.z
-                tangents[i1 * 3 + 0] += tangent.x
-                tangents[i1 * 3 + 1] += tangent.y
-                tangents[i1 * 3 + 2] += tangent.z
-                tangents[i2 * 3 + 0] += tangent.x
-                tangents[i2 * 3 + 1] += tangent.y
-                tangents[i2 * 3 + 2] += tangent.z
-                # bitangents[i0 * 3 + 0] += bitangent.x
-                # bitangents[i0 * 3 + 1] += bitangent.y
-                # bitangents[i0 * 3 + 2] += bitangent.z
-                # bitangents[i1 * 3 + 0] += bitangent.x
-                # bitangents[i1 * 3 + 1] += bitangent.y
-                # bitangents[i1 * 3 + 2] += bitangent.z
-                # bitangents[i2 * 3 + 0] += bitangent.x
-                # bitangents[i2 * 3 + 1] += bitangent.y
-                # bitangents[i2 * 3 + 2] += bitangent.z
-
-        # Orthogonalize
-        for i in range(0, vertex_count):
-            # Slow
-            t = Vector((tangents[i * 3], tangents[i * 3 + 1], tangents[i * 3 + 2]))
-            # b = Vector((bitangents[i * 3], bitangents[i * 3 + 1], bitangents[i * 3 + 2]))
-            n = Vector((nora[i * 3], nora[i * 3 + 1], nora[i * 3 + 2]))
-            v = t - n * n.dot(t)
-            v.normalize()
-            # Calculate handedness
-            # cnv = n.cross(v)
-            # if cnv.dot(b) < 0.0:
-                # v = v * -1.0
-            tangents[i * 3] = v.x
-            tangents[i * 3 + 1] = v.y
-            tangents[i * 3 + 2] = v.z
-        return tangents
-
-    def write_mesh(self, bobject, fp, o):
+        indices = np.concatenate([np.asarray(ar['values'], dtype='<i4') for ar in ias]) if len(ias) > 0 else []
+        tangents = mesh_ops.calc_tangents(posa, nora, uva, indices)
+        return tangents.ravel()
+
+    def write_mesh_file(self, fp, o, minimize):
         # One mesh data per file
-        if ArmoryExporter.option_mesh_per_file:
-            mesh_obj = {}
-            mesh_obj['mesh_datas'] = [o]
-            arm.utils.write_arm(fp, mesh_obj)
-            bobject.data.arm_cached = True
-            bobject.arm_cached = True
-            # if bobject.type != 'FONT' and bobject.type != 'META':
-                # bobject.data.arm_cached_verts = len(bobject.data.vertices)
-                # bobject.data.arm_cached_edges = len(bobject.data.edges)
-        else:
+        mesh_obj = {}
+        mesh_obj['mesh_datas'] = [o]
+        # Free vertex buffers as soon as they are written
+        arm.utils.write_arm(fp, mesh_obj, release=True, minimize=minimize)
+
+    def write_mesh(self, bobject, o):
+        if not ArmoryExporter.option_mesh_per_file:
             self.output['mesh_datas'].append(o)
 
     def make_va(self, attrib, size, values):
@@ -1257,22 +1423,55 @@ class ArmoryExporter:
         va['values'] = values
         return va
 
-    def export_mesh_data(self, exportMesh, bobject, fp, o):
+    def get_mesh_buffers(self, exportMesh):
+        # Pull per-loop attributes into flat typed buffers
+        loops = exportMesh.loops
+        num_loops = len(loops)
+        b = {}
+        vert_index = np.empty(num_loops, dtype='<i4')
+        loops.foreach_get('vertex_index', vert_index)
+        co = np.empty(len(exportMesh.vertices) * 3, dtype='<f4')
+        exportMesh.vertices.foreach_get('co', co)
+        b['vertex_index'] = vert_index
+        b['pos'] = co.reshape(-1, 3)[vert_index]
+        b['nor'] = np.empty(num_loops * 3, dtype='<f4')
+        loops.foreach_get('normal', b['nor'])
+        b['uvs'] = []
+        for layer in exportMesh.uv_layers:
+            uv = np.empty(num_loops * 2, dtype='<f4')
+            layer.data.foreach_get('uv', uv)
+            b['uvs'].append(uv)
+        b['col'] = None
+        if len(exportMesh.vertex_colors) > 0:
+            col_size = 4 if bpy.app.version >= (2, 80, 1) else 3
+            b['col'] = np.empty(num_loops * col_size, dtype='<f4')
+            exportMesh.vertex_colors[0].data.foreach_get('color', b['col'])
+        polys = exportMesh.polygons
+        b['loop_start'] = np.empty(len(polys), dtype='<i4')
+        polys.foreach_get('loop_start', b['loop_start'])
+        b['loop_total'] = np.empty(len(polys), dtype='<i4')
+        polys.foreach_get('loop_total', b['loop_total'])
+        b['material_index'] = np.empty(len(polys), dtype='<i4')
+        polys.foreach_get('material_index', b['material_index'])
+        return b
+
+    def get_mesh_job(self, exportMesh, bobject):
+        # Gather everything export_mesh_data needs from Blender, runs on the main thread
         exportMesh.calc_normals_split()
         exportMesh.calc_tessface() # free_mpoly=True
-        vert_list = { Vertex(exportMesh, loop) : 0 for loop in exportMesh.loops}.keys()
-        num_verts = len(vert_list)
+        job = {}
+        job['buffers'] = self.get_mesh_buffers(exportMesh)
         num_uv_layers = len(exportMesh.uv_layers)
         has_tex = self.get_export_uvs(exportMesh) == True and num_uv_layers > 0
         if self.has_baked_material(bobject, exportMesh.materials):
             has_tex = True
-        has_tex1 = has_tex == True and num_uv_layers > 1
         num_colors = len(exportMesh.vertex_colors)
-        has_col = self.get_export_vcols(exportMesh) == True and num_colors > 0
-        has_tang = self.has_tangents(exportMesh)
+        job['has_tex'] = has_tex
+        job['has_tex1'] = has_tex == True and num_uv_layers > 1
+        job['has_col'] = self.get_export_vcols(exportMesh) == True and num_colors > 0
+        job['has_tang'] = self.has_tangents(exportMesh)
+        job['weld_epsilon'] = bpy.data.worlds['Arm'].arm_weld_epsilon
 
-        vdata = [0] * num_verts * 3
-        ndata = [0] * num_verts * 3
         if has_tex:
             # Get active uvmap
             t0map = 0
@@ -1291,49 +1490,65 @@ class ArmoryExporter:
                         if uv_layers[i].active_render:
                             t0map = i
                             break
-            t1map = 1 if t0map == 0 else 0
-            # Alloc data
-            t0data = [0] * num_verts * 2
-            if has_tex1:
-                t1data = [0] * num_verts * 2
-        if has_col:
-            cdata = [0] * num_verts * 3
-
-
-        # va_stride = 3 + 3 # pos + nor
-        # va_name = 'pos_nor'
-        # if has_tex:
-        #     va_stride += 2
-        #     va_name += '_tex'
-        #     if has_tex1:
-        #         va_stride += 2
-        #         va_name += '_tex1'
-        # if has_col > 0:
-        #     va_stride += 3
-        #     va_name += '_col'
-        # if has_tang:
-        #     va_stride += 3
-        #     va_name += '_tang'
-        # vdata = [0] * num_verts * va_stride
+            job['t0map'] = t0map
+            job['t1map'] = 1 if t0map == 0 else 0
+
+        # Primitive per material name, in slot order
+        materials = exportMesh.materials
+        prims = {ma.name if ma else '': [] for ma in materials}
+        if not prims:
+            prims = {'': []}
+        prim_names = list(prims.keys())
+        job['prim_names'] = prim_names
+        job['slot_prim'] = None
+        if len(materials) > 0:
+            job['slot_prim'] = np.array([prim_names.index(ma.name if ma else '') for ma in materials], dtype='<i4')
+        # Find material index for multi-mat mesh
+        job['prim_material'] = [0] * len(prim_names)
+        if len(materials) > 1:
+            for prim_index, mat in enumerate(prim_names):
+                for i in range(0, len(materials)):
+                    if (materials[i] != None and mat == materials[i].name) or \
+                       (materials[i] == None and mat == ''): # Default material for empty slots
+                        job['prim_material'][prim_index] = i
+                        break
+        return job
+
+    def export_mesh_data(self, job, o):
+        # Builds vertex and index arrays from gathered buffers, must not touch bpy
+        # as it runs on export worker threads
+        b = job['buffers']
+        has_tex = job['has_tex']
+        has_tex1 = job['has_tex1']
+        has_col = job['has_col']
+        has_tang = job['has_tang']
+
+        # Weld loops sharing position, normal, uvs and color
+        num_loops = len(b['vertex_index'])
+        columns = [b['pos'], b['nor'].reshape(num_loops, 3)] + [uv.reshape(num_loops, 2) for uv in b['uvs']]
+        if b['col'] is not None:
+            columns.append(b['col'].reshape(num_loops, -1))
+        verts, loop_to_vert = mesh_ops.dedup_vertices(columns, epsilon=job['weld_epsilon'])
+        num_verts = len(verts)
+
+        if has_tex:
+            t0map = job['t0map']
+            t1map = job['t1map']
 
         # Make arrays
-        for i, vtx in enumerate(vert_list):
-            vtx.index = i
-            co = vtx.co
-            normal = vtx.normal
-            for j in range(3):
-                vdata[(i * 3) + j] = co[j]
-                ndata[(i * 3) + j] = normal[j]
-            if has_tex:
-                t0data[i * 2] = vtx.uvs[t0map][0]
-                t0data[i * 2 + 1] = 1.0 - vtx.uvs[t0map][1] # Reverse TCY
-                if has_tex1:
-                    t1data[i * 2] = vtx.uvs[t1map][0]
-                    t1data[i * 2 + 1] = 1.0 - vtx.uvs[t1map][1]
-            if has_col > 0:
-                cdata[i * 3] = pow(vtx.col[0], 2.2)
-                cdata[i * 3 + 1] = pow(vtx.col[1], 2.2)
-                cdata[i * 3 + 2] = pow(vtx.col[2], 2.2)
+        vdata = b['pos'][verts].ravel()
+        ndata = b['nor'].reshape(-1, 3)[verts].ravel()
+        if has_tex:
+            t0 = b['uvs'][t0map].reshape(-1, 2)[verts].astype(np.float64)
+            t0[:, 1] = 1.0 - t0[:, 1] # Reverse TCY
+            t0data = t0.ravel()
+            if has_tex1:
+                t1 = b['uvs'][t1map].reshape(-1, 2)[verts].astype(np.float64)
+                t1[:, 1] = 1.0 - t1[:, 1]
+                t1data = t1.ravel()
+        if has_col:
+            col = b['col'].reshape(len(loop_to_vert), -1)
+            cdata = np.power(col[verts, :3].astype(np.float64), 2.2).ravel()
 
         # Output
         o['vertex_arrays'] = []
@@ -1354,44 +1569,25 @@ class ArmoryExporter:
             o['vertex_arrays'].append(ca)
 
         # Indices
-        prims = {ma.name if ma else '': [] for ma in exportMesh.materials}
-        if not prims:
-            prims = {'': []}
-
-        vert_dict = {i : v for v in vert_list for i in v.loop_indices}
-        for poly in exportMesh.polygons:
-            first = poly.loop_start
-            if len(exportMesh.materials) == 0:
-                prim = prims['']
-            else:
-                mat = exportMesh.materials[min(poly.material_index, len(exportMesh.materials) - 1)]
-                prim = prims[mat.name if mat else '']
-            indices = [vert_dict[i].index for i in range(first, first+poly.loop_total)]
-
-            if poly.loop_total == 3:
-                prim += indices
-            elif poly.loop_total > 3:
-                for i in range(poly.loop_total-2):
-                    prim += (indices[-1], indices[i], indices[i + 1])
+        prim_names = job['prim_names']
+        slot_prim = job['slot_prim']
+        if slot_prim is None:
+            poly_prim = np.zeros(len(b['material_index']), dtype='<i4')
+        else:
+            poly_prim = slot_prim[np.minimum(b['material_index'], len(slot_prim) - 1)]
+        tris, tri_poly = mesh_ops.triangulate(b['loop_start'], b['loop_total'])
+        tri_prim = poly_prim[tri_poly]
+        tri_verts = loop_to_vert[tris]
 
         # Write indices
         o['index_arrays'] = []
-        for mat, prim in prims.items():
-            idata = [0] * len(prim)
-            for i, v in enumerate(prim):
-                idata[i] = v
+        for prim_index, mat in enumerate(prim_names):
+            idata = tri_verts[tri_prim == prim_index].ravel()
             if len(idata) == 0: # No face assigned
                 continue
             ia = {}
             ia['values'] = idata
-            ia['material'] = 0
-            # Find material index for multi-mat mesh
-            if len(exportMesh.materials) > 1:
-                for i in range(0, len(exportMesh.materials)):
-                    if (exportMesh.materials[i] != None and mat == exportMesh.materials[i].name) or \
-                       (exportMesh.materials[i] == None and mat == ''): # Default material for empty slots
-                        ia['material'] = i
-                        break
+            ia['material'] = job['prim_material'][prim_index]
             o['index_arrays'].append(ia)
         # Sort by material index
         # o['index_arrays'] = sorted(o['index_arrays'], key=lambda k: k['material']) 
@@ -1402,7 +1598,8 @@ class ArmoryExporter:
             tanga = self.make_va('tang', 3, tanga_vals)
             o['vertex_arrays'].append(tanga)
 
-        return vert_list
+        # Source vertex of each exported vertex, used for skinning
+        return b['vertex_index'][verts]
 
     def has_tangents(self, exportMesh):
         return self.get_export_uvs(exportMesh) == True and self.get_export_tangents(exportMesh) == True and len(exportMesh.uv_layers) > 0
@@ -1414,14 +1611,13 @@ class ArmoryExporter:
         oid = arm.utils.safestr(objectRef[1]["structName"])
 
         # No export necessary
+        fp = None
         if ArmoryExporter.option_mesh_per_file:
             fp = self.get_meshes_file_path('mesh_' + oid, compressed=self.is_compress(bobject.data))
             assets.add(fp)
             # if hasattr(bobject.data, 'arm_sdfgen') and bobject.data.arm_sdfgen:
                 # sdf_path = fp.replace('/mesh_', '/sdf_')
                 # assets.add(sdf_path)
-            if self.is_mesh_cached(bobject) == True and os.path.exists(fp):
-                return
 
         # Check if mesh is using instanced rendering
         is_instanced, instance_offsets = self.object_process_instancing(bobject, objectRef[1]["objectTable"])
@@ -1432,13 +1628,40 @@ class ArmoryExporter:
                 log.warn('{0} users {1} and {2} differ in modifier stack - use Make Single User(U) - Object & Data for now'.format(oid, bobject.name, table[i].name))
                 break
 
-        print('Exporting mesh ' + arm.utils.asset_name(bobject.data))
-
         o = {}
         o['name'] = oid
         mesh = objectRef[0]
         structFlag = False;
 
+        armature = bobject.find_armature()
+        apply_modifiers = not armature
+
+        # Written after vertex and index arrays
+        tail = {}
+
+        # Skeleton and vertex weights are read here, influences are picked on workers
+        skin = {}
+        if armature:
+            self.export_skin(bobject, armature, skin, tail)
+
+        # Save offset data for instanced rendering
+        if is_instanced == True:
+            tail['instance_offsets'] = instance_offsets
+
+        # Export usage
+        if bobject.data.arm_dynamic_usage:
+            tail['dynamic_usage'] = bobject.data.arm_dynamic_usage
+
+        # Reuse output of unchanged source data and export options, checked
+        # before modifiers are applied and buffers are pulled out of Blender
+        key = None
+        if ArmoryExporter.option_mesh_per_file:
+            key = self.get_mesh_source_key(bobject, mesh, apply_modifiers, skin, tail)
+            if key != None and self.is_mesh_cached(bobject, fp, oid, key):
+                return
+
+        print('Exporting mesh ' + arm.utils.asset_name(bobject.data))
+
         # Save the morph state if necessary
         activeShapeKeyIndex = bobject.active_shape_key_index
         showOnlyShapeKey = bobject.show_only_shape_key
@@ -1487,9 +1710,6 @@ class ArmoryExporter:
             shapeKeys.key_blocks[0].value = 1.0
             mesh.update()
 
-        armature = bobject.find_armature()
-        apply_modifiers = not armature
-
         # Apply all modifiers to create a new mesh with tessfaces
         if bpy.app.version >= (2, 80, 1):
             exportMesh = bobject.to_mesh(bpy.context.depsgraph, apply_modifiers, True, False)
@@ -1503,15 +1723,34 @@ class ArmoryExporter:
         if len(exportMesh.uv_layers) > 2:
             log.warn(oid + ' exceeds maximum of 2 UV Maps supported')
 
-        # Process meshes
-        vert_list = self.export_mesh_data(exportMesh, bobject, fp, o)
-        if armature:
-            self.export_skin(bobject, armature, vert_list, o)
+        # Pull buffers out of Blender, processing is left to export workers
+        job = self.get_mesh_job(exportMesh, bobject)
+
+        # Restore the morph state
+        if shapeKeys:
+            bobject.active_shape_key_index = activeShapeKeyIndex
+            bobject.show_only_shape_key = showOnlyShapeKey
+
+            for m in range(len(currentMorphValue)):
+                shapeKeys.key_blocks[m].value = currentMorphValue[m]
+
+            mesh.update()
+
+        job.update(skin)
 
-        # Save aabb
+        # Modifiers reading other objects are keyed from the extracted buffers
+        if ArmoryExporter.option_mesh_per_file and key == None:
+            key = self.get_mesh_key(job, tail)
+            if self.is_mesh_cached(bobject, fp, oid, key):
+                return
+
+        self.submit_mesh(bobject, fp, job, o, tail, key)
+
+    def calc_bounds(self, o):
+        # Writes per index array bounds and a bounding sphere,
+        # returns size of the axis-aligned bounding box around the origin
         for va in o['vertex_arrays']:
             if va['attrib'].startswith('pos'):
-                positions = va['values']
                 stride = 0
                 ar = va['attrib'].split('_')
                 for a in ar:
@@ -1521,48 +1760,69 @@ class ArmoryExporter:
                         stride += 2
                     elif a == 'bone' or a == 'weight':
                         stride += 4
-                aabb_min = [-0.01, -0.01, -0.01]
-                aabb_max = [0.01, 0.01, 0.01]
-                i = 0
-                while i < len(positions):
-                    if positions[i] > aabb_max[0]:
-                        aabb_max[0] = positions[i];
-                    if positions[i + 1] > aabb_max[1]:
-                        aabb_max[1] = positions[i + 1];
-                    if positions[i + 2] > aabb_max[2]:
-                        aabb_max[2] = positions[i + 2];
-                    if positions[i] < aabb_min[0]:
-                        aabb_min[0] = positions[i];
-                    if positions[i + 1] < aabb_min[1]:
-                        aabb_min[1] = positions[i + 1];
-                    if positions[i + 2] < aabb_min[2]:
-                        aabb_min[2] = positions[i + 2];
-                    i += stride;
-                if hasattr(bobject.data, 'arm_aabb'):
-                    bobject.data.arm_aabb = [abs(aabb_min[0]) + abs(aabb_max[0]), abs(aabb_min[1]) + abs(aabb_max[1]), abs(aabb_min[2]) + abs(aabb_max[2])]
-                break
+                positions = np.asarray(va['values'], dtype=np.float64).reshape(-1, stride)[:, :3]
+                for ia in o['index_arrays']:
+                    sub = positions[np.asarray(ia['values']).ravel()]
+                    if len(sub) > 0:
+                        ia['aabb'] = np.concatenate((sub.min(axis=0), sub.max(axis=0))).tolist()
+                o['bounding_sphere'] = mesh_ops.bounding_sphere(positions).tolist()
+                aabb_min = np.array([-0.01, -0.01, -0.01])
+                aabb_max = np.array([0.01, 0.01, 0.01])
+                if len(positions) > 0:
+                    aabb_min = np.minimum(aabb_min, positions.min(axis=0))
+                    aabb_max = np.maximum(aabb_max, positions.max(axis=0))
+                return (np.abs(aabb_min) + np.abs(aabb_max)).tolist()
         # Not axis-aligned
         # arm_aabb = [bobject.matrix_world * Vector(v) for v in bobject.bound_box]
+        return None
 
-        # Restore the morph state
-        if shapeKeys:
-            bobject.active_shape_key_index = activeShapeKeyIndex
-            bobject.show_only_shape_key = showOnlyShapeKey
-
-            for m in range(len(currentMorphValue)):
-                shapeKeys.key_blocks[m].value = currentMorphValue[m]
-
-            mesh.update()
-
-        # Save offset data for instanced rendering
-        if is_instanced == True:
-            o['instance_offsets'] = instance_offsets
-
-        # Export usage
-        if bobject.data.arm_dynamic_usage:
-            o['dynamic_usage'] = bobject.data.arm_dynamic_usage
-
-        self.write_mesh(bobject, fp, o)
+    def process_mesh(self, job, o, tail, fp, minimize, key):
+        # Runs on export worker threads, must not touch bpy
+        data = self.mesh_cache.read(key) if key != None else None
+        if data != None:
+            # Same geometry was exported before under another name or format
+            entry = armpack.unpackb(data)
+            o.update(entry['mesh'])
+            aabb = entry['aabb']
+        else:
+            vert_list = self.export_mesh_data(job, o)
+            o.update(tail)
+            if 'skin' in job:
+                self.export_skin_weights(job['skin'], vert_list, o['skin'])
+            aabb = self.calc_bounds(o)
+            if key != None:
+                entry = {}
+                entry['aabb'] = aabb
+                entry['mesh'] = {k: v for k, v in o.items() if k != 'name'}
+                self.mesh_cache.write(key, armpack.packb(entry))
+        if ArmoryExporter.option_mesh_per_file:
+            self.write_mesh_file(fp, o, minimize)
+        return aabb
+
+    def submit_mesh(self, bobject, fp, job, o, tail, key=None):
+        minimize = bpy.data.worlds['Arm'].arm_minimize
+        record = None
+        if key != None:
+            record = {'key': key, 'name': o['name'], 'minimize': minimize}
+        args = (job, o, tail, fp, minimize, key)
+        if self.mesh_pool == None:
+            self.finish_mesh(bobject, fp, o, self.process_mesh(*args), record)
+            return
+        self.mesh_futures.append((bobject, fp, o, self.mesh_pool.submit(self.process_mesh, *args), record))
+        # Limit buffers held by queued meshes
+        while len(self.mesh_futures) > 2 * self.mesh_threads:
+            self.finish_mesh(*self.mesh_futures.pop(0))
+
+    def finish_mesh(self, bobject, fp, o, aabb, record=None):
+        # Apply worker results to Blender data on the main thread
+        if isinstance(aabb, concurrent.futures.Future):
+            aabb = aabb.result()
+        if aabb != None and hasattr(bobject.data, 'arm_aabb'):
+            bobject.data.arm_aabb = aabb
+        if record != None:
+            record['aabb'] = aabb
+            self.mesh_manifest.set(os.path.basename(fp), record)
+        self.write_mesh(bobject, o)
 
     def export_lamp(self, objectRef):
         # This function exports a single lamp object
@@ -1642,6 +1902,10 @@ class ArmoryExporter:
             o['strength'] = 1000.0 * 0.026
             o['type'] = 'point'
 
+        # Tile of the lamp profile in the iestexture atlas
+        if objref.name in make_renderpath.ies_rects:
+            o['ies_rect'] = list(make_renderpath.ies_rects[objref.name])
+
         self.output['lamp_datas'].append(o)
 
     def get_camera_clear_color(self):
@@ -1773,30 +2037,11 @@ class ArmoryExporter:
             o['override_context'] = {}
             o['override_context']['cull_mode'] = 'none'
 
-    def signature_traverse(self, node, sign):
-        sign += node.type + '-'
-        if node.type == 'TEX_IMAGE' and node.image != None:
-            sign += node.image.filepath + '-'
-        for inp in node.inputs:
-            if inp.is_linked:
-                sign = self.signature_traverse(inp.links[0].from_node, sign)
-            else:
-                # Unconnected socket
-                if not hasattr(inp, 'default_value'):
-                    sign += 'o'
-                elif inp.type == 'RGB' or inp.type == 'RGBA' or inp.type == 'VECTOR':
-                    sign += str(inp.default_value[0])
-                    sign += str(inp.default_value[1])
-                    sign += str(inp.default_value[2])
-                else:
-                    sign += str(inp.default_value)
-        return sign
-
     def get_signature(self, mat):
         nodes = mat.node_tree.nodes
         output_node = cycles.node_by_type(nodes, 'OUTPUT_MATERIAL')
         if output_node != None:
-            sign = self.signature_traverse(output_node, '')
+            sign = mat_utils.node_signature(output_node, {}, values=True)
             return sign
 
     def export_materials(self):
@@ -2015,9 +2260,27 @@ class ArmoryExporter:
                     assets.add(arm.utils.asset_path(sound.filepath))
             for objectRef in self.speakerArray.items():
                 self.export_speaker(objectRef)
-        for objectRef in self.meshArray.items():
-            self.output['mesh_datas'] = [];
-            self.export_mesh(objectRef, scene)
+        # Meshes are gathered on the main thread and processed by a worker pool
+        self.mesh_threads = arm.utils.get_export_threads() if ArmoryExporter.option_mesh_per_file else 1
+        self.mesh_pool = None
+        self.mesh_futures = []
+        self.mesh_cache = build_cache.Store(self.get_mesh_cache_path())
+        self.mesh_manifest = build_cache.Manifest(self.mesh_cache.path + '/manifest.json')
+        if self.mesh_threads > 1:
+            self.mesh_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.mesh_threads)
+        try:
+            for objectRef in self.meshArray.items():
+                self.output['mesh_datas'] = [];
+                self.export_mesh(objectRef, scene)
+            while len(self.mesh_futures) > 0:
+                self.finish_mesh(*self.mesh_futures.pop(0))
+            self.mesh_manifest.save()
+            # Entries replaced by a newer export of their mesh are never read again
+            self.mesh_cache.prune([record['key'] for record in self.mesh_manifest.entries.values()])
+        finally:
+            if self.mesh_pool != None:
+                self.mesh_pool.shutdown()
+                self.mesh_pool = None
 
     def execute(self, context, filepath, scene=None):
         profile_time = time.time()
@@ -2050,6 +2313,7 @@ class ArmoryExporter:
         self.objectToArmObjectDict = dict()
         self.active_layers = []
         self.bone_tracks = []
+        self.action_manifest = build_cache.Manifest(self.get_mesh_cache_path() + '/actions.json')
         for i in range(0, len(self.scene.layers)):
             if self.scene.layers[i] == True:
                 self.active_layers.append(i)
@@ -2256,20 +2520,92 @@ class ArmoryExporter:
         if scene.frame_current != current_frame:
             scene.frame_set(current_frame, current_subframe)
 
+        self.action_manifest.save()
+
         print('Scene built in ' + str(time.time() - profile_time))
         return {'FINISHED'}
 
     # Callbacks
-    def is_mesh_cached(self, bobject):
-        if bobject.type == 'FONT' or bobject.type == 'META': # No verts
-            return bobject.data.arm_cached
-        # if bobject.data.arm_cached_verts != len(bobject.data.vertices):
-            # return False
-        # if bobject.data.arm_cached_edges != len(bobject.data.edges):
-            # return False
-        if not bobject.arm_cached:
+    def get_mesh_key(self, job, tail):
+        # Hash of everything the exported mesh data depends on, except its name
+        h = build_cache.new_hash()
+        build_cache.update_hash(h, [ArmoryExporter.mesh_cache_version, 'buffers'])
+        build_cache.update_hash(h, job)
+        build_cache.update_hash(h, tail)
+        return h.hexdigest()
+
+    def get_mesh_source_key(self, bobject, mesh, apply_modifiers, skin, tail):
+        # Same as get_mesh_key() from the inputs of to_mesh, None when a modifier
+        # reads another datablock which is not part of the key
+        if not isinstance(mesh, bpy.types.Mesh):
+            return None
+        h = build_cache.new_hash()
+        build_cache.update_hash(h, [ArmoryExporter.mesh_cache_version, 'source', apply_modifiers])
+        if apply_modifiers:
+            for mod in bobject.modifiers:
+                for prop in mod.bl_rna.properties:
+                    if prop.type == 'POINTER' and prop.identifier != 'rna_type' and isinstance(getattr(mod, prop.identifier), bpy.types.ID):
+                        return None
+                build_cache.update_hash(h, self.get_rna_values(mod))
+            build_cache.update_hash(h, [group.name for group in bobject.vertex_groups])
+            if len(bobject.vertex_groups) > 0 and not 'skin' in skin:
+                build_cache.update_hash(h, self.get_vertex_groups(mesh))
+        build_cache.update_hash(h, self.get_mesh_inputs(mesh))
+        materials = [slot.material for slot in bobject.material_slots]
+        build_cache.update_hash(h, [(ma.name, ma.export_uvs, ma.export_vcols, ma.export_tangents) if ma != None else None for ma in materials])
+        build_cache.update_hash(h, self.has_baked_material(bobject, materials))
+        build_cache.update_hash(h, bpy.data.worlds['Arm'].arm_weld_epsilon)
+        build_cache.update_hash(h, skin)
+        build_cache.update_hash(h, tail)
+        return h.hexdigest()
+
+    def get_mesh_inputs(self, mesh):
+        # Geometry, split normals, layers and shape keys of the source mesh
+        inputs = []
+        mesh.calc_normals_split()
+        for collection, attrs in [(mesh.vertices, [('co', 3, '<f4')]),
+                                  (mesh.loops, [('vertex_index', 1, '<i4'), ('normal', 3, '<f4')]),
+                                  (mesh.polygons, [('loop_start', 1, '<i4'), ('loop_total', 1, '<i4'), ('material_index', 1, '<i4')])]:
+            for attr, size, dtype in attrs:
+                values = np.empty(len(collection) * size, dtype=dtype)
+                collection.foreach_get(attr, values)
+                inputs.append(values)
+        mesh.free_normals_split()
+        if bpy.app.version >= (2, 80, 1):
+            uv_textures = mesh.uv_layers
+        else:
+            uv_textures = mesh.uv_textures
+        inputs.append([(layer.name, layer.active_render) for layer in uv_textures])
+        for layer in mesh.uv_layers:
+            uv = np.empty(len(mesh.loops) * 2, dtype='<f4')
+            layer.data.foreach_get('uv', uv)
+            inputs.append(uv)
+        if len(mesh.vertex_colors) > 0:
+            col_size = 4 if bpy.app.version >= (2, 80, 1) else 3
+            col = np.empty(len(mesh.loops) * col_size, dtype='<f4')
+            mesh.vertex_colors[0].data.foreach_get('color', col)
+            inputs.append(col)
+        shape_keys = ArmoryExporter.get_shape_keys(mesh)
+        if shape_keys:
+            inputs.append(shape_keys.use_relative)
+            for block in shape_keys.key_blocks:
+                co = np.empty(len(block.data) * 3, dtype='<f4')
+                block.data.foreach_get('co', co)
+                inputs.append([self.get_rna_values(block), block.relative_key.name, co])
+        return inputs
+
+    def is_mesh_cached(self, bobject, fp, name, key):
+        # Output file is still the one produced from key
+        record = self.mesh_manifest.get(os.path.basename(fp))
+        if record == None or record['key'] != key or record['name'] != name:
+            return False
+        if record['minimize'] != bpy.data.worlds['Arm'].arm_minimize:
+            return False
+        if not os.path.exists(self.get_output_path(fp)):
             return False
-        return bobject.data.arm_cached
+        if record['aabb'] != None and hasattr(bobject.data, 'arm_aabb'):
+            bobject.data.arm_aabb = record['aabb']
+        return True
 
     def get_export_tangents(self, mesh):
         for m in mesh.materials:
@@ -0,0 +1,163 @@
+# Bulk transform math on per-frame numpy arrays
+import numpy as np
+
+def _axis_rotation(axis, angles):
+    c = np.cos(angles)
+    s = np.sin(angles)
+    m = np.zeros((len(angles), 3, 3))
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    m[:, axis, axis] = 1.0
+    m[:, i, i] = c
+    m[:, i, j] = -s
+    m[:, j, i] = s
+    m[:, j, j] = c
+    return m
+
+def euler_to_matrix(euler, order='XYZ'):
+    # (n, 3) angles to (n, 3, 3) rotations, first axis in order is applied first
+    euler = np.asarray(euler, dtype=np.float64).reshape(-1, 3)
+    m = None
+    for a in order:
+        axis = 'XYZ'.index(a)
+        r = _axis_rotation(axis, euler[:, axis])
+        m = r if m is None else np.matmul(r, m)
+    return m
+
+def quat_normalize(quat):
+    # (n, 4) wxyz, zero quaternions become identity
+    quat = np.asarray(quat, dtype=np.float64).reshape(-1, 4)
+    length = np.sqrt(np.einsum('ij,ij->i', quat, quat))
+    out = np.zeros_like(quat)
+    out[:, 0] = 1.0
+    np.divide(quat, length[:, None], out=out, where=length[:, None] > 0.0)
+    return out
+
+def quat_multiply(a, b):
+    aw, ax, ay, az = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bw, bx, by, bz = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    return np.stack([aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw], axis=1)
+
+def quat_to_matrix(quat):
+    # (n, 4) unit wxyz quaternions to (n, 3, 3) rotations
+    quat = np.asarray(quat, dtype=np.float64).reshape(-1, 4)
+    w, x, y, z = quat[:, 0], quat[:, 1], quat[:, 2], quat[:, 3]
+    m = np.empty((len(quat), 3, 3))
+    m[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[:, 0, 1] = 2.0 * (x * y - w * z)
+    m[:, 0, 2] = 2.0 * (x * z + w * y)
+    m[:, 1, 0] = 2.0 * (x * y + w * z)
+    m[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[:, 1, 2] = 2.0 * (y * z - w * x)
+    m[:, 2, 0] = 2.0 * (x * z - w * y)
+    m[:, 2, 1] = 2.0 * (y * z + w * x)
+    m[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return m
+
+def compose(loc, rot, scale):
+    # Translation * rotation * scale, (n, 4, 4) from (n, 3) loc, (n, 3, 3) rot and (n, 3) scale
+    m = np.zeros((len(rot), 4, 4))
+    m[:, :3, :3] = rot * np.asarray(scale, dtype=np.float64).reshape(-1, 1, 3)
+    m[:, :3, 3] = loc
+    m[:, 3, 3] = 1.0
+    return m
+
+def matrix_to_quat(rot):
+    # (n, 3, 3) rotations to (n, 4) wxyz quaternions
+    rot = np.asarray(rot, dtype=np.float64).reshape(-1, 3, 3)
+    m00, m11, m22 = rot[:, 0, 0], rot[:, 1, 1], rot[:, 2, 2]
+    quat = np.empty((len(rot), 4))
+    # Pick the largest of w, x, y, z to divide by
+    cand = np.stack([m00 + m11 + m22, m00 - m11 - m22, m11 - m00 - m22, m22 - m00 - m11], axis=1)
+    best = np.argmax(cand, axis=1)
+    for k in range(4):
+        sel = best == k
+        if not sel.any():
+            continue
+        r = rot[sel]
+        s = np.sqrt(np.maximum(cand[sel, k] + 1.0, 0.0)) * 2.0
+        if k == 0:
+            q = [0.25 * s, (r[:, 2, 1] - r[:, 1, 2]) / s, (r[:, 0, 2] - r[:, 2, 0]) / s, (r[:, 1, 0] - r[:, 0, 1]) / s]
+        elif k == 1:
+            q = [(r[:, 2, 1] - r[:, 1, 2]) / s, 0.25 * s, (r[:, 0, 1] + r[:, 1, 0]) / s, (r[:, 0, 2] + r[:, 2, 0]) / s]
+        elif k == 2:
+            q = [(r[:, 0, 2] - r[:, 2, 0]) / s, (r[:, 0, 1] + r[:, 1, 0]) / s, 0.25 * s, (r[:, 1, 2] + r[:, 2, 1]) / s]
+        else:
+            q = [(r[:, 1, 0] - r[:, 0, 1]) / s, (r[:, 0, 2] + r[:, 2, 0]) / s, (r[:, 1, 2] + r[:, 2, 1]) / s, 0.25 * s]
+        quat[sel] = np.stack(q, axis=1)
+    return quat_normalize(quat)
+
+def quat_align(quat):
+    # Flip signs so consecutive quaternions lie in the same hemisphere
+    quat = np.array(quat, dtype=np.float64).reshape(-1, 4)
+    if len(quat) > 1:
+        flip = np.einsum('ij,ij->i', quat[1:], quat[:-1]) < 0.0
+        sign = np.cumprod(np.where(flip, -1.0, 1.0))
+        quat[1:] *= sign[:, None]
+    return quat
+
+def decompose(matrices):
+    # (n, 4, 4) transforms to (n, 3) translation, (n, 4) wxyz rotation and (n, 3) scale
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    loc = matrices[:, :3, 3].copy()
+    basis = matrices[:, :3, :3]
+    scale = np.sqrt(np.einsum('nij,nij->nj', basis, basis))
+    # Mirrored transforms keep the flip in x scale
+    scale[:, 0] *= np.where(np.linalg.det(basis) < 0.0, -1.0, 1.0)
+    rot = np.zeros_like(basis)
+    np.divide(basis, scale[:, None, :], out=rot, where=scale[:, None, :] != 0.0)
+    return loc, quat_align(matrix_to_quat(rot)), scale
+
+def nlerp(q0, q1, t):
+    # Normalized linear interpolation of wxyz quaternions along the shorter arc,
+    # the blend the runtime applies between sampled keys, q0 and q1 broadcast against t
+    q0 = np.asarray(q0, dtype=np.float64).reshape(-1, 4)
+    q1 = np.asarray(q1, dtype=np.float64).reshape(-1, 4)
+    t = np.asarray(t, dtype=np.float64).reshape(-1, 1)
+    d = np.einsum('ij,ij->i', q0, q1)[:, None]
+    q1 = np.where(d < 0.0, -q1, q1)
+    return quat_normalize(q0 + (q1 - q0) * t)
+
+def reduce_keys(frames, values, tolerance, interpolate=None):
+    # Indices of keys to keep so that interpolating between kept keys stays within tolerance
+    # of every dropped value, interpolate(a, b, t) defaults to linear
+    # First and last keys are always kept
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(frames), -1)
+    n = len(frames)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while len(stack) > 0:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        t = (frames[a + 1:b] - frames[a]) / (frames[b] - frames[a])
+        if interpolate != None:
+            approx = interpolate(values[a], values[b], t)
+        else:
+            approx = values[a] + (values[b] - values[a]) * t[:, None]
+        error = np.abs(approx - values[a + 1:b]).max(axis=1)
+        i = int(np.argmax(error))
+        if error[i] > tolerance:
+            split = a + 1 + i
+            keep[split] = True
+            stack.append((a, split))
+            stack.append((split, b))
+    return np.nonzero(keep)[0]
+
+def _interpolate_transform(a, b, t):
+    # Translation and scale lerp, rotation nlerp on packed loc, wxyz, scale rows
+    out = a + (b - a) * t[:, None]
+    out[:, 3:7] = nlerp(a[3:7], b[3:7], t)
+    return out
+
+def reduce_transform_keys(frames, matrices, tolerance):
+    # Indices of (n, 4, 4) sampled transforms to keep, error is measured on the decomposed
+    # translation, rotation and scale the runtime interpolates between neighbouring keys
+    loc, rot, scale = decompose(matrices)
+    return reduce_keys(frames, np.hstack([loc, rot, scale]), tolerance, interpolate=_interpolate_transform)
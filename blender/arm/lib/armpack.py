@@ -22,6 +22,8 @@
 #
 import struct
 import io
+import sys
+import array
 
 def _pack_integer(obj, fp):
     if obj < 0:
@@ -85,26 +87,68 @@ def _pack_binary(obj, fp):
     else:
         raise Exception("huge binary string")
 
-def _pack_array(obj, fp):
-    if len(obj) <= 15:
-        fp.write(struct.pack("B", 0x90 | len(obj)))
-    elif len(obj) <= 2**16 - 1:
-        fp.write(b"\xdc" + struct.pack(">H", len(obj)))
-    elif len(obj) <= 2**32 - 1:
-        fp.write(b"\xdd" + struct.pack(">I", len(obj)))
+def _typed_kind(obj):
+    # Element kind of buffer objects, b"\xca" for Float32 and b"\xd2" for Int32
+    if hasattr(obj, 'dtype'): # Numpy
+        kind = obj.dtype.kind
+    elif isinstance(obj, array.array):
+        kind = 'f' if obj.typecode in 'fd' else 'i'
+    else:
+        kind = 'f' if obj.format.lstrip('@=<>!') in 'fde' else 'i'
+    return b"\xca" if kind == 'f' else b"\xd2"
+
+def _typed_bytes(obj, marker):
+    # Big-endian 32-bit payload of a whole sequence in one call
+    if hasattr(obj, 'dtype'):
+        return obj.ravel().astype('>f4' if marker == b"\xca" else '>i4').tobytes()
+    code = 'f' if marker == b"\xca" else 'i'
+    if isinstance(obj, memoryview):
+        obj = obj.cast('B').cast(obj.format.lstrip('@=<>!'))
+    if isinstance(obj, (array.array, memoryview)) and obj.itemsize == 4 and \
+       (obj.typecode if isinstance(obj, array.array) else obj.format) == code:
+        a = array.array(code)
+        a.frombytes(obj.tobytes())
+    else:
+        a = array.array(code, obj)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a.tobytes()
+
+def _pack_array_header(length, fp):
+    if length <= 15:
+        fp.write(struct.pack("B", 0x90 | length))
+    elif length <= 2**16 - 1:
+        fp.write(b"\xdc" + struct.pack(">H", length))
+    elif length <= 2**32 - 1:
+        fp.write(b"\xdd" + struct.pack(">I", length))
     else:
         raise Exception("huge array")
 
+def _pack_typed_array(obj, fp):
+    # Numpy arrays, array.array and memoryview buffers
+    if hasattr(obj, 'dtype'):
+        length = obj.size
+    elif isinstance(obj, memoryview):
+        length = obj.nbytes // obj.itemsize
+    else:
+        length = len(obj)
+    _pack_array_header(length, fp)
+    if length > 0:
+        marker = _typed_kind(obj)
+        fp.write(marker)
+        fp.write(_typed_bytes(obj, marker))
+
+def _pack_array(obj, fp):
+    _pack_array_header(len(obj), fp)
+
     # Float32
     if len(obj) > 0 and isinstance(obj[0], float):
         fp.write(b"\xca")
-        for e in obj:
-            fp.write(struct.pack(">f", e))
+        fp.write(_typed_bytes(obj, b"\xca"))
     # Int32
     elif len(obj) > 0 and isinstance(obj[0], int):
         fp.write(b"\xd2")
-        for e in obj:
-            fp.write(struct.pack(">i", e))
+        fp.write(_typed_bytes(obj, b"\xd2"))
     # Regular
     else:
         for e in obj:
@@ -124,9 +168,24 @@ def _pack_map(obj, fp):
         pack(k, fp)
         pack(v, fp)
 
+_packers = {
+    type(None): _pack_nil,
+    bool: _pack_boolean,
+    int: _pack_integer,
+    float: _pack_float,
+    str: _pack_string,
+    bytes: _pack_binary,
+    list: _pack_array,
+    tuple: _pack_array,
+    dict: _pack_map,
+    array.array: _pack_typed_array,
+    memoryview: _pack_typed_array,
+}
+
 def pack(obj, fp):
-    if obj is None:
-        _pack_nil(obj, fp)
+    packer = _packers.get(type(obj))
+    if packer is not None:
+        packer(obj, fp)
     elif isinstance(obj, bool):
         _pack_boolean(obj, fp)
     elif isinstance(obj, int):
@@ -141,6 +200,11 @@ def pack(obj, fp):
         _pack_array(obj, fp)
     elif isinstance(obj, dict):
         _pack_map(obj, fp)
+    elif hasattr(obj, 'dtype') and hasattr(obj, 'ndim'): # Numpy
+        if obj.ndim > 0:
+            _pack_typed_array(obj, fp)
+        else:
+            pack(obj.item(), fp)
     else:
         raise Exception("unsupported type: %s" % str(type(obj)))
 
@@ -148,3 +212,122 @@ def packb(obj):
     fp = io.BytesIO()
     pack(obj, fp)
     return fp.getvalue()
+
+def _read(fp, fmt):
+    return struct.unpack(fmt, fp.read(struct.calcsize(fmt)))[0]
+
+def _unpack_map(fp, length):
+    obj = {}
+    for i in range(length):
+        k = unpack(fp)
+        obj[k] = unpack(fp)
+    return obj
+
+def _unpack_array(fp, length):
+    if length == 0:
+        return []
+    marker = fp.read(1)
+    # Float32
+    if marker == b"\xca":
+        return list(struct.unpack(">%df" % length, fp.read(4 * length)))
+    # Int32
+    elif marker == b"\xd2":
+        return list(struct.unpack(">%di" % length, fp.read(4 * length)))
+    # Regular
+    fp.seek(-1, io.SEEK_CUR)
+    return [unpack(fp) for i in range(length)]
+
+def unpack(fp):
+    b = fp.read(1)[0]
+    if b <= 0x7f:
+        return b
+    elif b >= 0xe0:
+        return b - 0x100
+    elif b <= 0x8f:
+        return _unpack_map(fp, b & 0x0f)
+    elif b <= 0x9f:
+        return _unpack_array(fp, b & 0x0f)
+    elif b <= 0xbf:
+        return fp.read(b & 0x1f).decode('utf-8')
+    elif b == 0xc0:
+        return None
+    elif b == 0xc2 or b == 0xc3:
+        return b == 0xc3
+    elif b == 0xc4 or b == 0xc5 or b == 0xc6:
+        return fp.read(_read(fp, {0xc4: "B", 0xc5: ">H", 0xc6: ">I"}[b]))
+    elif b == 0xca:
+        return _read(fp, ">f")
+    elif b == 0xcb:
+        return _read(fp, ">d")
+    elif 0xcc <= b <= 0xd3:
+        return _read(fp, {0xcc: "B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd0: "b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q"}[b])
+    elif b == 0xd9 or b == 0xda or b == 0xdb:
+        return fp.read(_read(fp, {0xd9: "B", 0xda: ">H", 0xdb: ">I"}[b])).decode('utf-8')
+    elif b == 0xdc or b == 0xdd:
+        return _unpack_array(fp, _read(fp, ">H" if b == 0xdc else ">I"))
+    elif b == 0xde or b == 0xdf:
+        return _unpack_map(fp, _read(fp, ">H" if b == 0xde else ">I"))
+    raise Exception("unsupported type: 0x%02x" % b)
+
+def unpackb(data):
+    return unpack(io.BytesIO(data))
+
+class Writer:
+    # Incremental writer, streams containers and their elements straight to fp
+    # Container lengths are written up front so fp does not need to be seekable
+    # Numbers streamed one by one form a regular array, pass whole sequences to pack() for typed arrays
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.stack = [] # [is_map, length, items]
+
+    def _item(self):
+        if len(self.stack) > 0:
+            self.stack[-1][2] += 1
+
+    def _begin(self, is_map, length):
+        self._item()
+        if is_map:
+            if length <= 15:
+                self.fp.write(struct.pack("B", 0x80 | length))
+            elif length <= 2**16 - 1:
+                self.fp.write(b"\xde" + struct.pack(">H", length))
+            elif length <= 2**32 - 1:
+                self.fp.write(b"\xdf" + struct.pack(">I", length))
+            else:
+                raise Exception("huge array")
+        else:
+            _pack_array_header(length, self.fp)
+        self.stack.append([is_map, length, 0])
+
+    def begin_map(self, length):
+        self._begin(True, length)
+
+    def begin_array(self, length):
+        self._begin(False, length)
+
+    def end(self):
+        is_map, length, items = self.stack.pop()
+        count = items // 2 if is_map else items
+        if is_map and items % 2 != 0:
+            raise Exception("map key without value")
+        if count != length:
+            raise Exception("container length mismatch: %d != %d" % (count, length))
+
+    def pack(self, obj, release=False):
+        # Pack a single element, release drops written dict values and list items from obj
+        if release and isinstance(obj, dict):
+            self.begin_map(len(obj))
+            for k in list(obj.keys()):
+                self.pack(k)
+                self.pack(obj.pop(k), release=True)
+            self.end()
+        elif release and isinstance(obj, list) and (len(obj) == 0 or isinstance(obj[0], (dict, list))):
+            self.begin_array(len(obj))
+            for i in range(len(obj)):
+                self.pack(obj[i], release=True)
+                obj[i] = None
+            self.end()
+        else:
+            self._item()
+            pack(obj, self.fp)
@@ -0,0 +1,126 @@
+# Content-addressed store for build outputs
+# Entries are files named by the hash of everything that went into them,
+# manifests remember which entry each output file was produced from
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+def new_hash():
+    return hashlib.sha1()
+
+def update_hash(h, obj):
+    # Feed nested data into h, arrays are hashed from their buffers
+    if obj is None:
+        h.update(b'n;')
+    elif isinstance(obj, bool):
+        h.update(b't;' if obj else b'f;')
+    elif isinstance(obj, (int, float, np.number)):
+        h.update(('%r;' % obj).encode('utf-8'))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        h.update(('s%d:' % len(data)).encode('utf-8'))
+        h.update(data)
+    elif isinstance(obj, (bytes, bytearray)):
+        h.update(('b%d:' % len(obj)).encode('utf-8'))
+        h.update(obj)
+    elif isinstance(obj, np.ndarray):
+        h.update(('a%s%r:' % (obj.dtype.str, obj.shape)).encode('utf-8'))
+        h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, dict):
+        h.update(('d%d:' % len(obj)).encode('utf-8'))
+        for k in sorted(obj.keys()):
+            update_hash(h, k)
+            update_hash(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(('l%d:' % len(obj)).encode('utf-8'))
+        for v in obj:
+            update_hash(h, v)
+    else:
+        raise Exception('Can not hash ' + type(obj).__name__)
+
+def hash_data(obj):
+    h = new_hash()
+    update_hash(h, obj)
+    return h.hexdigest()
+
+def hash_file(path):
+    h = new_hash()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Store:
+    # Entries may be written from worker threads
+
+    def __init__(self, path):
+        self.path = path
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def has(self, key):
+        return os.path.isfile(self.entry_path(key))
+
+    def read(self, key):
+        path = self.entry_path(key)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def write(self, key, data):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Entries are complete or missing, never partially written
+        tmp = path + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def prune(self, keys):
+        # Remove entries not in keys, main thread only
+        keys = set(keys)
+        if not os.path.isdir(self.path):
+            return
+        for d in os.listdir(self.path):
+            sub = os.path.join(self.path, d)
+            if len(d) != 2 or not os.path.isdir(sub):
+                continue
+            for name in os.listdir(sub):
+                if name not in keys:
+                    os.remove(os.path.join(sub, name))
+
+class Manifest:
+    # Output file -> record it was produced from, main thread only
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                self.entries = {}
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def set(self, name, record):
+        if self.entries.get(name) != record:
+            self.entries[name] = record
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, sort_keys=True, indent=4)
+        os.replace(tmp, self.path)
+        self.changed = False
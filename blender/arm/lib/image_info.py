@@ -0,0 +1,96 @@
+# Image dimensions read from file headers, pixels are never decoded
+# Supports png, jpg, hdr and tga, other formats return None
+import io
+import os
+import struct
+import threading
+
+# Path -> (mtime, size)
+sizes = {}
+lock = threading.Lock()
+
+def get_size(path):
+    # (width, height) of the image at path, cached until the file changes
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with lock:
+        cached = sizes.get(path)
+        if cached != None and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'rb') as f:
+        size = read_size(f)
+    with lock:
+        sizes[path] = (mtime, size)
+    return size
+
+def get_size_from_data(data):
+    # Same as get_size() for in-memory files like packed images
+    return read_size(io.BytesIO(data))
+
+def read_size(f):
+    head = f.read(18)
+    f.seek(0)
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        return read_png(f)
+    if head[:2] == b'\xff\xd8':
+        return read_jpg(f)
+    if head[:2] == b'#?':
+        return read_hdr(f)
+    if len(head) == 18 and head[2] in (1, 2, 3, 9, 10, 11) and head[1] in (0, 1):
+        return read_tga(f)
+    return None
+
+def read_png(f):
+    # IHDR is always the first chunk
+    data = f.read(24)
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', data[16:24])
+
+def read_jpg(f):
+    # Walk segments up to the start of frame marker
+    f.read(2)
+    while True:
+        if f.read(1) != b'\xff':
+            return None
+        # Markers may be padded with fill bytes
+        b = f.read(1)
+        while b == b'\xff':
+            b = f.read(1)
+        if len(b) == 0:
+            return None
+        marker = b[0]
+        if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+            # No payload
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return (width, height)
+        if marker == 0xd9 or marker == 0xda:
+            return None
+        f.seek(length - 2, 1)
+
+def read_hdr(f):
+    # Header lines end with the resolution line, like -Y 512 +X 1024
+    for i in range(64):
+        line = f.readline(256)
+        if len(line) == 0:
+            return None
+        parts = line.split()
+        if len(parts) == 4 and parts[0][1:] in (b'X', b'Y') and parts[2][1:] in (b'X', b'Y'):
+            axes = { parts[0][1:]: int(parts[1]), parts[2][1:]: int(parts[3]) }
+            return (axes[b'X'], axes[b'Y'])
+    return None
+
+def read_tga(f):
+    data = f.read(18)
+    return struct.unpack('<HH', data[12:16])
@@ -1,8 +1,28 @@
 import os
+import threading
 import arm.utils
 import arm.assets as assets
 
-def write_data(res, defs, json_data, base_name):
+# Shader sources and their line tables by path, reread only when the file changes
+sources = {}
+tables = {}
+sources_lock = threading.Lock()
+
+def read_source(path):
+    # Lines of the file at path, may be called from worker threads
+    mtime = os.path.getmtime(path)
+    with sources_lock:
+        cached = sources.get(path)
+    if cached != None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        lines = f.read().splitlines()
+    with sources_lock:
+        sources[path] = (mtime, lines)
+    return lines
+
+def write_data(res, defs, json_data, base_name, path='.'):
+    # Shader files in json_data are relative to path
     # Define
     sres = {}
     res['shader_datas'].append(sres)
@@ -14,6 +34,8 @@ def write_data(res, defs, json_data, base_name):
 
     asset = assets.shader_passes_assets[base_name]
 
+    defs = set(defs)
+
     # Parse
     for c in json_data['contexts']:
         con = {}
@@ -61,79 +83,114 @@ def write_data(res, defs, json_data, base_name):
                 con[p] = c[p]
 
         # Parse shaders
-        with open(c['vertex_shader']) as f:
-            vert = f.read().splitlines()
-
-        with open(c['fragment_shader']) as f:
-            frag = f.read().splitlines()
+        vert = read_table(os.path.join(path, c['vertex_shader']))
+        frag = read_table(os.path.join(path, c['fragment_shader']))
         
         parse_shader(sres, c, con, defs, vert, True) # Parse attribs for vertex shader
         parse_shader(sres, c, con, defs, frag, False)
 
         if 'geometry_shader' in c:
-            with open(c['geometry_shader']) as f:
-                geom = f.read().splitlines()
+            geom = read_table(os.path.join(path, c['geometry_shader']))
             parse_shader(sres, c, con, defs, geom, False)
 
         if 'tesscontrol_shader' in c:
-            with open(c['tesscontrol_shader']) as f:
-                tesc = f.read().splitlines()
+            tesc = read_table(os.path.join(path, c['tesscontrol_shader']))
             parse_shader(sres, c, con, defs, tesc, False)
         
         if 'tesseval_shader' in c:
-            with open(c['tesseval_shader']) as f:
-                tese = f.read().splitlines()
+            tese = read_table(os.path.join(path, c['tesseval_shader']))
             parse_shader(sres, c, con, defs, tese, False)
 
-def parse_shader(sres, c, con, defs, lines, parse_attributes):
-    skip_till_endif = 0
-    skip_else = False
-    vertex_structure_parsed = False
-    vertex_structure_parsing = False
-    
+def parse_lines(lines):
+    # Line table of a shader, the lines that matter for reflection with the innermost
+    # preprocessor condition they sit in, (define, expected) or None at top level
+    # Lines outside the table never change the result of parse_shader
+    table = []
     stack = []
-
-    if parse_attributes == False:
-        vertex_structure_parsed = True
-        
     for line in lines:
         line = line.lstrip()
 
         # Preprocessor
         if line.startswith('#ifdef') or line.startswith('#ifndef'):
-            s = line.split(' ')[1]
-            found = s in defs
-            if line.startswith('#ifndef'):
-                found = not found
-            if found == False:
-                stack.append(0)
-            else:
-                stack.append(1)
+            stack.append((line.split(' ')[1], line.startswith('#ifdef')))
             continue
 
         if line.startswith('#else'):
-            stack[-1] = 1 - stack[-1]
+            s, expected = stack[-1]
+            stack[-1] = (s, not expected)
             continue
 
         if line.startswith('#endif'):
             stack.pop()
             continue
 
-        if len(stack) > 0 and stack[-1] == 0:
+        cond = stack[-1] if len(stack) > 0 else None
+        if line.startswith('in '):
+            kind = 'in'
+        elif line.startswith('uniform ') or line.startswith('//!uniform'):
+            kind = 'uniform'
+        elif len(line) > 0 and line.startswith('//') == False:
+            kind = 'end' # Ends the vertex structure
+            if len(table) > 0 and table[-1][0] == cond and table[-1][1] == 'end':
+                continue
+        else:
             continue
+        table.append((cond, kind, line))
+    return table
+
+def read_table(path):
+    # Cached line table of the file at path, may be called from worker threads
+    mtime = os.path.getmtime(path)
+    with sources_lock:
+        cached = tables.get(path)
+    if cached != None and cached[0] == mtime:
+        return cached[1]
+    table = parse_lines(read_source(path))
+    with sources_lock:
+        tables[path] = (mtime, table)
+    return table
+
+def get_link(links, name, defs):
+    # First link entry for name decides, ifdef needs any and ifndef none of its defines
+    l = links.get(name)
+    if l == None:
+        return None
+    if 'ifdef' in l and defs.isdisjoint(l['ifdef']):
+        return None
+    if 'ifndef' in l and not defs.isdisjoint(l['ifndef']):
+        return None
+    return l['link']
+
+def parse_shader(sres, c, con, defs, table, parse_attributes):
+    # defs is a set of define names, table comes from parse_lines
+    vertex_structure_parsed = False
+    vertex_structure_parsing = False
+
+    if parse_attributes == False:
+        vertex_structure_parsed = True
 
+    links = {}
+    for l in c.get('links', []):
+        if l['name'] not in links:
+            links[l['name']] = l
+    texture_names = set(tu['name'] for tu in con['texture_units'])
+    constant_names = set(const['name'] for const in con['constants'])
+
+    for cond, kind, line in table:
+        if cond != None and (cond[0] in defs) != cond[1]:
+            continue
 
-        if vertex_structure_parsed == False and line.startswith('in '):
+        if vertex_structure_parsed == False and kind == 'in':
             vertex_structure_parsing = True
             vd = {}
             s = line.split(' ')
             vd['size'] = int(s[1][-1:])
             vd['name'] = s[2][:-1]
             con['vertex_structure'].append(vd)
-        if vertex_structure_parsing == True and len(line) > 0 and line.startswith('//') == False and line.startswith('in ') == False:
+        if vertex_structure_parsing == True and kind != 'in' and line.startswith('//') == False:
             vertex_structure_parsed = True
 
-        if line.startswith('uniform ') or line.startswith('//!uniform'): # Uniforms included from header files
+        if kind == 'uniform': # Uniforms included from header files
             s = line.split(' ')
             # uniform sampler2D myname;
             # uniform layout(RGBA8) image3D myname;
@@ -148,96 +205,31 @@ def parse_shader(sres, c, con, defs, lines, parse_attributes):
                 if cid[-1] == ';':
                     cid = cid[:-1]
 
-            found = False # Unique check
             if ctype == 'sampler2D' or ctype == 'sampler2DShadow' or ctype == 'sampler3D' or ctype == 'samplerCube' or ctype == 'image2D' or ctype == 'uimage2D' or ctype == 'image3D' or ctype == 'uimage3D': # Texture unit
-                for tu in con['texture_units']: # Texture already present
-                    if tu['name'] == cid:
-                        found = True
-                        break
-                if found == False:
+                if cid not in texture_names: # Unique check
+                    texture_names.add(cid)
                     tu = {}
                     tu['name'] = cid
                     # sampler2D / image2D
                     if ctype == 'image2D' or ctype == 'uimage2D' or ctype == 'image3D' or ctype == 'uimage3D':
                         tu['is_image'] = True
-                    # Check for link
-                    for l in c['links']:
-                        if l['name'] == cid:
-                            valid_link = True
-
-                            if 'ifdef' in l:
-                                def_found = False
-                                for d in defs:
-                                    for link_def in l['ifdef']:
-                                        if d == link_def:
-                                            def_found = True
-                                            break
-                                    if def_found:
-                                        break
-                                if not def_found:
-                                    valid_link = False
-
-                            if 'ifndef' in l:
-                                def_found = False
-                                for d in defs:
-                                    for link_def in l['ifndef']:
-                                        if d == link_def:
-                                            def_found = True
-                                            break
-                                    if def_found:
-                                        break
-                                if def_found:
-                                    valid_link = False
-
-                            if valid_link:
-                                tu['link'] = l['link']
-                            break
+                    link = get_link(links, cid, defs)
+                    if link != None:
+                        tu['link'] = link
                     con['texture_units'].append(tu)
             else: # Constant
                 if cid.find('[') != -1: # Float arrays
                     cid = cid.split('[')[0]
                     ctype = 'floats'
-                for const in con['constants']:
-                    if const['name'] == cid:
-                        found = True
-                        break
-                if found == False:
+                if cid not in constant_names:
+                    constant_names.add(cid)
                     const = {}
                     const['type'] = ctype
                     const['name'] = cid
-                    # Check for link
-                    for l in c['links']:
-                        if l['name'] == cid:
-                            valid_link = True
-
-                            if 'ifdef' in l:
-                                def_found = False
-                                for d in defs:
-                                    for link_def in l['ifdef']:
-                                        if d == link_def:
-                                            def_found = True
-                                            break
-                                    if def_found:
-                                        break
-                                if not def_found:
-                                    valid_link = False
-
-                            if 'ifndef' in l:
-                                def_found = False
-                                for d in defs:
-                                    for link_def in l['ifndef']:
-                                        if d == link_def:
-                                            def_found = True
-                                            break
-                                    if def_found:
-                                        break
-                                if def_found:
-                                    valid_link = False
-
-                            if valid_link:
-                                const['link'] = l['link']
-                            break
+                    link = get_link(links, cid, defs)
+                    if link != None:
+                        const['link'] = link
                     con['constants'].append(const)
 
-def make(res, base_name, json_data, fp, defs):
-    write_data(res, defs, json_data, base_name)
+def make(res, base_name, json_data, fp, defs, path='.'):
+    write_data(res, defs, json_data, base_name, path)
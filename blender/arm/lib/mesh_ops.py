@@ -0,0 +1,184 @@
+# Bulk mesh processing on flat numpy buffers
+import itertools
+import numpy as np
+
+def _pack_rows(data):
+    data = np.ascontiguousarray(data)
+    return data.view(np.dtype((np.void, data.dtype.itemsize * data.shape[1]))).ravel()
+
+def weld_cells(cells, pos, epsilon):
+    # Root of each unique cell given its key row and first position, the leading columns
+    # of cells are position grid cells of size epsilon and the rest must match exactly
+    # A cell joins the lowest of its 3^n neighbours whose position is within epsilon,
+    # chains are followed and cells ending up further than epsilon from their root stay on their own
+    # Rows are looked up by a wrapping int64 hash and compared in full
+    weights = np.random.RandomState(0).randint(1, 2**62, size=cells.shape[1], dtype=np.int64) | 1
+    hashes = cells.dot(weights)
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    target = np.arange(len(cells))
+    dims = pos.shape[1]
+    # Neighbours are symmetric, half of the offsets finds every pair
+    offsets = list(itertools.product((-1, 0, 1), repeat=dims))
+    for offset in offsets[len(offsets) // 2 + 1:]:
+        offset = np.array(offset, dtype=np.int64)
+        probe = hashes + offset.dot(weights[:dims])
+        found = np.minimum(np.searchsorted(sorted_hashes, probe), len(order) - 1)
+        other = order[found]
+        near = sorted_hashes[found] == probe
+        near[near] = (cells[other[near], :dims] == cells[near, :dims] + offset).all(axis=1) & \
+                     (cells[other[near], dims:] == cells[near, dims:]).all(axis=1) & \
+                     (np.abs(pos[other[near]] - pos[near]).max(axis=1) <= epsilon)
+        a = np.nonzero(near)[0]
+        b = other[a]
+        np.minimum.at(target, a, b)
+        np.minimum.at(target, b, a)
+    root = target
+    while True:
+        parent = root[root]
+        if np.array_equal(parent, root):
+            break
+        root = parent
+    far = np.abs(pos[root] - pos).max(axis=1) > epsilon
+    root[far] = np.nonzero(far)[0]
+    return root
+
+def dedup_vertices(columns, epsilon=0.0):
+    # Merge loops with equal attributes, vertices keep first occurrence order
+    # Columns are (num_loops, n) arrays, the first one holds positions
+    # Positions closer than epsilon per component are welded, other columns must match bitwise
+    # Returns loop index of each unique vertex and loop to vertex remap
+    num_loops = len(columns[0])
+    if num_loops == 0:
+        return np.empty(0, dtype='<i4'), np.empty(0, dtype='<i4')
+    data = np.hstack([c.astype('<f4').reshape(num_loops, -1) for c in columns])
+    data += np.float32(0.0) # -0.0 equals 0.0
+    dims = columns[0].reshape(num_loops, -1).shape[1]
+    cells = data.view('<i4').astype('<i8')
+    if epsilon > 0.0:
+        cells[:, :dims] = np.floor(data[:, :dims] / epsilon + 0.5)
+    _, first, inverse = np.unique(_pack_rows(cells), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if epsilon > 0.0 and len(first) > 1:
+        _, group = np.unique(weld_cells(cells[first], data[first, :dims], epsilon), return_inverse=True)
+        group = group.ravel()
+        merged = np.full(group.max() + 1, num_loops, dtype=first.dtype)
+        np.minimum.at(merged, group, first)
+        first = merged
+        inverse = group[inverse]
+    del data, cells
+    order = np.argsort(first, kind='mergesort')
+    rank = np.empty(len(order), dtype='<i4')
+    rank[order] = np.arange(len(order), dtype='<i4')
+    return first[order].astype('<i4'), rank[inverse]
+
+def triangulate(loop_start, loop_total):
+    # Fan triangulation matching the exporter, (last, i, i + 1) for ngons
+    # Returns loop indices of shape (num_tris, 3) and polygon index per triangle
+    tri_count = np.maximum(loop_total - 2, 0)
+    poly = np.repeat(np.arange(len(loop_total), dtype='<i4'), tri_count)
+    first_tri = np.cumsum(tri_count) - tri_count
+    i = np.arange(len(poly), dtype='<i4') - np.repeat(first_tri, tri_count)
+    start = loop_start[poly]
+    total = loop_total[poly]
+    tris = np.empty((len(poly), 3), dtype='<i4')
+    tris[:, 0] = start + total - 1
+    tris[:, 1] = start + i
+    tris[:, 2] = start + i + 1
+    is_tri = total == 3
+    tris[is_tri, 0] = start[is_tri]
+    tris[is_tri, 1] = start[is_tri] + 1
+    tris[is_tri, 2] = start[is_tri] + 2
+    return tris, poly
+
+def calc_tangents(pos, nor, uv, indices, handedness=False):
+    # Per-triangle tangents accumulated on vertices, then orthogonalized against normals
+    # Returns (num_verts, 3) tangents, and per-vertex bitangent sign if handedness is set
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 3)
+    nor = np.asarray(nor, dtype=np.float64).reshape(-1, 3)
+    uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    num_verts = len(pos)
+
+    v0, v1, v2 = pos[tris[:, 0]], pos[tris[:, 1]], pos[tris[:, 2]]
+    uv0, uv1, uv2 = uv[tris[:, 0]], uv[tris[:, 1]], uv[tris[:, 2]]
+    dp1 = v1 - v0
+    dp2 = v2 - v0
+    duv1 = uv1 - uv0
+    duv2 = uv2 - uv0
+    d = duv1[:, 0] * duv2[:, 1] - duv1[:, 1] * duv2[:, 0]
+    r = np.ones(len(d))
+    np.divide(1.0, d, out=r, where=d != 0)
+    r = r[:, None]
+    tangent = (dp1 * duv2[:, 1:2] - dp2 * duv1[:, 1:2]) * r
+
+    # Scatter-add to the three corners of each triangle
+    corners = tris.ravel()
+    tangents = np.empty((num_verts, 3))
+    for k in range(3):
+        tangents[:, k] = np.bincount(corners, weights=np.repeat(tangent[:, k], 3), minlength=num_verts)
+
+    # Gram-Schmidt orthogonalize
+    tangents -= nor * np.einsum('ij,ij->i', nor, tangents)[:, None]
+    length = np.sqrt(np.einsum('ij,ij->i', tangents, tangents))
+    np.divide(tangents, length[:, None], out=tangents, where=length[:, None] > 0)
+
+    if not handedness:
+        return tangents
+
+    bitangent = (dp2 * duv1[:, 0:1] - dp1 * duv2[:, 0:1]) * r
+    bitangents = np.empty((num_verts, 3))
+    for k in range(3):
+        bitangents[:, k] = np.bincount(corners, weights=np.repeat(bitangent[:, k], 3), minlength=num_verts)
+    signs = np.where(np.einsum('ij,ij->i', np.cross(nor, tangents), bitangents) < 0.0, -1.0, 1.0)
+    return tangents, signs
+
+def skin_influences(counts, groups, weights, group_remap, vertices, max_influences=4):
+    # Strongest bone influences of each vertex, normalized by the total weight of all its influences
+    # counts, groups and weights hold the flattened vertex group entries of every source vertex,
+    # group_remap maps vertex groups to bones (-1 if unmapped), vertices selects source vertices
+    # Returns influence count, (n, max_influences) bone indices and weights, and whether any vertex was clamped
+    counts = np.asarray(counts, dtype=np.int64)
+    vertices = np.asarray(vertices, dtype=np.int64)
+    num_verts = len(vertices)
+    starts = np.cumsum(counts) - counts
+    vcounts = counts[vertices]
+    owner = np.repeat(np.arange(num_verts), vcounts)
+    first = np.cumsum(vcounts) - vcounts
+    entry = np.repeat(starts[vertices] - first, vcounts) + np.arange(len(owner))
+    group_remap = np.asarray(group_remap, dtype=np.int64)
+    bone = group_remap[np.asarray(groups, dtype=np.int64)[entry]] if len(entry) > 0 else np.empty(0, dtype=np.int64)
+    weight = np.asarray(weights, dtype=np.float64)[entry]
+
+    valid = (bone >= 0) & (weight != 0.0)
+    owner = owner[valid]
+    bone = bone[valid]
+    weight = weight[valid]
+    total = np.bincount(owner, weights=weight, minlength=num_verts)
+
+    # Highest weights first, ties broken by higher bone index
+    order = np.lexsort((-bone, -weight, owner))
+    owner = owner[order]
+    num_valid = np.bincount(owner, minlength=num_verts)
+    rank = np.arange(len(owner)) - (np.cumsum(num_valid) - num_valid)[owner]
+    keep = rank < max_influences
+
+    bone_count = np.minimum(num_valid, max_influences).astype('<i4')
+    bone_index = np.zeros((num_verts, max_influences), dtype='<i4')
+    bone_weight = np.zeros((num_verts, max_influences))
+    bone_index[owner[keep], rank[keep]] = bone[order][keep]
+    bone_weight[owner[keep], rank[keep]] = weight[order][keep]
+    normalizer = np.ones(num_verts)
+    np.divide(1.0, total, out=normalizer, where=total != 0.0)
+    bone_weight *= normalizer[:, None]
+    return bone_count, bone_index, bone_weight, bool((num_valid > max_influences).any())
+
+def bounding_sphere(pos):
+    # Sphere around the center of the bounding box, returns [x, y, z, radius]
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 3)
+    if len(pos) == 0:
+        return np.zeros(4)
+    center = (pos.min(axis=0) + pos.max(axis=0)) * 0.5
+    d = pos - center
+    radius = np.sqrt(np.einsum('ij,ij->i', d, d).max())
+    return np.append(center, radius)
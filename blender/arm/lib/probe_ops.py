@@ -0,0 +1,231 @@
+# Environment probe processing on latlong numpy images
+# Images are (h, w, 3) float arrays, rows run from +z down to -z and columns follow
+# the runtime envMapEquirect mapping
+import concurrent.futures
+import numpy as np
+
+def read_hdr(path):
+    # Radiance RGBE file to (h, w, 3) float32
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    while True:
+        end = data.find(b'\n', pos)
+        if end < 0:
+            raise Exception('Invalid hdr file ' + path)
+        line = data[pos:end].strip()
+        pos = end + 1
+        if line.startswith(b'FORMAT=') and line != b'FORMAT=32-bit_rle_rgbe':
+            raise Exception('Unsupported hdr format in ' + path)
+        if line.startswith(b'-Y') or line.startswith(b'+Y'):
+            break
+    res = line.split()
+    if len(res) != 4 or res[0] != b'-Y' or res[2] != b'+X':
+        raise Exception('Unsupported hdr orientation in ' + path)
+    h = int(res[1])
+    w = int(res[3])
+    # Walk run headers only, pixel bytes are gathered in one go afterwards
+    # Each run is a source offset, a length and whether its byte repeats
+    starts = []
+    counts = []
+    repeats = []
+    rle = np.zeros(h, dtype=bool)
+    i = pos
+    for y in range(h):
+        if i + 4 > len(data):
+            raise Exception('Truncated hdr file ' + path)
+        if 8 <= w < 32768 and data[i] == 2 and data[i + 1] == 2 and data[i + 2] & 0x80 == 0:
+            # Run length encoded, channels stored one after another
+            rle[y] = True
+            i += 4
+            for c in range(4):
+                x = 0
+                while x < w:
+                    if i >= len(data):
+                        raise Exception('Truncated hdr file ' + path)
+                    n = data[i]
+                    if n == 0:
+                        raise Exception('Invalid hdr scanline in ' + path)
+                    if n > 128:
+                        n -= 128
+                        starts.append(i + 1)
+                        repeats.append(True)
+                        i += 2
+                    else:
+                        starts.append(i + 1)
+                        repeats.append(False)
+                        i += n + 1
+                    if i > len(data):
+                        raise Exception('Truncated hdr file ' + path)
+                    counts.append(n)
+                    x += n
+                if x != w:
+                    raise Exception('Invalid hdr scanline in ' + path)
+        else:
+            starts.append(i)
+            repeats.append(False)
+            counts.append(w * 4)
+            i += w * 4
+    if i > len(data):
+        raise Exception('Truncated hdr file ' + path)
+    counts = np.array(counts, dtype=np.int64)
+    run_start = np.cumsum(counts) - counts
+    # Literal runs step through their bytes, repeated runs stay on one
+    step = np.where(repeats, 0, 1)
+    offset = np.arange(counts.sum()) - np.repeat(run_start, counts)
+    index = np.repeat(np.array(starts, dtype=np.int64), counts) + offset * np.repeat(step, counts)
+    lines = np.frombuffer(data, dtype=np.uint8)[index].reshape(h, w * 4)
+    rgbe = np.empty((h, w, 4), dtype=np.uint8)
+    rgbe[rle] = lines[rle].reshape(-1, 4, w).transpose(0, 2, 1)
+    rgbe[~rle] = lines[~rle].reshape(-1, w, 4)
+    e = rgbe[:, :, 3].astype(np.int32)
+    scale = np.where(e > 0, np.ldexp(1.0, e - 136), 0.0)
+    return (rgbe[:, :, :3] * scale[:, :, None]).astype(np.float32)
+
+def write_hdr(path, img):
+    img = np.asarray(img, dtype=np.float64)
+    h, w = img.shape[:2]
+    m = img.max(axis=2)
+    mantissa, exponent = np.frexp(m)
+    scale = np.zeros(m.shape)
+    np.divide(mantissa * 256.0, m, out=scale, where=m > 1e-32)
+    rgbe = np.zeros((h, w, 4), dtype=np.uint8)
+    rgbe[:, :, :3] = np.clip(img * scale[:, :, None], 0, 255).astype(np.uint8)
+    rgbe[:, :, 3] = np.where(m > 1e-32, exponent + 128, 0).astype(np.uint8)
+    if 8 <= w < 32768:
+        # Run length encoded scanlines made of literal runs only
+        runs = np.arange(0, w, 128)
+        counts = np.minimum(w - runs, 128)
+        chan_size = len(runs) + w
+        line = np.empty((h, 4 + 4 * chan_size), dtype=np.uint8)
+        line[:, 0] = 2
+        line[:, 1] = 2
+        line[:, 2] = w >> 8
+        line[:, 3] = w & 255
+        # Count byte positions within a channel, data follows each count
+        count_pos = runs + np.arange(len(runs))
+        data_pos = np.arange(w) + np.repeat(np.arange(len(runs)) + 1, counts)
+        for c in range(4):
+            off = 4 + c * chan_size
+            line[:, off + count_pos] = counts
+            line[:, off + data_pos] = rgbe[:, :, c]
+        data = line.tobytes()
+    else:
+        data = rgbe.tobytes()
+    with open(path, 'wb') as f:
+        f.write(b'#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n')
+        f.write(('-Y %d +X %d\n' % (h, w)).encode('ascii'))
+        f.write(data)
+
+def _resample_weights(src, dst):
+    # (dst, src) matrix, box filter when shrinking and linear when enlarging
+    weights = np.zeros((dst, src))
+    if dst <= src:
+        edges = np.arange(dst + 1) * (src / dst)
+        for i in range(dst):
+            a, b = edges[i], edges[i + 1]
+            lo = int(np.floor(a))
+            hi = min(int(np.ceil(b)), src)
+            cells = np.arange(lo, hi)
+            weights[i, lo:hi] = np.minimum(cells + 1, b) - np.maximum(cells, a)
+    else:
+        x = np.clip((np.arange(dst) + 0.5) * (src / dst) - 0.5, 0, src - 1)
+        lo = np.floor(x).astype(np.int64)
+        hi = np.minimum(lo + 1, src - 1)
+        t = x - lo
+        weights[np.arange(dst), lo] += 1.0 - t
+        weights[np.arange(dst), hi] += t
+    return weights / weights.sum(axis=1)[:, None]
+
+def resize(img, w, h):
+    img = np.asarray(img, dtype=np.float32)
+    if img.shape[0] == h and img.shape[1] == w:
+        return img
+    rows = _resample_weights(img.shape[0], h).astype(np.float32)
+    cols = _resample_weights(img.shape[1], w).astype(np.float32)
+    out = np.tensordot(rows, img, axes=(1, 0))
+    return np.einsum('xw,hwc->hxc', cols, out)
+
+def _texel_rows(h):
+    # Polar angle of row centers
+    return (np.arange(h) + 0.5) / h * np.pi
+
+def downsample(img):
+    # Half size, rows weighted by the solid angle they cover
+    h, w = img.shape[:2]
+    weight = np.sin(_texel_rows(h)).astype(np.float32)
+    s = (img * weight[:, None, None]).reshape(h // 2, 2, w // 2, 2, 3).sum(axis=(1, 3))
+    return s / (weight.reshape(h // 2, 2).sum(axis=1) * 2.0)[:, None, None]
+
+def sh_coeffs(img):
+    # Irradiance spherical harmonics, 9 rgb coefficients projected in the runtime basis
+    h, w = img.shape[:2]
+    phi = _texel_rows(h)
+    a = (np.arange(w) + 0.5) / w * 2.0 * np.pi - np.pi
+    sin_phi = np.sin(phi)[:, None]
+    x = sin_phi * np.cos(a)[None, :]
+    y = -sin_phi * np.sin(a)[None, :]
+    z = np.cos(phi)[:, None] * np.ones(w)[None, :]
+    # Shaders evaluate with (n.y, -n.z, n.x)
+    x, y, z = y, -z, x
+    basis = np.stack([np.full(x.shape, 0.282095),
+                      0.488603 * y, 0.488603 * z, 0.488603 * x,
+                      1.092548 * x * y, 1.092548 * y * z, 0.315392 * (3.0 * z * z - 1.0),
+                      1.092548 * x * z, 0.546274 * (x * x - y * y)])
+    solid_angle = (2.0 * np.pi / w) * (np.pi / h) * np.sin(phi)
+    return np.einsum('khw,hwc,h->kc', basis, np.asarray(img, dtype=np.float64), solid_angle)
+
+def specular_power(mip, mip_count, gloss_scale=8.0, gloss_bias=3.0):
+    # Blinn brdf lobe of a mip, glossy at mip 0 down to rough at the last one
+    gloss = 1.0 if mip_count == 1 else max(0.0, 1.0 - mip / (mip_count - 1))
+    return 2.0 ** (gloss_scale * gloss + gloss_bias) / 4.0 + 1.0
+
+def _filter_rows(src, w, power, theta, rows):
+    # Rows of the prefiltered image, each source row contributes a longitude kernel
+    # applied as a circular convolution
+    hs, ws, S = src
+    h = w // 2
+    k = ws // w
+    step = 2.0 * np.pi / ws
+    phi_src = _texel_rows(hs)
+    phi = _texel_rows(h)
+    solid_angle = step * (np.pi / hs) * np.sin(phi_src)
+    # Offset between output and source texel centers
+    cos_d = np.cos((np.arange(ws) + 0.5 * (k - 1)) * step)
+    out = np.empty((len(rows), w, 3), dtype=np.float32)
+    for n, i in enumerate(rows):
+        near = np.nonzero(np.abs(phi_src - phi[i]) <= theta + np.pi / hs)[0]
+        dot = np.cos(phi[i]) * np.cos(phi_src[near])[:, None] + np.sin(phi[i]) * np.sin(phi_src[near])[:, None] * cos_d[None, :]
+        kernel = np.maximum(dot, 0.0) ** power * solid_angle[near][:, None]
+        f = np.einsum('jf,jfc->fc', np.fft.rfft(kernel, axis=1), S[near])
+        out[n] = np.fft.irfft(f, n=ws, axis=0)[::k][:w] / kernel.sum()
+    return out
+
+def prefilter(levels, sizes, powers, threads=1, threshold=1e-3):
+    # Radiance mips of the given widths from a downsample() pyramid of the source
+    # Lobes are cut where they fall below threshold
+    sources = {}
+    jobs = []
+    for w, power in zip(sizes, powers):
+        theta = np.arccos(min(threshold ** (1.0 / power), 1.0))
+        # Coarsest level still sampling the lobe finely enough
+        src = 0
+        for i, level in enumerate(levels):
+            if level.shape[1] >= w and 2.0 * np.pi / level.shape[1] <= theta / 4.0:
+                src = i
+        if src not in sources:
+            level = levels[src]
+            sources[src] = (level.shape[0], level.shape[1], np.fft.rfft(level, axis=1))
+        jobs.append((sources[src], w, power, theta))
+    mips = [np.empty((w // 2, w, 3), dtype=np.float32) for w in sizes]
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        futures = []
+        for mip, job in zip(mips, jobs):
+            h = job[1] // 2
+            block = max(1, h // threads)
+            for start in range(0, h, block):
+                rows = range(start, min(start + block, h))
+                futures.append((mip, rows, executor.submit(_filter_rows, job[0], job[1], job[2], job[3], rows)))
+        for mip, rows, future in futures:
+            mip[rows.start:rows.stop] = future.result()
+    return mips
@@ -0,0 +1,53 @@
+# Generated shader sources keyed by the hash of their text
+# Files are only rewritten when their text changes, khamake then keeps the
+# compiled outputs of every variant whose source is untouched
+import os
+import threading
+import arm.lib.build_cache as build_cache
+
+# Output dir -> manifest of the sources written there
+manifests = {}
+# Output path -> lock held while that file is checked, written and recorded
+path_locks = {}
+lock = threading.Lock()
+
+def get_manifest(path):
+    d = os.path.dirname(os.path.abspath(path))
+    if d not in manifests:
+        manifests[d] = build_cache.Manifest(d + '/variants.json')
+    return manifests[d]
+
+def write(path, text):
+    # Returns whether the file was written, may be called from worker threads
+    key = build_cache.hash_data(text)
+    name = os.path.basename(path)
+    with lock:
+        manifest = get_manifest(path)
+        path_lock = path_locks.setdefault(os.path.abspath(path), threading.Lock())
+    # File and manifest record are updated together, a concurrent write
+    # of the same path can not leave the record pointing at the other text
+    with path_lock:
+        with lock:
+            cached = manifest.get(name) == key
+        if cached and os.path.isfile(path):
+            return False
+        with open(path, 'w') as f:
+            f.write(text)
+        with lock:
+            manifest.set(name, key)
+    return True
+
+def copy(src, path):
+    with open(src) as f:
+        text = f.read()
+    return write(path, text)
+
+def save():
+    # Called once the build wrote all of its shaders
+    global manifests
+    with lock:
+        for d in manifests:
+            if os.path.isdir(d):
+                manifests[d].save()
+        manifests = {}
+        path_locks.clear()
@@ -9,15 +9,18 @@ from bpy.props import *
 import subprocess
 import threading
 import webbrowser
+import concurrent.futures
 import arm.utils
 import arm.write_data as write_data
 import arm.make_logic as make_logic
 import arm.make_renderpath as make_renderpath
 import arm.make_world as make_world
+import arm.material.make_texture as make_texture
 import arm.make_state as state
 import arm.assets as assets
 import arm.log as log
 import arm.lib.make_datas
+import arm.lib.shader_store as shader_store
 import arm.lib.server
 from arm.exporter import ArmoryExporter
 
@@ -26,23 +29,23 @@ scripts_mtime = 0 # Monitor source changes
 code_parsed = False
 profile_time = 0
 
-def compile_shader_pass(res, raw_shaders_path, shader_name, defs):
-    os.chdir(raw_shaders_path + '/' + shader_name)
+def compile_shader_pass(res, raw_shaders_path, shader_name, defs, fp=None):
+    # Does not touch bpy or the working directory when fp is given, safe to run on worker threads
+    pass_path = raw_shaders_path + '/' + shader_name
 
     # Open json file
-    json_name = shader_name + '.json'
-    with open(json_name) as f:
-        json_file = f.read()
-    json_data = json.loads(json_file)
+    json_name = pass_path + '/' + shader_name + '.json'
+    json_data = json.loads('\n'.join(arm.lib.make_datas.read_source(json_name)))
 
-    fp = arm.utils.get_fp_build()
-    arm.lib.make_datas.make(res, shader_name, json_data, fp, defs)
+    if fp == None:
+        fp = arm.utils.get_fp_build()
+    arm.lib.make_datas.make(res, shader_name, json_data, fp, defs, pass_path)
 
     path = fp + '/compiled/Shaders'
     c = json_data['contexts'][0]
     for s in ['vertex_shader', 'fragment_shader', 'geometry_shader', 'tesscontrol_shader', 'tesseval_shader']:
         if s in c:
-            shutil.copy(c[s], path + '/' + c[s].split('/')[-1])
+            shader_store.copy(os.path.join(pass_path, c[s]), path + '/' + c[s].split('/')[-1])
 
 def remove_readonly(func, path, excinfo):
     os.chmod(path, stat.S_IWRITE)
@@ -55,6 +58,8 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
     print('\nArmory v{0} ({1})'.format(wrd.arm_version, wrd.arm_commit))
     print('OS: ' + arm.utils.get_os() + ', Target: ' + state.target + ', GAPI: ' + arm.utils.get_gapi() + ', Blender: ' + bpy.app.version_string)
 
+    make_texture.reset_conversions()
+
     # Clean compiled variants if cache is disabled
     build_dir = arm.utils.get_fp_build()
     if wrd.arm_cache_shaders == False:
@@ -73,18 +78,6 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
         if os.path.isdir(build_dir + '/compiled/Shaders'):
             shutil.rmtree(build_dir + '/compiled/Shaders', onerror=remove_readonly)
 
-    # Detect camera plane changes
-    if len(bpy.data.cameras) > 0:
-        cam = bpy.data.cameras[0]
-        if state.last_clip_start == 0:
-            state.last_clip_start = cam.clip_start
-            state.last_clip_end = cam.clip_end
-        elif cam.clip_start != state.last_clip_start or cam.clip_end != state.last_clip_end:
-            if os.path.isdir(build_dir + '/compiled/Shaders'):
-                shutil.rmtree(build_dir + '/compiled/Shaders', onerror=remove_readonly)
-            state.last_clip_start = cam.clip_start
-            state.last_clip_end = cam.clip_end
-
     raw_shaders_path = sdk_path + 'armory/Shaders/'
     assets_path = sdk_path + 'armory/Assets/'
     export_physics = bpy.data.worlds['Arm'].arm_physics != 'Disabled'
@@ -99,7 +92,7 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
     make_renderpath.build()
 
     # Export scene data
-    assets.embedded_data = sorted(list(set(assets.embedded_data)))
+    assets.embedded_data = assets.Registry(sorted(assets.embedded_data))
     physics_found = False
     navigation_found = False
     ui_found = False
@@ -117,6 +110,9 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
                 ui_found = True
             assets.add(asset_path)
 
+    # Textures queued during material export
+    make_texture.write_conversions()
+
     if physics_found == False: # Disable physics if no rigid body is exported
         export_physics = False
 
@@ -150,19 +146,28 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
 
     # Write referenced shader passes
     if not os.path.isfile(build_dir + '/compiled/Shaders/shader_datas.arm') or state.last_world_defs != wrd.world_defs:
-        res = {}
-        res['shader_datas'] = []
-        for ref in assets.shader_passes:
-            # Ensure shader pass source exists
-            if not os.path.exists(raw_shaders_path + '/' + ref):
-                continue
-            assets.shader_passes_assets[ref] = []
-            if ref.startswith('compositor_pass'):
-                compile_shader_pass(res, raw_shaders_path, ref, defs + cdefs)
-            # elif ref.startswith('grease_pencil'):
-                # compile_shader_pass(res, raw_shaders_path, ref, [])
-            else:
-                compile_shader_pass(res, raw_shaders_path, ref, defs)
+        # Passes are independent, each one fills its own result and they are joined in order
+        passes = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=arm.utils.get_export_threads()) as pool:
+            for ref in assets.shader_passes:
+                # Ensure shader pass source exists
+                if not os.path.exists(raw_shaders_path + '/' + ref):
+                    continue
+                assets.shader_passes_assets[ref] = []
+                pass_res = {}
+                pass_res['shader_datas'] = []
+                if ref.startswith('compositor_pass'):
+                    pass_defs = defs + cdefs
+                # elif ref.startswith('grease_pencil'):
+                    # pass_defs = []
+                else:
+                    pass_defs = defs
+                passes.append((pass_res, pool.submit(compile_shader_pass, pass_res, raw_shaders_path, ref, pass_defs, build_dir)))
+            res = {}
+            res['shader_datas'] = []
+            for pass_res, future in passes:
+                future.result()
+                res['shader_datas'] += pass_res['shader_datas']
         arm.utils.write_arm(shaders_path + '/shader_datas.arm', res)
     for ref in assets.shader_passes:
         for s in assets.shader_passes_assets[ref]:
@@ -173,6 +178,7 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
         if not os.path.exists(target):
             shutil.copy(file, target)
     state.last_world_defs = wrd.world_defs
+    shader_store.save()
 
     # Reset path
     os.chdir(fp)
@@ -185,6 +191,7 @@ def export_data(fp, sdk_path, is_play=False, is_publish=False, in_viewport=False
     enable_dce = is_publish and wrd.arm_dce
     import_logic = not is_publish and arm.utils.logic_editor_space() != None
     write_data.write_khafilejs(is_play, export_physics, export_navigation, export_ui, is_publish, enable_dce, in_viewport, ArmoryExporter.import_traits, import_logic)
+    assets.print_summary()
 
     # Write Main.hx - depends on write_khafilejs for writing number of assets
     scene_name = arm.utils.get_project_scene_name()
@@ -1,12 +1,18 @@
 import bpy
+import importlib.util
+import os
 import arm.assets as assets
 import arm.utils
 import arm.log as log
 import arm.make_state as state
 import arm.api
+import arm.lib.build_cache as build_cache
 
 callback = None
 
+# Lamp name -> (x, y, size) of its tile in the iestexture atlas
+ies_rects = {}
+
 def add_world_defs():
     wrd = bpy.data.worlds['Arm']
     rpdat = arm.utils.get_rp()
@@ -30,9 +36,14 @@ def add_world_defs():
     if wrd.arm_lamp_texture != '':
         wrd.world_defs += '_LampColTex'
 
-    if wrd.arm_lamp_ies_texture != '':
+    ies_rects.clear()
+    if wrd.arm_lamp_ies_texture != '' or any(lamp.arm_ies_profile != '' for lamp in bpy.data.lamps):
         wrd.world_defs += '_LampIES'
         assets.add_embedded_data('iestexture.png')
+        build_ies_texture()
+        if len(ies_rects) > 0:
+            wrd.world_defs += '_LampIESAtlas'
+            assets.add_khafile_def('arm_ies_atlas')
 
     if wrd.arm_lamp_clouds_texture != '':
         wrd.world_defs += '_LampClouds'
@@ -122,6 +133,45 @@ def add_world_defs():
     if '_Brdf' in wrd.world_defs or '_VoxelAO' in wrd.world_defs:
         wrd.world_defs += '_IndPos'
 
+def build_ies_texture():
+    # Generates iestexture.png from the world and lamp profiles, a world texture
+    # which is not an ies file is expected to be bundled as before
+    wrd = bpy.data.worlds['Arm']
+    world_profile = wrd.arm_lamp_ies_texture if wrd.arm_lamp_ies_texture.lower().endswith('.ies') else ''
+    lamp_profiles = [lamp.arm_ies_profile for lamp in bpy.data.lamps if lamp.arm_ies_profile != '']
+    if world_profile == '' and len(lamp_profiles) == 0:
+        return
+    # First tile is used by lamps without a profile of their own
+    paths = [world_profile]
+    for path in lamp_profiles:
+        if path not in paths:
+            paths.append(path)
+    resolution = 128
+    script_path = arm.utils.get_sdk_path() + 'armory/Assets/ies/load_ies.py'
+    out_path = arm.utils.get_fp_build() + '/compiled/Assets'
+    # Texture is kept while the profiles and the generator stay equal,
+    # rewriting it would make khamake pack it again
+    manifest = build_cache.Manifest(out_path + '/ies.json')
+    key = build_cache.hash_data([build_cache.hash_file(script_path), resolution, paths,
+        [build_cache.hash_file(bpy.path.abspath(path)) if path != '' else '' for path in paths]])
+    record = manifest.get('iestexture.png')
+    if record != None and record['key'] == key and os.path.isfile(out_path + '/iestexture.png'):
+        rects = record['rects']
+    else:
+        spec = importlib.util.spec_from_file_location('load_ies', script_path)
+        load_ies = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(load_ies)
+        profiles = [load_ies.load(bpy.path.abspath(path)) if path != '' else None for path in paths]
+        if not os.path.exists(out_path):
+            os.makedirs(out_path)
+        rects = load_ies.write_texture(out_path + '/iestexture.png', profiles, resolution)
+        manifest.set('iestexture.png', {'key': key, 'rects': [list(rect) for rect in rects]})
+        manifest.save()
+    assets.add(out_path + '/iestexture.png')
+    if len(paths) > 1:
+        for lamp in bpy.data.lamps:
+            ies_rects[lamp.name] = rects[paths.index(lamp.arm_ies_profile if lamp.arm_ies_profile != '' else world_profile)]
+
 def build():
     rpdat = arm.utils.get_rp()
     if rpdat.rp_driver != 'Armory' and arm.api.drivers[rpdat.rp_driver]['make_rpath'] != None:
@@ -5,8 +5,6 @@ export_gapi = ''
 last_in_viewport = False
 last_resx = 0
 last_resy = 0
-last_clip_start = 0
-last_clip_end = 0
 last_scene = ''
 last_world_defs = ''
 playproc = None
@@ -8,6 +8,7 @@ import arm.utils
 import arm.node_utils as node_utils
 import arm.log as log
 import arm.make_state as state
+import arm.material.make_texture as make_texture
 
 def build():
     worlds = []
@@ -125,8 +126,8 @@ def parse_color(world, node):
             filepath = unpack_filepath
 
             if do_convert:
-                if not os.path.isfile(unpack_filepath):
-                    arm.utils.unpack_image(image, unpack_filepath, file_format=target_format)
+                make_texture.convert(image, unpack_filepath, file_format=target_format, unpack=True)
+                make_texture.write_conversions()
 
             elif os.path.isfile(unpack_filepath) == False or os.path.getsize(unpack_filepath) != image.packed_file.size:
                 with open(unpack_filepath, 'wb') as f:
@@ -140,9 +141,9 @@ def parse_color(world, node):
                     os.makedirs(unpack_path)
                 converted_path = unpack_path + '/' + tex_file
                 filepath = converted_path
-                # TODO: delete cache when file changes
-                if not os.path.isfile(converted_path):
-                    arm.utils.convert_image(image, converted_path, file_format=target_format)
+                # Probes are generated from the converted map right away
+                make_texture.convert(image, converted_path, file_format=target_format)
+                make_texture.write_conversions()
                 assets.add(converted_path)
             else:
                 # Link image path to assets
@@ -15,6 +15,7 @@
 # limitations under the License.
 #
 import math
+import threading
 import bpy
 import arm.assets
 import arm.utils
@@ -24,108 +25,110 @@ import arm.material.make_texture
 import arm.material.mat_state as mat_state
 import arm.material.cycles_functions as c_functions
 
-basecol_texname = ''
-emission_found = False
-particle_info = None # Particle info export
+class ParserState:
+    # Everything written while translating one node tree, parse() works on a fresh state
+    # so translations do not leak into each other and may run on separate threads
+    def __init__(self, con, vert, frag, geom, tesc, tese, parse_surface, parse_opacity, basecol_only):
+        self.con = con
+        self.vert = vert
+        self.frag = frag
+        self.geom = geom
+        self.tesc = tesc
+        self.tese = tese
+        self.parse_surface = parse_surface
+        self.parse_opacity = parse_opacity
+        self.basecol_only = basecol_only
+        self.parsed = {} # Compute nodes only once
+        self.parents = []
+        self.normal_parsed = False
+        self.curshader = None # Active shader - frag for surface / tese for displacement
+        self.parsing_basecol = False
+        self.basecol_texname = ''
+        self.emission_found = False
+        self.particle_info = {} # Particle info export
+        self.particle_info['index'] = False
+        self.particle_info['age'] = False
+        self.particle_info['lifetime'] = False
+        self.particle_info['location'] = False
+        self.particle_info['size'] = False
+        self.particle_info['velocity'] = False
+        self.particle_info['angular_velocity'] = False
+        self.sample_bump = False
+        self.sample_bump_res = ''
+
+# State of the tree being parsed on this thread
+current = threading.local()
+current.state = None
 
 def parse(nodes, con, vert, frag, geom, tesc, tese, parse_surface=True, parse_opacity=True, parse_displacement=True, basecol_only=False):
+    # Returns the parser state, holding basecol_texname, emission_found and particle_info
+    state = ParserState(con, vert, frag, geom, tesc, tese, parse_surface, parse_opacity, basecol_only)
     output_node = node_by_type(nodes, 'OUTPUT_MATERIAL')
     if output_node != None:
-        parse_output(output_node, con, vert, frag, geom, tesc, tese, parse_surface, parse_opacity, parse_displacement, basecol_only)
-
-def parse_output(node, _con, _vert, _frag, _geom, _tesc, _tese, _parse_surface, _parse_opacity, _parse_displacement, _basecol_only):
-    global parsed # Compute nodes only once
-    global parents
-    global normal_parsed
-    global curshader # Active shader - frag for surface / tese for displacement
-    global con
-    global vert
-    global frag
-    global geom
-    global tesc
-    global tese
-    global parse_surface
-    global parse_opacity
-    global basecol_only
-    global parsing_basecol
-    global basecol_texname
-    global emission_found
-    global particle_info
-    global sample_bump
-    global sample_bump_res
-    con = _con
-    vert = _vert
-    frag = _frag
-    geom = _geom
-    tesc = _tesc
-    tese = _tese
-    parse_surface = _parse_surface
-    parse_opacity = _parse_opacity
-    basecol_only = _basecol_only
-    parsing_basecol = False
-    basecol_texname = ''
-    emission_found = False
-    particle_info = {}
-    particle_info['index'] = False
-    particle_info['age'] = False
-    particle_info['lifetime'] = False
-    particle_info['location'] = False
-    particle_info['size'] = False
-    particle_info['velocity'] = False
-    particle_info['angular_velocity'] = False
-    sample_bump = False
-    sample_bump_res = ''
+        last_state = getattr(current, 'state', None)
+        current.state = state
+        try:
+            parse_output(output_node, parse_displacement)
+        finally:
+            current.state = last_state
+    return state
+
+def parse_output(node, parse_displacement):
+    state = current.state
+    frag = state.frag
 
     # Surface
-    if parse_surface or parse_opacity:
-        parsed = {}
-        parents = []
-        normal_parsed = False
-        curshader = frag
+    if state.parse_surface or state.parse_opacity:
+        state.parsed = {}
+        state.parents = []
+        state.normal_parsed = False
+        state.curshader = frag
         
         out_basecol, out_roughness, out_metallic, out_occlusion, out_specular, out_opacity = parse_shader_input(node.inputs[0])
-        if parse_surface:
+        if state.parse_surface:
             frag.write('basecol = {0};'.format(out_basecol))
             frag.write('roughness = {0};'.format(out_roughness))
             frag.write('metallic = {0};'.format(out_metallic))
             frag.write('occlusion = {0};'.format(out_occlusion))
             frag.write('specular = {0};'.format(out_specular))
-        if parse_opacity:
+        if state.parse_opacity:
             frag.write('opacity = {0};'.format(out_opacity))
 
     # Volume
     # parse_volume_input(node.inputs[1])
 
     # Displacement
-    if _parse_displacement and disp_enabled() and node.inputs[2].is_linked:
-        parsed = {}
-        parents = []
-        normal_parsed = False
+    if parse_displacement and disp_enabled() and node.inputs[2].is_linked:
+        state.parsed = {}
+        state.parents = []
+        state.normal_parsed = False
         rpdat = arm.utils.get_rp()
-        if rpdat.arm_rp_displacement == 'Tessellation' and tese != None:
-            curshader = tese
+        if rpdat.arm_rp_displacement == 'Tessellation' and state.tese != None:
+            state.curshader = state.tese
         else:
-            curshader = vert
+            state.curshader = state.vert
         out_disp = parse_displacement_input(node.inputs[2])
-        curshader.write('float disp = {0};'.format(out_disp))
+        state.curshader.write('float disp = {0};'.format(out_disp))
 
 def parse_group(node, socket): # Entering group
+    state = current.state
     index = socket_index(node, socket)
     output_node = node_by_type(node.node_tree.nodes, 'GROUP_OUTPUT')
     if output_node == None:
         return
     inp = output_node.inputs[index]
-    parents.append(node)
+    state.parents.append(node)
     out_group = parse_input(inp)
-    parents.pop()
+    state.parents.pop()
     return out_group
 
 def parse_group_input(node, socket):
+    state = current.state
     index = socket_index(node, socket)
-    parent = parents.pop() # Leaving group
+    parent = state.parents.pop() # Leaving group
     inp = parent.inputs[index]
     res = parse_input(inp)
-    parents.append(parent) # Return to group
+    state.parents.append(parent) # Return to group
     return res
 
 def parse_input(inp):
@@ -156,7 +159,7 @@ def parse_shader_input(inp):
         return out_basecol, out_roughness, out_metallic, out_occlusion, out_specular, out_opacity
 
 def parse_shader(node, socket):
-    global emission_found
+    state = current.state
     out_basecol = 'vec3(0.8)'
     out_roughness = '0.0'
     out_metallic = '0.0'
@@ -166,7 +169,7 @@ def parse_shader(node, socket):
 
     if node.type == 'GROUP':
         if node.node_tree.name.startswith('Armory PBR'):     
-            if parse_surface:
+            if state.parse_surface:
                 # Base color
                 parsing_basecolor(True)
                 out_basecol = parse_vector_input(node.inputs[0])
@@ -184,9 +187,9 @@ def parse_shader(node, socket):
                 # Emission
                 if node.inputs[6].is_linked or node.inputs[6].default_value != 0.0:
                     out_emission = parse_value_input(node.inputs[6])
-                    emission_found = True
+                    state.emission_found = True
                     out_basecol = '({0} + vec3({1} * 100.0))'.format(out_basecol, out_emission)            
-            if parse_opacity:
+            if state.parse_opacity:
                 out_opacity = parse_value_input(node.inputs[1])
         else:
             return parse_group(node, socket)
@@ -199,11 +202,11 @@ def parse_shader(node, socket):
         fac = parse_value_input(node.inputs[0])
         fac_var = node_name(node.name) + '_fac'
         fac_inv_var = node_name(node.name) + '_fac_inv'
-        curshader.write('{0}float {1} = {2};'.format(prefix, fac_var, fac))
-        curshader.write('{0}float {1} = 1.0 - {2};'.format(prefix, fac_inv_var, fac_var))
+        state.curshader.write('{0}float {1} = {2};'.format(prefix, fac_var, fac))
+        state.curshader.write('{0}float {1} = 1.0 - {2};'.format(prefix, fac_inv_var, fac_var))
         bc1, rough1, met1, occ1, spec1, opac1 = parse_shader_input(node.inputs[1])
         bc2, rough2, met2, occ2, spec2, opac2 = parse_shader_input(node.inputs[2])
-        if parse_surface:
+        if state.parse_surface:
             parsing_basecolor(True)
             out_basecol = '({0} * {3} + {1} * {2})'.format(bc1, bc2, fac_var, fac_inv_var)
             parsing_basecolor(False)
@@ -211,13 +214,13 @@ def parse_shader(node, socket):
             out_metallic = '({0} * {3} + {1} * {2})'.format(met1, met2, fac_var, fac_inv_var)
             out_occlusion = '({0} * {3} + {1} * {2})'.format(occ1, occ2, fac_var, fac_inv_var)
             out_specular = '({0} * {3} + {1} * {2})'.format(spec1, spec2, fac_var, fac_inv_var)
-        if parse_opacity:
+        if state.parse_opacity:
             out_opacity = '({0} * {3} + {1} * {2})'.format(opac1, opac2, fac_var, fac_inv_var)
 
     elif node.type == 'ADD_SHADER':
         bc1, rough1, met1, occ1, spec1, opac1 = parse_shader_input(node.inputs[0])
         bc2, rough2, met2, occ2, spec2, opac2 = parse_shader_input(node.inputs[1])
-        if parse_surface:
+        if state.parse_surface:
             parsing_basecolor(True)
             out_basecol = '({0} + {1})'.format(bc1, bc2)
             parsing_basecolor(False)
@@ -225,11 +228,11 @@ def parse_shader(node, socket):
             out_metallic = '({0} * 0.5 + {1} * 0.5)'.format(met1, met2)
             out_occlusion = '({0} * 0.5 + {1} * 0.5)'.format(occ1, occ2)
             out_specular = '({0} * 0.5 + {1} * 0.5)'.format(spec1, spec2)
-        if parse_opacity:
+        if state.parse_opacity:
             out_opacity = '({0} * 0.5 + {1} * 0.5)'.format(opac1, opac2)
 
     elif node.type == 'BSDF_PRINCIPLED':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[16])
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
@@ -251,7 +254,7 @@ def parse_shader(node, socket):
             # transmission = parse_vector_input(node.inputs[15])
 
     elif node.type == 'BSDF_DIFFUSE':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[2])
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
@@ -260,7 +263,7 @@ def parse_shader(node, socket):
             out_specular = '0.0'
 
     elif node.type == 'BSDF_GLOSSY':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[2])
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
@@ -269,12 +272,12 @@ def parse_shader(node, socket):
             out_metallic = '1.0'
 
     elif node.type == 'AMBIENT_OCCLUSION':
-        if parse_surface:    
+        if state.parse_surface:    
             # Single channel
             out_occlusion = parse_vector_input(node.inputs[0]) + '.r'
 
     elif node.type == 'BSDF_ANISOTROPIC':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[4])
             # Revert to glossy
             parsing_basecolor(True)
@@ -284,27 +287,27 @@ def parse_shader(node, socket):
             out_metallic = '1.0'
 
     elif node.type == 'EMISSION':
-        if parse_surface:
+        if state.parse_surface:
             # Multiply basecol
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
             parsing_basecolor(False)
-            emission_found = True
+            state.emission_found = True
             strength = parse_value_input(node.inputs[1])
             out_basecol = '({0} * ({1} * 100.0))'.format(out_basecol, strength)
 
     elif node.type == 'BSDF_GLASS':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[3])
             out_roughness = parse_value_input(node.inputs[1])
-        if parse_opacity:
+        if state.parse_opacity:
             out_opacity = '(1.0 - {0}.r)'.format(parse_vector_input(node.inputs[0]))
 
     elif node.type == 'BSDF_HAIR':
         pass
 
     elif node.type == 'HOLDOUT':
-        if parse_surface:
+        if state.parse_surface:
             # Occlude
             out_occlusion = '0.0'
 
@@ -313,7 +316,7 @@ def parse_shader(node, socket):
         pass
 
     elif node.type == 'SUBSURFACE_SCATTERING':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[4])
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
@@ -324,17 +327,17 @@ def parse_shader(node, socket):
         pass
 
     elif node.type == 'BSDF_TRANSLUCENT':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[1])
-        if parse_opacity:
+        if state.parse_opacity:
             out_opacity = '(1.0 - {0}.r)'.format(parse_vector_input(node.inputs[0]))
 
     elif node.type == 'BSDF_TRANSPARENT':
-        if parse_opacity:
+        if state.parse_opacity:
             out_opacity = '(1.0 - {0}.r)'.format(parse_vector_input(node.inputs[0]))
 
     elif node.type == 'BSDF_VELVET':
-        if parse_surface:
+        if state.parse_surface:
             write_normal(node.inputs[2])
             parsing_basecolor(True)
             out_basecol = parse_vector_input(node.inputs[0])
@@ -380,6 +383,7 @@ def parse_vector_input(inp):
                 return to_vec3(inp.default_value)
 
 def parse_rgb(node, socket):
+    state = current.state
 
     if node.type == 'GROUP':
         return parse_group(node, socket)
@@ -390,19 +394,19 @@ def parse_rgb(node, socket):
     elif node.type == 'ATTRIBUTE':
         # Vcols only for now
         # node.attribute_name
-        con.add_elem('col', 3)
+        state.con.add_elem('col', 3)
         return 'vcolor'
 
     elif node.type == 'RGB':
         if node.arm_material_param:
             nn = 'param_' + node_name(node.name)
-            curshader.add_uniform('vec3 {0}'.format(nn), link='{0}'.format(node.name))
+            state.curshader.add_uniform('vec3 {0}'.format(nn), link='{0}'.format(node.name))
             return nn
         else:
             return to_vec3(socket.default_value)
 
     elif node.type == 'TEX_BRICK':
-        curshader.add_function(c_functions.str_tex_brick)
+        state.curshader.add_function(c_functions.str_tex_brick)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -414,7 +418,7 @@ def parse_rgb(node, socket):
         return 'tex_brick({0} * {4}, {1}, {2}, {3})'.format(co, col1, col2, col3, scale)
 
     elif node.type == 'TEX_CHECKER':
-        curshader.add_function(c_functions.str_tex_checker)
+        state.curshader.add_function(c_functions.str_tex_checker)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -452,16 +456,16 @@ def parse_rgb(node, socket):
 
     elif node.type == 'TEX_IMAGE':
         # Already fetched
-        if res_var_name(node, node.outputs[1]) in parsed:
+        if res_var_name(node, node.outputs[1]) in state.parsed:
             return '{0}.rgb'.format(store_var_name(node))
         tex_name = node_name(node.name)
         tex = make_texture(node, tex_name)
         tex_link = node.name if node.arm_material_param else None
         if tex != None:
-            curshader.write_textures += 1
-            to_linear = parsing_basecol and not tex['file'].endswith('.hdr')
+            state.curshader.write_textures += 1
+            to_linear = state.parsing_basecol and not tex['file'].endswith('.hdr')
             res = '{0}.rgb'.format(texture_store(node, tex, tex_name, to_linear, tex_link=tex_link))
-            curshader.write_textures -= 1
+            state.curshader.write_textures -= 1
             return res
         elif node.image == None: # Empty texture
             tex = {}
@@ -470,11 +474,11 @@ def parse_rgb(node, socket):
             return '{0}.rgb'.format(texture_store(node, tex, tex_name, True, tex_link=tex_link))
         else:
             tex_store = store_var_name(node) # Pink color for missing texture
-            curshader.write('vec4 {0} = vec4(1.0, 0.0, 1.0, 1.0);'.format(tex_store))
+            state.curshader.write('vec4 {0} = vec4(1.0, 0.0, 1.0, 1.0);'.format(tex_store))
             return '{0}.rgb'.format(tex_store)
 
     elif node.type == 'TEX_MAGIC':
-        curshader.add_function(c_functions.str_tex_magic)
+        state.curshader.add_function(c_functions.str_tex_magic)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -483,7 +487,7 @@ def parse_rgb(node, socket):
         return 'vec3(tex_magic({0} * {1} * 4.0))'.format(co, scale)
 
     elif node.type == 'TEX_MUSGRAVE':
-        curshader.add_function(c_functions.str_tex_musgrave)
+        state.curshader.add_function(c_functions.str_tex_musgrave)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -494,11 +498,11 @@ def parse_rgb(node, socket):
         return 'vec3(tex_musgrave_f({0} * {1} * 0.5))'.format(co, scale)
 
     elif node.type == 'TEX_NOISE':
-        curshader.add_function(c_functions.str_tex_noise)
+        state.curshader.add_function(c_functions.str_tex_noise)
         assets_add(get_sdk_path() + '/armory/Assets/' + 'noise256.png')
         assets_add_embedded_data('noise256.png')
-        curshader.add_uniform('sampler2D snoise256', link='_noise256')
-        curshader.add_function(c_functions.str_tex_noise)
+        state.curshader.add_uniform('sampler2D snoise256', link='_noise256')
+        state.curshader.add_function(c_functions.str_tex_noise)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -518,10 +522,10 @@ def parse_rgb(node, socket):
         return to_vec3([0.0, 0.0, 0.0])
 
     elif node.type == 'TEX_VORONOI':
-        curshader.add_function(c_functions.str_tex_voronoi)
+        state.curshader.add_function(c_functions.str_tex_voronoi)
         assets_add(get_sdk_path() + '/armory/Assets/' + 'noise256.png')
         assets_add_embedded_data('noise256.png')
-        curshader.add_uniform('sampler2D snoise256', link='_noise256')
+        state.curshader.add_uniform('sampler2D snoise256', link='_noise256')
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -533,7 +537,7 @@ def parse_rgb(node, socket):
             return 'tex_voronoi({0} * {1}).rgb'.format(co, scale)
 
     elif node.type == 'TEX_WAVE':
-        curshader.add_function(c_functions.str_tex_wave)
+        state.curshader.add_function(c_functions.str_tex_wave)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -545,7 +549,7 @@ def parse_rgb(node, socket):
         out_col = parse_vector_input(node.inputs[0])
         bright = parse_value_input(node.inputs[1])
         contr = parse_value_input(node.inputs[2])
-        curshader.add_function(c_functions.str_brightcontrast)
+        state.curshader.add_function(c_functions.str_brightcontrast)
         return 'brightcontrast({0}, {1}, {2})'.format(out_col, bright, contr)
 
     elif node.type == 'GAMMA':
@@ -554,7 +558,7 @@ def parse_rgb(node, socket):
         return 'pow({0}, vec3({1}))'.format(out_col, gamma)
 
     elif node.type == 'HUE_SAT':
-        curshader.add_function(c_functions.str_hsv_to_rgb)
+        state.curshader.add_function(c_functions.str_hsv_to_rgb)
         hue = parse_value_input(node.inputs[0])
         sat = parse_value_input(node.inputs[1])
         val = parse_value_input(node.inputs[2])
@@ -570,7 +574,7 @@ def parse_rgb(node, socket):
     elif node.type == 'MIX_RGB':
         fac = parse_value_input(node.inputs[0])
         fac_var = node_name(node.name) + '_fac'
-        curshader.write('float {0} = {1};'.format(fac_var, fac))
+        state.curshader.write('float {0} = {1};'.format(fac_var, fac))
         col1 = parse_vector_input(node.inputs[1])
         col2 = parse_vector_input(node.inputs[2])
         blend = node.blend_type
@@ -632,16 +636,16 @@ def parse_rgb(node, socket):
             return to_vec3(elems[0].color)
         if interp == 'CONSTANT':
             fac_var = node_name(node.name) + '_fac'
-            curshader.write('float {0} = {1};'.format(fac_var, fac))
+            state.curshader.write('float {0} = {1};'.format(fac_var, fac))
             # Get index
             out_i = '0'
             for i in  range(1, len(elems)):
                 out_i += ' + ({0} > {1} ? 1 : 0)'.format(fac_var, elems[i].position)
             # Write cols array
             cols_var = node_name(node.name) + '_cols'
-            curshader.write('vec3 {0}[{1}];'.format(cols_var, len(elems)))
+            state.curshader.write('vec3 {0}[{1}];'.format(cols_var, len(elems)))
             for i in range(0, len(elems)):
-                curshader.write('{0}[{1}] = vec3({2}, {3}, {4});'.format(cols_var, i, elems[i].color[0], elems[i].color[1], elems[i].color[2]))
+                state.curshader.write('{0}[{1}] = vec3({2}, {3}, {4});'.format(cols_var, i, elems[i].color[0], elems[i].color[1], elems[i].color[2]))
             return '{0}[{1}]'.format(cols_var, out_i)
         else: # Linear, .. - 2 elems only, end pos assumed to be 1
             # float f = clamp((pos - start) * (1.0 / (1.0 - start)), 0.0, 1.0);
@@ -658,15 +662,13 @@ def parse_rgb(node, socket):
         return 'vec3({0}, {1}, {2})'.format(r, g, b)
 
     elif node.type == 'WAVELENGTH':
-        curshader.add_function(c_functions.str_wavelength_to_rgb)
+        state.curshader.add_function(c_functions.str_wavelength_to_rgb)
         wl = parse_value_input(node.inputs[0])
         # Roughly map to cycles - 450 to 600 nanometers
         return 'wavelength_to_rgb(({0} - 450.0) / 150.0)'.format(wl)
 
 def parse_vector(node, socket):
-    global particle_info
-    global sample_bump
-    global sample_bump_res
+    state = current.state
 
     if node.type == 'GROUP':
         return parse_group(node, socket)
@@ -676,7 +678,7 @@ def parse_vector(node, socket):
 
     elif node.type == 'ATTRIBUTE':
         # UVMaps only for now
-        con.add_elem('tex', 2)
+        state.con.add_elem('tex', 2)
         mat = mat_get_material()
         mat_users = mat_get_material_users()
         if mat_users != None and mat in mat_users:
@@ -685,7 +687,7 @@ def parse_vector(node, socket):
                 lays = mat_user.data.uv_layers
                 # Second uvmap referenced
                 if len(lays) > 1 and node.attribute_name == lays[1].name:
-                    con.add_elem('tex1', 2)
+                    state.con.add_elem('tex1', 2)
                     return 'vec3(texCoord1.xy, 0.0)'
         return 'vec3(texCoord.xy, 0.0)'
 
@@ -715,13 +717,13 @@ def parse_vector(node, socket):
 
     elif node.type == 'PARTICLE_INFO':
         if socket == node.outputs[3]: # Location
-            particle_info['location'] = True
+            state.particle_info['location'] = True
             return 'p_location' if mat_get_material().arm_particle == 'gpu' else 'vec3(0.0)'
         elif socket == node.outputs[5]: # Velocity
-            particle_info['velocity'] = True
+            state.particle_info['velocity'] = True
             return 'p_velocity' if mat_get_material().arm_particle == 'gpu' else 'vec3(0.0)'
         elif socket == node.outputs[6]: # Angular Velocity
-            particle_info['angular_velocity'] = True
+            state.particle_info['angular_velocity'] = True
             return 'vec3(0.0)'
 
     elif node.type == 'TANGENT':
@@ -735,7 +737,7 @@ def parse_vector(node, socket):
         elif socket == node.outputs[1]: # Normal
             return 'n'
         elif socket == node.outputs[2]: # UV
-            con.add_elem('tex', 2)
+            state.con.add_elem('tex', 2)
             return 'vec3(texCoord.x, 1.0 - texCoord.y, 0.0)'
         elif socket == node.outputs[3]: # Object
             return 'mposition'
@@ -756,21 +758,21 @@ def parse_vector(node, socket):
         strength = parse_value_input(node.inputs[0])
         # Height multiplier
         # distance = parse_value_input(node.inputs[1])
-        sample_bump = True
+        state.sample_bump = True
         height = parse_value_input(node.inputs[2])
-        sample_bump = False
+        state.sample_bump = False
         nor = parse_vector_input(node.inputs[3])
-        if sample_bump_res != '':
+        if state.sample_bump_res != '':
             if node.invert:
                 ext = ['1', '2', '3', '4']
             else:
                 ext = ['2', '1', '4', '3']
-            curshader.write('float {0}_fh1 = {0}_{1} - {0}_{2}; float {0}_fh2 = {0}_{3} - {0}_{4};'.format(sample_bump_res, ext[0], ext[1], ext[2], ext[3]))
-            curshader.write('{0}_fh1 *= ({1}) * 3.0; {0}_fh2 *= ({1}) * 3.0;'.format(sample_bump_res, strength))
-            curshader.write('vec3 {0}_a = normalize(vec3(2.0, 0.0, {0}_fh1));'.format(sample_bump_res))
-            curshader.write('vec3 {0}_b = normalize(vec3(0.0, 2.0, {0}_fh2));'.format(sample_bump_res))
-            res = 'normalize(mat3({0}_a, {0}_b, normalize(vec3({0}_fh1, {0}_fh2, 2.0))) * n)'.format(sample_bump_res)
-            sample_bump_res = ''
+            state.curshader.write('float {0}_fh1 = {0}_{1} - {0}_{2}; float {0}_fh2 = {0}_{3} - {0}_{4};'.format(state.sample_bump_res, ext[0], ext[1], ext[2], ext[3]))
+            state.curshader.write('{0}_fh1 *= ({1}) * 3.0; {0}_fh2 *= ({1}) * 3.0;'.format(state.sample_bump_res, strength))
+            state.curshader.write('vec3 {0}_a = normalize(vec3(2.0, 0.0, {0}_fh1));'.format(state.sample_bump_res))
+            state.curshader.write('vec3 {0}_b = normalize(vec3(0.0, 2.0, {0}_fh2));'.format(state.sample_bump_res))
+            res = 'normalize(mat3({0}_a, {0}_b, normalize(vec3({0}_fh1, {0}_fh2, 2.0))) * n)'.format(state.sample_bump_res)
+            state.sample_bump_res = ''
         else:
             res = 'n'
         return res
@@ -805,7 +807,7 @@ def parse_vector(node, socket):
             return 'vec3(dot({0}, {1}))'.format(to_vec3(node.outputs[0].default_value), nor)
 
     elif node.type == 'NORMAL_MAP':
-        if curshader == tese:
+        if state.curshader == state.tese:
             return parse_vector_input(node.inputs[1])
         else:
             #space = node.space
@@ -858,32 +860,31 @@ def parse_vector(node, socket):
         return 'vec3({0})'.format(height)
 
 def parse_normal_map_color_input(inp, strength=1.0):
-    global normal_parsed
-    global frag
-    if basecol_only:
+    state = current.state
+    if state.basecol_only:
         return
     if inp.is_linked == False:
         return
-    if normal_parsed:
+    if state.normal_parsed:
         return
-    normal_parsed = True
-    frag.write_normal += 1
+    state.normal_parsed = True
+    state.frag.write_normal += 1
     defplus = get_rp_renderer() == 'Deferred Plus'
     if not get_arm_export_tangents() or defplus or mat_get_material().arm_decal: # Compute TBN matrix
-        frag.write('vec3 texn = ({0}) * 2.0 - 1.0;'.format(parse_vector_input(inp)))
-        frag.write('texn.y = -texn.y;')
-        frag.add_include('std/normals.glsl')
+        state.frag.write('vec3 texn = ({0}) * 2.0 - 1.0;'.format(parse_vector_input(inp)))
+        state.frag.write('texn.y = -texn.y;')
+        state.frag.add_include('std/normals.glsl')
         if defplus:
-            frag.write('mat3 TBN = cotangentFrame(n, -vVec, g2.xy, g2.zw);')
+            state.frag.write('mat3 TBN = cotangentFrame(n, -vVec, g2.xy, g2.zw);')
         else:
-            frag.write('mat3 TBN = cotangentFrame(n, -vVec, texCoord);')
-        frag.write('n = TBN * normalize(texn);')
+            state.frag.write('mat3 TBN = cotangentFrame(n, -vVec, texCoord);')
+        state.frag.write('n = TBN * normalize(texn);')
     else:
-        frag.write('vec3 n = ({0}) * 2.0 - 1.0;'.format(parse_vector_input(inp)))
-        frag.write('n.xy *= {0};'.format(strength))
-        frag.write('n = normalize(TBN * n);')
-        con.add_elem('tang', 3)
-    frag.write_normal -= 1
+        state.frag.write('vec3 n = ({0}) * 2.0 - 1.0;'.format(parse_vector_input(inp)))
+        state.frag.write('n.xy *= {0};'.format(strength))
+        state.frag.write('n = normalize(TBN * n);')
+        state.con.add_elem('tang', 3)
+    state.frag.write_normal -= 1
 
 def parse_value_input(inp):
     if inp.is_linked:
@@ -905,8 +906,7 @@ def parse_value_input(inp):
             return to_vec1(inp.default_value)
 
 def parse_value(node, socket):
-    global particle_info
-    global sample_bump
+    state = current.state
 
     if node.type == 'GROUP':
         if node.node_tree.name.startswith('Armory PBR'):
@@ -924,7 +924,7 @@ def parse_value(node, socket):
     elif node.type == 'ATTRIBUTE':
         # Pass time till drivers are implemented
         if node.attribute_name == 'time':
-            curshader.add_uniform('float time', link='_time')
+            state.curshader.add_uniform('float time', link='_time')
             return 'time'
         else:
             return '0.0'
@@ -932,12 +932,12 @@ def parse_value(node, socket):
     elif node.type == 'CAMERA':
         # View Z Depth
         if socket == node.outputs[1]:
-            curshader.add_include('std/math.glsl')
-            curshader.add_uniform('vec2 cameraProj', link='_cameraPlaneProj')
+            state.curshader.add_include('std/math.glsl')
+            state.curshader.add_uniform('vec2 cameraProj', link='_cameraPlaneProj')
             return 'linearize(gl_FragCoord.z, cameraProj)'
         # View Distance
         else:
-            curshader.add_uniform('vec3 eye', link='_cameraPosition')
+            state.curshader.add_uniform('vec3 eye', link='_cameraPosition')
             return 'distance(eye, wposition)'
 
     elif node.type == 'FRESNEL':
@@ -991,33 +991,33 @@ def parse_value(node, socket):
 
     elif node.type == 'OBJECT_INFO':
         if socket == node.outputs[1]: # Object Index
-            curshader.add_uniform('float objectInfoIndex', link='_objectInfoIndex')
+            state.curshader.add_uniform('float objectInfoIndex', link='_objectInfoIndex')
             return 'objectInfoIndex'
         elif socket == node.outputs[2]: # Material Index
-            curshader.add_uniform('float objectInfoMaterialIndex', link='_objectInfoMaterialIndex')
+            state.curshader.add_uniform('float objectInfoMaterialIndex', link='_objectInfoMaterialIndex')
             return 'objectInfoMaterialIndex'
         elif socket == node.outputs[3]: # Random
-            curshader.add_uniform('float objectInfoRandom', link='_objectInfoRandom')
+            state.curshader.add_uniform('float objectInfoRandom', link='_objectInfoRandom')
             return 'objectInfoRandom'
 
     elif node.type == 'PARTICLE_INFO':
         if socket == node.outputs[0]: # Index
-            particle_info['index'] = True
+            state.particle_info['index'] = True
             return 'p_index' if mat_get_material().arm_particle == 'gpu' else '0.0'
         elif socket == node.outputs[1]: # Age
-            particle_info['age'] = True
+            state.particle_info['age'] = True
             return 'p_age' if mat_get_material().arm_particle == 'gpu' else '0.0'
         elif socket == node.outputs[2]: # Lifetime
-            particle_info['lifetime'] = True
+            state.particle_info['lifetime'] = True
             return 'p_lifetime' if mat_get_material().arm_particle == 'gpu' else '0.0'
         elif socket == node.outputs[4]: # Size
-            particle_info['size'] = True
+            state.particle_info['size'] = True
             return '1.0'
 
     elif node.type == 'VALUE':
         if node.arm_material_param:
             nn = 'param_' + node_name(node.name)
-            curshader.add_uniform('float {0}'.format(nn), link='{0}'.format(node.name))
+            state.curshader.add_uniform('float {0}'.format(nn), link='{0}'.format(node.name))
             return nn
         else:
             return to_vec1(node.outputs[0].default_value)
@@ -1028,7 +1028,7 @@ def parse_value(node, socket):
         return '0.0'
 
     elif node.type == 'TEX_BRICK':
-        curshader.add_function(c_functions.str_tex_brick)
+        state.curshader.add_function(c_functions.str_tex_brick)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1037,14 +1037,14 @@ def parse_value(node, socket):
         return 'tex_brick_f({0} * {1})'.format(co, scale)
 
     elif node.type == 'TEX_CHECKER':
-        curshader.add_function(c_functions.str_tex_checker)
+        state.curshader.add_function(c_functions.str_tex_checker)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
             co = 'bposition'
         scale = parse_value_input(node.inputs[3])
         res = 'tex_checker_f({0}, {1}).r'.format(co, scale)
-        if sample_bump:
+        if state.sample_bump:
             write_bump(node, res)
         return res
 
@@ -1072,23 +1072,23 @@ def parse_value(node, socket):
 
     elif node.type == 'TEX_IMAGE':
         # Already fetched
-        if res_var_name(node, node.outputs[0]) in parsed:
+        if res_var_name(node, node.outputs[0]) in state.parsed:
             return '{0}.a'.format(store_var_name(node))
         tex_name = safesrc(node.name)
         tex = make_texture(node, tex_name)
         tex_link = node.name if node.arm_material_param else None
         if tex != None:
-            curshader.write_textures += 1
+            state.curshader.write_textures += 1
             res = '{0}.a'.format(texture_store(node, tex, tex_name, tex_link=tex_link))
-            curshader.write_textures -= 1
+            state.curshader.write_textures -= 1
             return res
         else:
             tex_store = store_var_name(node) # Pink color for missing texture
-            curshader.write('vec4 {0} = vec4(1.0, 0.0, 1.0, 1.0);'.format(tex_store))
+            state.curshader.write('vec4 {0} = vec4(1.0, 0.0, 1.0, 1.0);'.format(tex_store))
             return '{0}.a'.format(tex_store)
 
     elif node.type == 'TEX_MAGIC':
-        curshader.add_function(c_functions.str_tex_magic)
+        state.curshader.add_function(c_functions.str_tex_magic)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1098,7 +1098,7 @@ def parse_value(node, socket):
 
     elif node.type == 'TEX_MUSGRAVE':
         # Fall back to noise
-        curshader.add_function(c_functions.str_tex_musgrave)
+        state.curshader.add_function(c_functions.str_tex_musgrave)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1109,10 +1109,10 @@ def parse_value(node, socket):
         return 'tex_musgrave_f({0} * {1} * 0.5)'.format(co, scale)
 
     elif node.type == 'TEX_NOISE':
-        curshader.add_function(c_functions.str_tex_noise)
+        state.curshader.add_function(c_functions.str_tex_noise)
         assets_add(get_sdk_path() + '/armory/Assets/' + 'noise256.png')
         assets_add_embedded_data('noise256.png')
-        curshader.add_uniform('sampler2D snoise256', link='_noise256')
+        state.curshader.add_uniform('sampler2D snoise256', link='_noise256')
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1121,7 +1121,7 @@ def parse_value(node, socket):
         # detail = parse_value_input(node.inputs[2])
         # distortion = parse_value_input(node.inputs[3])
         res = 'tex_noise({0} * {1})'.format(co, scale)
-        if sample_bump:
+        if state.sample_bump:
             write_bump(node, res)
         return res
 
@@ -1129,10 +1129,10 @@ def parse_value(node, socket):
         return '0.0'
 
     elif node.type == 'TEX_VORONOI':
-        curshader.add_function(c_functions.str_tex_voronoi)
+        state.curshader.add_function(c_functions.str_tex_voronoi)
         assets_add(get_sdk_path() + '/armory/Assets/' + 'noise256.png')
         assets_add_embedded_data('noise256.png')
-        curshader.add_uniform('sampler2D snoise256', link='_noise256')
+        state.curshader.add_uniform('sampler2D snoise256', link='_noise256')
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1144,7 +1144,7 @@ def parse_value(node, socket):
             return 'tex_voronoi({0} * {1}).r'.format(co, scale)
 
     elif node.type == 'TEX_WAVE':
-        curshader.add_function(c_functions.str_tex_wave)
+        state.curshader.add_function(c_functions.str_tex_wave)
         if node.inputs[0].is_linked:
             co = parse_vector_input(node.inputs[0])
         else:
@@ -1250,38 +1250,40 @@ def parse_value(node, socket):
 ##
 
 def write_normal(inp):
+    state = current.state
     if inp.is_linked and inp.links[0].from_node.type != 'GROUP_INPUT':
         normal_res = parse_vector_input(inp)
         if normal_res != None:
-            curshader.write('n = {0};'.format(normal_res))
+            state.curshader.write('n = {0};'.format(normal_res))
 
 def parsing_basecolor(b):
-    global parsing_basecol
-    parsing_basecol = b
+    state = current.state
+    state.parsing_basecol = b
     
 def res_var_name(node, socket):
     return node_name(node.name) + '_' + safesrc(socket.name) + '_res'
 
 def write_result(l):
+    state = current.state
     res_var = res_var_name(l.from_node, l.from_socket)
     st = l.from_socket.type
-    if res_var not in parsed:
-        parsed[res_var] = True
+    if res_var not in state.parsed:
+        state.parsed[res_var] = True
         if st == 'RGB' or st == 'RGBA':
             res = parse_rgb(l.from_node, l.from_socket)
             if res == None:
                 return None
-            curshader.write('vec3 {0} = {1};'.format(res_var, res))
+            state.curshader.write('vec3 {0} = {1};'.format(res_var, res))
         elif st == 'VECTOR':
             res = parse_vector(l.from_node, l.from_socket)
             if res == None:
                 return None
-            curshader.write('vec3 {0} = {1};'.format(res_var, res))
+            state.curshader.write('vec3 {0} = {1};'.format(res_var, res))
         elif st == 'VALUE':
             res = parse_value(l.from_node, l.from_socket)
             if res == None:
                 return None
-            curshader.write('float {0} = {1};'.format(res_var, res))
+            state.curshader.write('float {0} = {1};'.format(res_var, res))
     # Normal map already parsed, return
     elif l.from_node.type == 'NORMAL_MAP':
         return None
@@ -1294,21 +1296,19 @@ def glsl_type(t):
         return 'float'
 
 def to_uniform(inp):
+    state = current.state
     uname = safesrc(inp.node.name) + safesrc(inp.name)
-    curshader.add_uniform(glsl_type(inp.type) + ' ' + uname)
+    state.curshader.add_uniform(glsl_type(inp.type) + ' ' + uname)
     return uname
 
 def store_var_name(node):
     return node_name(node.name) + '_store'
 
 def texture_store(node, tex, tex_name, to_linear=False, tex_link=None):
-    global parsing_basecol
-    global basecol_texname
-    global sample_bump
-    global sample_bump_res
+    state = current.state
     mat_bind_texture(tex)
-    con.add_elem('tex', 2)
-    curshader.add_uniform('sampler2D {0}'.format(tex_name), link=tex_link)
+    state.con.add_elem('tex', 2)
+    state.curshader.add_uniform('sampler2D {0}'.format(tex_name), link=tex_link)
     if node.inputs[0].is_linked:
         uv_name = parse_vector_input(node.inputs[0])
         uv_name = 'vec2({0}.x, 1.0 - {0}.y)'.format(uv_name)
@@ -1316,26 +1316,25 @@ def texture_store(node, tex, tex_name, to_linear=False, tex_link=None):
         uv_name = 'texCoord'
     tex_store = store_var_name(node)
     if mat_texture_grad():
-        curshader.write('vec4 {0} = textureGrad({1}, {2}.xy, g2.xy, g2.zw);'.format(tex_store, tex_name, uv_name))
+        state.curshader.write('vec4 {0} = textureGrad({1}, {2}.xy, g2.xy, g2.zw);'.format(tex_store, tex_name, uv_name))
     else:
-        curshader.write('vec4 {0} = texture({1}, {2}.xy);'.format(tex_store, tex_name, uv_name))
-    if sample_bump:
-        sample_bump_res = tex_store
-        curshader.write('float {0}_1 = textureOffset({1}, {2}.xy, ivec2(-2, 0)).r;'.format(tex_store, tex_name, uv_name))
-        curshader.write('float {0}_2 = textureOffset({1}, {2}.xy, ivec2(2, 0)).r;'.format(tex_store, tex_name, uv_name))
-        curshader.write('float {0}_3 = textureOffset({1}, {2}.xy, ivec2(0, -2)).r;'.format(tex_store, tex_name, uv_name))
-        curshader.write('float {0}_4 = textureOffset({1}, {2}.xy, ivec2(0, 2)).r;'.format(tex_store, tex_name, uv_name))
-        sample_bump = False
+        state.curshader.write('vec4 {0} = texture({1}, {2}.xy);'.format(tex_store, tex_name, uv_name))
+    if state.sample_bump:
+        state.sample_bump_res = tex_store
+        state.curshader.write('float {0}_1 = textureOffset({1}, {2}.xy, ivec2(-2, 0)).r;'.format(tex_store, tex_name, uv_name))
+        state.curshader.write('float {0}_2 = textureOffset({1}, {2}.xy, ivec2(2, 0)).r;'.format(tex_store, tex_name, uv_name))
+        state.curshader.write('float {0}_3 = textureOffset({1}, {2}.xy, ivec2(0, -2)).r;'.format(tex_store, tex_name, uv_name))
+        state.curshader.write('float {0}_4 = textureOffset({1}, {2}.xy, ivec2(0, 2)).r;'.format(tex_store, tex_name, uv_name))
+        state.sample_bump = False
     if to_linear:
-        curshader.write('{0}.rgb = pow({0}.rgb, vec3(2.2));'.format(tex_store))
-    if parsing_basecol:
-        basecol_texname = tex_store
+        state.curshader.write('{0}.rgb = pow({0}.rgb, vec3(2.2));'.format(tex_store))
+    if state.parsing_basecol:
+        state.basecol_texname = tex_store
     return tex_store
 
 def write_bump(node, res):
-    global sample_bump
-    global sample_bump_res
-    sample_bump_res = store_var_name(node) + '_bump'
+    state = current.state
+    state.sample_bump_res = store_var_name(node) + '_bump'
     # Testing.. get function parts..
     ar = res.split('(', 1)
     pre = ar[0] + '('
@@ -1346,11 +1345,11 @@ def write_bump(node, res):
     else:
         co = ar[1][:-1]
         post = ')'
-    curshader.write('float {0}_1 = {1}{2} + vec2(-2, 0){3};'.format(sample_bump_res, pre, co, post))
-    curshader.write('float {0}_2 = {1}{2} + vec2(2, 0){3};'.format(sample_bump_res, pre, co, post))
-    curshader.write('float {0}_3 = {1}{2} + vec2(0, -2){3};'.format(sample_bump_res, pre, co, post))
-    curshader.write('float {0}_4 = {1}{2} + vec2(0, 2){3};'.format(sample_bump_res, pre, co, post))
-    sample_bump = False
+    state.curshader.write('float {0}_1 = {1}{2} + vec2(-2, 0){3};'.format(state.sample_bump_res, pre, co, post))
+    state.curshader.write('float {0}_2 = {1}{2} + vec2(2, 0){3};'.format(state.sample_bump_res, pre, co, post))
+    state.curshader.write('float {0}_3 = {1}{2} + vec2(0, -2){3};'.format(state.sample_bump_res, pre, co, post))
+    state.curshader.write('float {0}_4 = {1}{2} + vec2(0, 2){3};'.format(state.sample_bump_res, pre, co, post))
+    state.sample_bump = False
 
 def to_vec1(v):
     return str(v)
@@ -1369,7 +1368,8 @@ def socket_index(node, socket):
             return i
 
 def node_name(s):
-    for p in parents:
+    state = current.state
+    for p in state.parents:
         s = p.name + '_' + s
     if '__' in s: # Consecutive _ are reserved
         s = s.replace('_', '_x')
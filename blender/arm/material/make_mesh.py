@@ -171,6 +171,7 @@ def make_base(con_mesh, parse_opacity):
     frag.add_include('compiled.glsl')
 
     written = False
+    particle_info = None
     if write_material_attribs != None:
         written = write_material_attribs(con_mesh, frag)
     if written == False:
@@ -181,12 +182,12 @@ def make_base(con_mesh, parse_opacity):
         frag.write('float specular;')
         if parse_opacity:
             frag.write('float opacity;')
-        cycles.parse(mat_state.nodes, con_mesh, vert, frag, geom, tesc, tese, parse_opacity=parse_opacity)
+        particle_info = cycles.parse(mat_state.nodes, con_mesh, vert, frag, geom, tesc, tese, parse_opacity=parse_opacity).particle_info
     if write_material_attribs_post != None:
         write_material_attribs_post(con_mesh, frag)
 
     if not is_displacement and not vattr_written:
-        write_vertpos(vert)
+        write_vertpos(vert, particle_info)
 
     if con_mesh.is_elem('tex'):
         vert.add_out('vec2 texCoord')
@@ -250,13 +251,13 @@ def make_base(con_mesh, parse_opacity):
         sh.write('wposition += wnormal * disp * 0.1;')
         sh.write('gl_Position = VP * vec4(wposition, 1.0);')
 
-def write_vertpos(vert):
+def write_vertpos(vert, particle_info=None):
     billboard = mat_state.material.arm_billboard
     particle = mat_state.material.arm_particle
     # Particles
     if particle != 'off':
         if particle == 'gpu':
-            make_particle.write(vert, particle_info=cycles.particle_info)
+            make_particle.write(vert, particle_info=particle_info)
         # Billboards
         if billboard == 'spherical':
             vert.add_uniform('mat4 WV', '_worldViewMatrix')
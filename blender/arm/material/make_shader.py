@@ -2,6 +2,7 @@ import os
 import bpy
 import arm.utils
 import arm.assets as assets
+import arm.lib.shader_store as shader_store
 import arm.material.mat_utils as mat_utils
 import arm.material.mat_state as mat_state
 from arm.material.shader_data import ShaderData
@@ -107,14 +108,13 @@ def build(material, mat_users, mat_armusers):
     return rpasses, mat_state.data, shader_data_name, bind_constants, bind_textures
 
 def write_shaders(rel_path, con, rpass, matname):
-    keep_cache = mat_state.material.is_cached
-    write_shader(rel_path, con.vert, 'vert', rpass, matname, keep_cache=keep_cache)
-    write_shader(rel_path, con.frag, 'frag', rpass, matname, keep_cache=keep_cache)
-    write_shader(rel_path, con.geom, 'geom', rpass, matname, keep_cache=keep_cache)
-    write_shader(rel_path, con.tesc, 'tesc', rpass, matname, keep_cache=keep_cache)
-    write_shader(rel_path, con.tese, 'tese', rpass, matname, keep_cache=keep_cache)
-
-def write_shader(rel_path, shader, ext, rpass, matname, keep_cache=True):
+    write_shader(rel_path, con.vert, 'vert', rpass, matname)
+    write_shader(rel_path, con.frag, 'frag', rpass, matname)
+    write_shader(rel_path, con.geom, 'geom', rpass, matname)
+    write_shader(rel_path, con.tesc, 'tesc', rpass, matname)
+    write_shader(rel_path, con.tese, 'tese', rpass, matname)
+
+def write_shader(rel_path, shader, ext, rpass, matname):
     if shader == None or shader.is_linked:
         return
 
@@ -125,6 +125,5 @@ def write_shader(rel_path, shader, ext, rpass, matname, keep_cache=True):
     shader_rel_path = rel_path + '/' + matname + '_' + rpass + '.' + ext + '.glsl'
     shader_path = arm.utils.get_fp() + '/' + shader_rel_path
     assets.add_shader(shader_rel_path)
-    if not os.path.isfile(shader_path) or not keep_cache:
-        with open(shader_path, 'w') as f:
-            f.write(shader.get())
+    # Unchanged variants keep their file and compiled output
+    shader_store.write(shader_path, shader.get())
@@ -5,7 +5,20 @@ import arm.utils
 import arm.assets as assets
 import arm.material.mat_state as mat_state
 import arm.make_state as state
+import arm.lib.build_cache as build_cache
+import arm.lib.image_info as image_info
+import concurrent.futures
 import shutil
+import threading
+
+# Bump when converted textures change for equal inputs
+texture_cache_version = 1
+
+# Output path -> queued conversion, written by write_conversions()
+conversions = {}
+# Source path -> (mtime, size, hash), large sources are only read again once they change
+source_hashes = {}
+lock = threading.Lock()
 
 def make(image_node, tex_name, matname=None):
     tex = {}
@@ -53,8 +66,7 @@ def make(image_node, tex_name, matname=None):
         unpack_filepath = unpack_path + '/' + tex['file']
         
         if do_convert:
-            if not os.path.isfile(unpack_filepath):
-                arm.utils.unpack_image(image, unpack_filepath)
+            convert(image, unpack_filepath, unpack=True)
         else:
 
             # Write bytes if size is different or file does not exist yet
@@ -79,9 +91,7 @@ def make(image_node, tex_name, matname=None):
             if not os.path.exists(unpack_path):
                 os.makedirs(unpack_path)
             converted_path = unpack_path + '/' + tex['file']
-            # TODO: delete cache when file changes
-            if not os.path.isfile(converted_path):
-                arm.utils.convert_image(image, converted_path)
+            convert(image, converted_path)
             assets.add(converted_path)
         else:
             # Link image path to assets
@@ -108,8 +118,7 @@ def make(image_node, tex_name, matname=None):
     # if image_node.color_space == NON_COLOR_DATA:
         # interpolation = image_node.interpolation
 
-    # TODO: Blender seems to load full images on size request, cache size instead
-    powimage = is_pow(image.size[0]) and is_pow(image.size[1])
+    powimage = is_pow_image(image)
 
     if state.target == 'html5' and powimage == False and (image_node.interpolation == 'Cubic' or image_node.interpolation == 'Smart'):
         log.warn(matname + '/' + image.name + ' - non power of 2 texture using ' + image_node.interpolation + ' interpolation requires WebGL2')
@@ -147,6 +156,87 @@ def make(image_node, tex_name, matname=None):
 
     return tex
 
+def convert(image, path, file_format='JPEG', unpack=False):
+    # Queue image conversion to path, packed images are unpacked with image.save()
+    # Source data is captured now, hashing and writing happen in write_conversions()
+    if image.packed_file != None:
+        source = image.packed_file.data
+    else:
+        source = arm.utils.asset_path(image.filepath)
+    settings = [texture_cache_version, file_format, unpack, image.colorspace_settings.name, image.alpha_mode]
+    if not unpack:
+        # Rendered through the scene color management
+        view = bpy.context.scene.view_settings
+        settings += [view.view_transform, view.look, view.exposure, view.gamma]
+    conversions[path] = (image, source, file_format, unpack, settings)
+
+def reset_conversions():
+    # Drop conversions left queued by an export that did not finish
+    global conversions
+    conversions = {}
+
+def get_source_hash(path):
+    # Hash of the file at path, cached until its mtime or size changes
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    with lock:
+        cached = source_hashes.get(path)
+        if cached != None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+    digest = build_cache.hash_file(path)
+    with lock:
+        source_hashes[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+def conversion_key(source, settings):
+    h = build_cache.new_hash()
+    if isinstance(source, str):
+        build_cache.update_hash(h, get_source_hash(source))
+    else:
+        build_cache.update_hash(h, source)
+    build_cache.update_hash(h, settings)
+    return h.hexdigest()
+
+def write_conversions():
+    # Converts queued images whose source or settings changed since they were written
+    # Sources are hashed on worker threads, Blender does the conversions on this one
+    global conversions
+    pending = conversions
+    conversions = {}
+    if len(pending) == 0:
+        return
+    paths = sorted(pending.keys())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=arm.utils.get_export_threads()) as pool:
+        futures = [pool.submit(conversion_key, pending[path][1], pending[path][4]) for path in paths]
+        keys = [f.result() for f in futures]
+    manifests = {}
+    for path, key in zip(paths, keys):
+        image, source, file_format, unpack, settings = pending[path]
+        d = os.path.dirname(path)
+        if d not in manifests:
+            manifests[d] = build_cache.Manifest(d + '/textures.json')
+        name = os.path.basename(path)
+        if manifests[d].get(name) == key and os.path.isfile(path):
+            continue
+        if unpack:
+            arm.utils.unpack_image(image, path, file_format=file_format)
+        else:
+            arm.utils.convert_image(image, path, file_format=file_format)
+        manifests[d].set(name, key)
+    for d in manifests:
+        manifests[d].save()
+
+def is_pow_image(image):
+    # Blender loads full images on size request, read dimensions from file headers instead
+    if image.packed_file != None:
+        size = image_info.get_size_from_data(image.packed_file.data)
+    else:
+        size = image_info.get_size(arm.utils.asset_path(image.filepath))
+    if size == None:
+        size = image.size
+    return is_pow(size[0]) and is_pow(size[1])
+
 def is_pow(num):
     return ((num & (num - 1)) == 0) and num != 0
 
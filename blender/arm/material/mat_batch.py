@@ -2,6 +2,7 @@ import bpy
 import arm.material.cycles as cycles
 import arm.material.make_shader as make_shader
 import arm.material.mat_state as mat_state
+import arm.material.mat_utils as mat_utils
 
 # TODO: handle groups
 # TODO: handle cached shaders
@@ -9,21 +10,12 @@ import arm.material.mat_state as mat_state
 batchDict = None
 signatureDict = None
 
-def traverse_tree(node, sign):
-    sign += node.type + '-'
-    for inp in node.inputs:
-        if inp.is_linked:
-            sign = traverse_tree(inp.links[0].from_node, sign)
-        else:
-            sign += 'o' # Unconnected socket
-    return sign
-
 def get_signature(mat):
     nodes = mat.node_tree.nodes
     output_node = cycles.node_by_type(nodes, 'OUTPUT_MATERIAL')
     
     if output_node != None:
-        sign = traverse_tree(output_node, '')
+        sign = mat_utils.node_signature(output_node, {})
         # Append flags
         sign += '1' if mat.arm_cast_shadow else '0'
         sign += '1' if mat.arm_overlay else '0'
@@ -94,18 +86,16 @@ def build(materialArray, mat_users, mat_armusers):
 
     mat_state.batch = True
 
-    # Build unique shaders
+    # Build unique shaders, first material of each signature builds it
+    built = dict()
     for mat in materialArray:
-        for mat2 in materialArray:
-            # Signature not found - build it
-            if mat == mat2:
-                batchDict[mat] = make_shader.build(mat, mat_users, mat_armusers)
-                break
-
-            # Already batched
-            if mat.signature == mat2.signature:
-                batchDict[mat] = batchDict[mat2]
-                break
+        # Already batched
+        if mat.signature in built:
+            batchDict[mat] = batchDict[built[mat.signature]]
+            continue
+        # Signature not found - build it
+        batchDict[mat] = make_shader.build(mat, mat_users, mat_armusers)
+        built[mat.signature] = mat
 
     mat_state.batch = False
 
@@ -3,6 +3,7 @@ import arm.utils
 import arm.make_state as make_state
 import arm.material.cycles as cycles
 import arm.log as log
+import arm.lib.build_cache as build_cache
 
 add_mesh_contexts = []
 
@@ -21,6 +22,31 @@ def disp_linked(output_node):
         log.warn('Tessellation not available on ' + make_state.target)
     return disp_enabled
 
+def node_signature(node, memo, values=False):
+    # Structural hash of the graph feeding node, memo maps already hashed nodes so shared
+    # subtrees are walked once, values adds image paths and unlinked socket values
+    sign = memo.get(node)
+    if sign != None:
+        return sign
+    h = build_cache.new_hash()
+    build_cache.update_hash(h, node.type)
+    if values and node.type == 'TEX_IMAGE' and node.image != None:
+        build_cache.update_hash(h, node.image.filepath)
+    for inp in node.inputs:
+        if inp.is_linked:
+            l = inp.links[0]
+            build_cache.update_hash(h, [node_signature(l.from_node, memo, values), l.from_socket.identifier])
+        elif not values or not hasattr(inp, 'default_value'):
+            build_cache.update_hash(h, 'o') # Unconnected socket
+        elif inp.type == 'RGB' or inp.type == 'RGBA' or inp.type == 'VECTOR':
+            build_cache.update_hash(h, [inp.default_value[0], inp.default_value[1], inp.default_value[2]])
+        else:
+            v = inp.default_value
+            build_cache.update_hash(h, v if isinstance(v, (bool, int, float, str)) else str(v))
+    sign = h.hexdigest()
+    memo[node] = sign
+    return sign
+
 def get_rpasses(material):
 
     ar = []
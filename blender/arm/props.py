@@ -115,7 +115,11 @@ def init_properties():
     bpy.types.World.arm_minimize = BoolProperty(name="Minimize Data", description="Export scene data in binary", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_minify_js = BoolProperty(name="Minify JS", description="Minimize JavaScript output when publishing", default=True)
     bpy.types.World.arm_optimize_mesh = BoolProperty(name="Optimize Meshes", description="Export more efficient geometry indices, can prolong build times", default=False, update=assets.invalidate_mesh_data)
+    bpy.types.World.arm_weld_epsilon = FloatProperty(name="Weld Epsilon", description="Merge vertices with positions closer than this distance and otherwise identical attributes, 0 merges identical vertices only", default=0.0, min=0.0, precision=5, update=assets.invalidate_mesh_data)
+    bpy.types.World.arm_export_threads = IntProperty(name="Export Threads", description="Number of threads processing meshes and shader passes during export, 0 uses all cores", default=0, min=0)
     bpy.types.World.arm_sampled_animation = BoolProperty(name="Sampled Animation", description="Export object animation as raw matrices", default=False, update=assets.invalidate_compiled_data)
+    bpy.types.World.arm_anim_reduce = BoolProperty(name="Reduce Keyframes", description="Drop sampled animation frames that interpolating the neighbouring frames reproduces", default=False)
+    bpy.types.World.arm_anim_tolerance = FloatProperty(name="Keyframe Tolerance", description="Maximum error of dropped animation frames", default=0.0001, min=0.0, precision=5)
     bpy.types.World.arm_deinterleaved_buffers = BoolProperty(name="Deinterleaved Buffers", description="Use deinterleaved vertex buffers", default=False, update=invalidate_compiler_cache)
     bpy.types.World.arm_export_tangents = BoolProperty(name="Export Tangents", description="Precompute tangents for normal mapping, otherwise computed in shader", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_batch_meshes = BoolProperty(name="Batch Meshes", description="Group meshes by materials to speed up rendering", default=False, update=invalidate_compiler_cache)
@@ -125,7 +129,6 @@ def init_properties():
     bpy.types.World.arm_lod_gen_ratio = FloatProperty(name="Decimate Ratio", description="Decimate ratio", default=0.8)
     bpy.types.World.arm_cache_shaders = BoolProperty(name="Cache Shaders", description="Do not rebuild existing shaders", default=True)
     bpy.types.World.arm_cache_compiler = BoolProperty(name="Cache Compiler", description="Only recompile sources when required", default=True)
-    bpy.types.World.arm_gpu_processing = BoolProperty(name="GPU Processing", description="Utilize GPU for asset pre-processing at build time", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_play_camera = EnumProperty(
         items=[('Scene', 'Scene', 'Scene'),
                ('Viewport', 'Viewport', 'Viewport'),
@@ -273,8 +276,9 @@ def init_properties():
     bpy.types.Lamp.arm_clip_end = FloatProperty(name="Clip End", default=50.0)
     bpy.types.Lamp.arm_fov = FloatProperty(name="Field of View", default=0.84)
     bpy.types.Lamp.arm_shadows_bias = FloatProperty(name="Bias", description="Depth offset to fight shadow acne", default=1.0)
+    bpy.types.Lamp.arm_ies_profile = StringProperty(name="IES Profile", description="IES file shaping this lamp, lamps without one use the world IES texture", default="", subtype='FILE_PATH')
     bpy.types.World.arm_lamp_texture = StringProperty(name="Mask Texture", default="")
-    bpy.types.World.arm_lamp_ies_texture = StringProperty(name="IES Texture", default="")
+    bpy.types.World.arm_lamp_ies_texture = StringProperty(name="IES Texture", description="Bundled iestexture image, or an IES file the texture is generated from", default="")
     bpy.types.World.arm_lamp_clouds_texture = StringProperty(name="Clouds Texture", default="")
 
     bpy.types.World.arm_rpcache_list = CollectionProperty(type=bpy.types.PropertyGroup)
@@ -161,6 +161,7 @@ class DataPropsPanel(bpy.types.Panel):
             col.prop(obj.data, 'arm_shadows_bias')
             layout.prop(wrd, 'arm_lamp_texture')
             layout.prop(wrd, 'arm_lamp_ies_texture')
+            layout.prop(obj.data, 'arm_ies_profile')
             layout.prop(wrd, 'arm_lamp_clouds_texture')
         elif obj.type == 'SPEAKER':
             layout.prop(obj.data, 'arm_play_on_start')
@@ -373,7 +374,6 @@ class ArmoryProjectPanel(bpy.types.Panel):
         col = row.column()
         col.prop(wrd, 'arm_cache_shaders')
         col.prop(wrd, 'arm_cache_compiler')
-        col.prop(wrd, 'arm_gpu_processing')
 
         layout.label("Flags")
         box = layout.box().column()
@@ -383,6 +383,7 @@ class ArmoryProjectPanel(bpy.types.Panel):
         col.prop(wrd, 'arm_batch_meshes')
         col.prop(wrd, 'arm_batch_materials')
         col.prop(wrd, 'arm_sampled_animation')
+        col.prop(wrd, 'arm_anim_reduce')
         col.prop(wrd, 'arm_asset_compression')
         col = row.column()
         col.prop(wrd, 'arm_minimize')
@@ -394,6 +395,11 @@ class ArmoryProjectPanel(bpy.types.Panel):
         row.alignment = 'EXPAND'
         row.prop(wrd, 'arm_texture_quality')
         row.prop(wrd, 'arm_sound_quality')
+        box.prop(wrd, 'arm_weld_epsilon')
+        row = box.row()
+        row.enabled = wrd.arm_anim_reduce
+        row.prop(wrd, 'arm_anim_tolerance')
+        box.prop(wrd, 'arm_export_threads')
 
         layout.label("Window")
         box = layout.box().column()
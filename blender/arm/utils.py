@@ -1,6 +1,7 @@
 import bpy
 import json
 import os
+import sys
 import glob
 import platform
 import zipfile
@@ -11,21 +12,35 @@ import arm.lib.armpack
 import arm.make_state as state
 import arm.log as log
 
-def write_arm(filepath, output):
+def json_default(obj):
+    # Typed buffers (numpy, array.array, memoryview) are written as plain lists
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(repr(obj) + ' is not JSON serializable')
+
+def write_arm(filepath, output, release=False, minimize=None):
+    # Data is streamed to the file, release drops written buffers from output
+    # Pass minimize when writing from a worker thread, bpy is not thread-safe
+    if minimize == None:
+        minimize = bpy.data.worlds['Arm'].arm_minimize
     if filepath.endswith('.zip'):
         with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            if bpy.data.worlds['Arm'].arm_minimize:
-                zip_file.writestr('data.arm', arm.lib.armpack.packb(output))
+            if minimize:
+                if sys.version_info >= (3, 6):
+                    with zip_file.open('data.arm', 'w') as f:
+                        arm.lib.armpack.Writer(f).pack(output, release=release)
+                else:
+                    zip_file.writestr('data.arm', arm.lib.armpack.packb(output))
             else:
-                zip_file.writestr('data.json', json.dumps(output, sort_keys=True, indent=4))
+                zip_file.writestr('data.json', json.dumps(output, sort_keys=True, indent=4, default=json_default))
     else:
-        if bpy.data.worlds['Arm'].arm_minimize:
+        if minimize:
             with open(filepath, 'wb') as f:
-                f.write(arm.lib.armpack.packb(output))
+                arm.lib.armpack.Writer(f).pack(output, release=release)
         else:
             filepath_json = filepath.split('.arm')[0] + '.json'
             with open(filepath_json, 'w') as f:
-                f.write(json.dumps(output, sort_keys=True, indent=4))
+                json.dump(output, f, sort_keys=True, indent=4, default=json_default)
 
 def unpack_image(image, path, file_format='JPEG'):
     print('Armory Info: Unpacking to ' + path)
@@ -136,6 +151,13 @@ def get_code_editor():
     addon_prefs = user_preferences.addons['armory'].preferences
     return 'kodestudio' if not hasattr(addon_prefs, 'code_editor') else addon_prefs.code_editor
 
+def get_export_threads():
+    # Worker threads used for mesh and shader pass export, 0 picks one per core
+    threads = bpy.data.worlds['Arm'].arm_export_threads
+    if threads <= 0:
+        threads = os.cpu_count() or 1
+    return threads
+
 def get_ui_scale():
     user_preferences = bpy.context.user_preferences
     addon_prefs = user_preferences.addons['armory'].preferences
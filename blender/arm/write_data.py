@@ -2,9 +2,11 @@ import bpy
 import os
 import shutil
 import glob
+import io
 import json
 import stat
 import arm.utils
+import arm.lib.shader_store as shader_store
 import arm.assets as assets
 import arm.make_state as state
 
@@ -434,7 +436,7 @@ def write_compiledglsl(defs):
     shadowmap_size = 0
     if rpdat.rp_shadowmap != 'Off':
         shadowmap_size = int(rpdat.rp_shadowmap)
-    with open(arm.utils.build_dir() + '/compiled/Shaders/compiled.glsl', 'w') as f:
+    with io.StringIO() as f:
         f.write(
 """#ifndef _COMPILED_GLSL_
 #define _COMPILED_GLSL_
@@ -591,6 +593,9 @@ const float voxelgiOffset = """ + str(round(rpdat.arm_voxelgi_offset * 100) / 10
         f.write("""#endif // _COMPILED_GLSL_
 """)
 
+        # Only touched when the defines or constants change, shaders including it stay compiled
+        shader_store.write(arm.utils.build_dir() + '/compiled/Shaders/compiled.glsl', f.getvalue())
+
 def write_traithx(class_name):
     wrd = bpy.data.worlds['Arm']
     package_path = arm.utils.get_fp() + '/Sources/' + arm.utils.safestr(wrd.arm_project_package)
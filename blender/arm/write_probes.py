@@ -1,11 +1,13 @@
 import bpy
 import os
-import sys
-import subprocess
-import json
-import re
+import numpy as np
 import arm.utils
 import arm.assets as assets
+import arm.lib.build_cache as build_cache
+import arm.lib.probe_ops as probe_ops
+
+# Bump when generated probes change for equal inputs
+probe_cache_version = 1
 
 def add_irr_assets(output_file_irr):
     assets.add(output_file_irr + '.arm')
@@ -30,77 +32,10 @@ def write_probes(image_filepath, disable_hdr, cached_num_mips, arm_radiance=True
         output_file_rad = envpath + '/' + base_name + '_radiance'
         rad_format = 'jpg' if disable_hdr else 'hdr'
 
-    # Radiance & irradiance exists, keep cache
-    basep = envpath + '/' + base_name
-    if os.path.exists(basep + '_irradiance.arm'):
-        if not arm_radiance or os.path.exists(basep + '_radiance_0.' + rad_format):
-            add_irr_assets(output_file_irr)
-            if arm_radiance:
-                add_rad_assets(output_file_rad, rad_format, cached_num_mips)
-            return cached_num_mips
-    
-    # Get paths
-    sdk_path = arm.utils.get_sdk_path()
-    kha_path = arm.utils.get_kha_path()
-
-    if arm.utils.get_os() == 'win':
-        cmft_path = sdk_path + '/lib/armory_tools/cmft/cmft.exe'
-        kraffiti_path = kha_path + '/Kore/Tools/kraffiti/kraffiti.exe'
-    elif arm.utils.get_os() == 'mac':
-        cmft_path = '"' + sdk_path + '/lib/armory_tools/cmft/cmft-osx"'
-        kraffiti_path = '"' + kha_path + '/Kore/Tools/kraffiti/kraffiti-osx"'
-    else:
-        cmft_path = '"' + sdk_path + '/lib/armory_tools/cmft/cmft-linux64"'
-        kraffiti_path = '"' + kha_path + '/Kore/Tools/kraffiti/kraffiti-linux64"'
-    
-    output_gama_numerator = '2.2' if disable_hdr else '1.0'
     input_file = arm.utils.asset_path(image_filepath)
-    
-    # Scale map
     rpdat = arm.utils.get_rp()
     target_w = int(rpdat.arm_radiance_size)
     target_h = int(target_w / 2)
-    scaled_file = output_file_rad + '.' + rad_format
-
-    if arm.utils.get_os() == 'win':
-        output = subprocess.check_output([ \
-            kraffiti_path,
-            'from=' + input_file,
-            'to=' + scaled_file,
-            'format=' + rad_format,
-            'width=' + str(target_w),
-            'height=' + str(target_h)])
-    else:
-        output = subprocess.check_output([ \
-            kraffiti_path + \
-            ' from="' + input_file + '"' + \
-            ' to="' + scaled_file + '"' + \
-            ' format=' + rad_format + \
-            ' width=' + str(target_w) + \
-            ' height=' + str(target_h)], shell=True)
-    
-    # Irradiance spherical harmonics
-    if arm.utils.get_os() == 'win':
-        subprocess.call([ \
-            cmft_path,
-            '--input', scaled_file,
-            '--filter', 'shcoeffs',
-            '--outputNum', '1',
-            '--output0', output_file_irr])
-    else:
-        subprocess.call([ \
-            cmft_path + \
-            ' --input ' + '"' + scaled_file + '"' + \
-            ' --filter shcoeffs' + \
-            ' --outputNum 1' + \
-            ' --output0 ' + '"' + output_file_irr + '"'], shell=True)
-
-    sh_to_json(output_file_irr)
-    add_irr_assets(output_file_irr)
-    
-    # Mip-mapped radiance
-    if arm_radiance == False:
-        return cached_num_mips
 
     # 4096 = 256 face
     # 2048 = 128 face
@@ -112,149 +47,92 @@ def write_probes(image_filepath, disable_hdr, cached_num_mips, arm_radiance=True
         mip_count = 8
     else:
         mip_count = 7
-    
-    wrd = bpy.data.worlds['Arm']
-    use_opencl = 'true' if wrd.arm_gpu_processing else 'false'
 
-    if arm.utils.get_os() == 'win':
-        subprocess.call([ \
-            cmft_path,
-            '--input', input_file,
-            '--filter', 'radiance',
-            '--dstFaceSize', str(face_size),
-            '--srcFaceSize', str(face_size),
-            '--excludeBase', 'false',
-            # '--mipCount', str(mip_count),
-            '--glossScale', '8',
-            '--glossBias', '3',
-            '--lightingModel', 'blinnbrdf',
-            '--edgeFixup', 'none',
-            '--numCpuProcessingThreads', '4',
-            '--useOpenCL', use_opencl,
-            '--clVendor', 'anyGpuVendor',
-            '--deviceType', 'gpu',
-            '--deviceIndex', '0',
-            '--generateMipChain', 'true',
-            '--inputGammaNumerator', output_gama_numerator,
-            '--inputGammaDenominator', '1.0',
-            '--outputGammaNumerator', '1.0',
-            '--outputGammaDenominator', '1.0',
-            '--outputNum', '1',
-            '--output0', output_file_rad,
-            '--output0params', 'hdr,rgbe,latlong'])
-    else:
-        subprocess.call([ \
-            cmft_path + \
-            ' --input "' + input_file + '"' + \
-            ' --filter radiance' + \
-            ' --dstFaceSize ' + str(face_size) + \
-            ' --srcFaceSize ' + str(face_size) + \
-            ' --excludeBase false' + \
-            #' --mipCount ' + str(mip_count) + \
-            ' --glossScale 8' + \
-            ' --glossBias 3' + \
-            ' --lightingModel blinnbrdf' + \
-            ' --edgeFixup none' + \
-            ' --numCpuProcessingThreads 4' + \
-            ' --useOpenCL ' + use_opencl + \
-            ' --clVendor anyGpuVendor' + \
-            ' --deviceType gpu' + \
-            ' --deviceIndex 0' + \
-            ' --generateMipChain true' + \
-            ' --inputGammaNumerator ' + output_gama_numerator + \
-            ' --inputGammaDenominator 1.0' + \
-            ' --outputGammaNumerator 1.0' + \
-            ' --outputGammaDenominator 1.0' + \
-            ' --outputNum 1' + \
-            ' --output0 "' + output_file_rad + '"' + \
-            ' --output0params hdr,rgbe,latlong'], shell=True)
+    # Probes are kept while the source and everything they are generated with stay equal
+    manifest = build_cache.Manifest(envpath + '/probes.json')
+    key = build_cache.hash_data([probe_cache_version, build_cache.hash_file(input_file),
+        target_w, 2.2 if disable_hdr else 1.0, disable_hdr, mip_count, arm_radiance])
+    irr_ext = '.arm' if bpy.data.worlds['Arm'].arm_minimize else '.json'
+    record = manifest.get(base_name)
+    if record != None and record['key'] == key and os.path.isfile(output_file_irr + irr_ext):
+        if not arm_radiance:
+            add_irr_assets(output_file_irr)
+            return cached_num_mips
+        num_mips = record['mips']
+        files = [output_file_rad + '.' + rad_format] + [output_file_rad + '_' + str(i) + '.' + rad_format for i in range(0, num_mips)]
+        if all(os.path.isfile(f) for f in files):
+            add_irr_assets(output_file_irr)
+            add_rad_assets(output_file_rad, rad_format, num_mips)
+            return num_mips
 
-    # Remove size extensions in file name
-    mip_w = int(face_size * 4)
-    mip_base = output_file_rad + '_'
-    mip_num = 0
-    while mip_w >= 4:
-        mip_name = mip_base + str(mip_num)
-        os.rename(
-            mip_name + '_' + str(mip_w) + 'x' + str(int(mip_w / 2)) + '.hdr',
-            mip_name + '.hdr')
-        mip_w = int(mip_w / 2)
-        mip_num += 1
+    # Map is read once, probes are generated from the scaled copy
+    scaled = probe_ops.resize(read_image(input_file), target_w, target_h)
 
-    # Append mips
-    generated_files = []
-    for i in range(0, mip_count):
-        generated_files.append(output_file_rad + '_' + str(i))
-    
-    # Convert to jpgs
-    if disable_hdr is True:
-        for f in generated_files:
-            if arm.utils.get_os() == 'win':
-                subprocess.call([ \
-                    kraffiti_path,
-                    'from=' + f + '.hdr',
-                    'to=' + f + '.jpg',
-                    'format=jpg'])
-            else:
-                subprocess.call([ \
-                    kraffiti_path + \
-                    ' from="' + f + '.hdr"' + \
-                    ' to="' + f + '.jpg"' + \
-                    ' format=jpg'], shell=True)
-            os.remove(f + '.hdr')
-    
-    # Scale from (4x2 to 1x1>
-    for i in range (0, 2):
-        last = generated_files[-1]
-        out = output_file_rad + '_' + str(mip_count + i)
-        if arm.utils.get_os() == 'win':
-            subprocess.call([ \
-                kraffiti_path,
-                'from=' + last + '.' + rad_format,
-                'to=' + out + '.' + rad_format,
-                'scale=0.5',
-                'format=' + rad_format], shell=True)
-        else:
-            subprocess.call([ \
-                kraffiti_path + \
-                ' from=' + '"' + last + '.' + rad_format + '"' + \
-                ' to=' + '"' + out + '.' + rad_format + '"' + \
-                ' scale=0.5' + \
-                ' format=' + rad_format], shell=True)
-        generated_files.append(out)
+    # Irradiance spherical harmonics
+    sh_json = {}
+    sh_json['irradiance'] = probe_ops.sh_coeffs(scaled).ravel().tolist()
+    arm.utils.write_arm(output_file_irr + '.arm', sh_json)
+    add_irr_assets(output_file_irr)
     
+    # Mip-mapped radiance
+    if arm_radiance == False:
+        manifest.set(base_name, { 'key': key, 'mips': cached_num_mips })
+        manifest.save()
+        return cached_num_mips
+
+    write_image(output_file_rad + '.' + rad_format, scaled)
+
+    # Ldr maps are stored with gamma, filter in linear space
+    if disable_hdr:
+        scaled = scaled ** 2.2
+    levels = [scaled]
+    while levels[-1].shape[1] > 4:
+        levels.append(probe_ops.downsample(levels[-1]))
+    sizes = [int(face_size * 4) >> i for i in range(0, mip_count)]
+    powers = [probe_ops.specular_power(i, mip_count) for i in range(0, mip_count)]
+    mips = probe_ops.prefilter(levels, sizes, powers, threads=arm.utils.get_export_threads())
+
+    # Scale from 4x2 to 1x1
+    for i in range(0, 2):
+        last = mips[-1]
+        mips.append(probe_ops.resize(last, last.shape[1] // 2, max(last.shape[0] // 2, 1)))
+
+    for i in range(0, len(mips)):
+        mip = mips[i] ** (1.0 / 2.2) if disable_hdr else mips[i]
+        write_image(output_file_rad + '_' + str(i) + '.' + rad_format, mip)
+
     mip_count += 2
 
+    manifest.set(base_name, { 'key': key, 'mips': mip_count })
+    manifest.save()
+
     add_rad_assets(output_file_rad, rad_format, mip_count)
 
     return mip_count
 
-# Parse sh coefs produced by cmft into json array
-def sh_to_json(sh_file):
-    with open(sh_file + '.c') as f:
-        sh_lines = f.read().splitlines()
-    band0_line = sh_lines[5]
-    band1_line = sh_lines[6]
-    band2_line = sh_lines[7]
-
-    irradiance_floats = []
-    parse_band_floats(irradiance_floats, band0_line)
-    parse_band_floats(irradiance_floats, band1_line)
-    parse_band_floats(irradiance_floats, band2_line)
-    
-    sh_json = {}
-    sh_json['irradiance'] = irradiance_floats
-    ext = '.arm' if bpy.data.worlds['Arm'].arm_minimize else '.json'
-    arm.utils.write_arm(sh_file + ext, sh_json)
-    
-    # Clean up .c
-    os.remove(sh_file + '.c')
-
-def parse_band_floats(irradiance_floats, band_line):
-    string_floats = re.findall(r'[-+]?\d*\.\d+|\d+', band_line)
-    string_floats = string_floats[1:] # Remove 'Band 0/1/2' number
-    for s in string_floats:
-        irradiance_floats.append(float(s))
+def read_image(path):
+    # Float rgb rows from the top, hdr is decoded directly and ldr maps by Blender
+    if path.lower().endswith('.hdr'):
+        return probe_ops.read_hdr(path)
+    image = bpy.data.images.load(path)
+    w, h = image.size
+    pixels = np.array(image.pixels[:], dtype=np.float32).reshape(h, w, 4)
+    bpy.data.images.remove(image)
+    return pixels[::-1, :, :3].copy()
+
+def write_image(path, img):
+    if path.endswith('.hdr'):
+        probe_ops.write_hdr(path, img)
+        return
+    h, w = img.shape[:2]
+    pixels = np.ones((h, w, 4), dtype=np.float32)
+    pixels[:, :, :3] = np.clip(img[::-1], 0.0, 1.0)
+    image = bpy.data.images.new('arm_probe', w, h)
+    image.pixels = pixels.ravel().tolist()
+    image.filepath_raw = path
+    image.file_format = 'JPEG'
+    image.save()
+    bpy.data.images.remove(image)
 
 def write_sky_irradiance(base_name):
     # Hosek spherical harmonics